@@ -1,10 +1,15 @@
 from flask import Flask, render_template, send_from_directory
 from routes.storage import storage_bp
 from routes.files import files_bp
-from routes.ai import ai_bp
+from routes.ai import ai_bp, ai_service, analysis_workers
 from routes.index import index_bp
-from database import init_db
+from database import init_db, shutdown_session
+from services import search_index, stats
+from services.analysis_queue import AnalysisWorkerPool, ANALYSIS_WORKERS
+from services.vector_store import vector_store
 import os
+import time
+import click
 import humanize
 import json
 
@@ -12,6 +17,8 @@ app = Flask(__name__,
     template_folder=os.path.abspath('templates'),
     static_folder=os.path.abspath('static'))
 app.secret_key = 'your_secret_key_here'
+# 流式上传的分块大小，决定每个上传占用的内存上限
+app.config['UPLOAD_CHUNK_SIZE'] = int(os.getenv('UPLOAD_CHUNK_SIZE', 1024 * 1024))
 
 # 注册 Jinja2 过滤器
 app.jinja_env.filters['filesizeformat'] = humanize.naturalsize
@@ -34,6 +41,48 @@ def from_json_filter(value):
 
 # 初始化数据库
 init_db()
+# 每个请求结束后归还数据库连接
+app.teardown_appcontext(shutdown_session)
+# Web 进程处理第一个请求时启动后台分析线程，命令行命令不会启动
+app.before_request(analysis_workers.ensure_started)
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index():
+    """重建全文搜索索引，回填已有的文件和分析结果"""
+    count = search_index.rebuild_index()
+    print(f'已索引 {count} 个文件')
+
+@app.cli.command('reconcile-stats')
+def reconcile_stats():
+    """按文件表重新计算首页使用的存储池统计"""
+    count = stats.rebuild_stats()
+    print(f'已统计 {count} 个文件')
+
+@app.cli.command('build-ann-index')
+@click.option('--nlist', type=int, default=None, help='聚类数，默认约为向量数平方根的 4 倍')
+def build_ann_index(nlist):
+    """训练语义搜索的近似最近邻索引，向量数大幅增长后重新执行"""
+    try:
+        nlist = vector_store.build_index(nlist)
+    except ValueError as e:
+        print(str(e))
+        return
+    stats = vector_store.stats()
+    print(f"已为 {stats['vectors']} 个向量建立索引，聚类数 {nlist}")
+
+@app.cli.command('analysis-worker')
+@click.option('--workers', default=max(ANALYSIS_WORKERS, 1), show_default=True, help='工作线程数')
+def analysis_worker(workers):
+    """在独立进程中处理后台分析队列，Web 进程可设置 ANALYSIS_WORKERS=0 只负责入队"""
+    pool = AnalysisWorkerPool(ai_service, workers)
+    pool.start()
+    print(f'已启动 {workers} 个分析工作线程，按 Ctrl+C 退出')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print('等待当前任务完成...')
+        pool.stop()
 
 @app.route('/static/<path:path>')
 def static_files(path):
@@ -1,6 +1,7 @@
 from .storage import Storage
 from .file import File
+from .catalog import CatalogEntry, CatalogState
 
-__all__ = ['Storage', 'File']
+__all__ = ['Storage', 'File', 'CatalogEntry', 'CatalogState']
 
 # 这个文件使 models 目录成为一个 Python 包 
\ No newline at end of file
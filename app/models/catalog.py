@@ -0,0 +1,55 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text, Index, UniqueConstraint, DDL, event
+from app.database import Base
+
+class CatalogEntry(Base):
+    """跨存储文件目录：各存储后端文件元数据的本地副本"""
+    __tablename__ = 'catalog_entries'
+
+    id = Column(Integer, primary_key=True)
+    storage_id = Column(Integer, ForeignKey('storages.id'), nullable=False)
+    path = Column(String(1000), nullable=False)
+    name = Column(String(255), nullable=False)
+    is_dir = Column(Boolean, default=False)
+    size = Column(Integer, default=0)
+    mtime = Column(String(40))  # ISO 格式的修改时间
+    etag = Column(String(255))
+
+    __table_args__ = (
+        UniqueConstraint('storage_id', 'path', name='uq_catalog_entries_storage_path'),
+        Index('ix_catalog_entries_name', 'name'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'storage_id': self.storage_id,
+            'path': self.path,
+            'name': self.name,
+            'is_dir': self.is_dir,
+            'size': self.size,
+            'mtime': self.mtime,
+            'etag': self.etag
+        }
+
+class CatalogState(Base):
+    """每个存储的目录刷新状态"""
+    __tablename__ = 'catalog_state'
+
+    storage_id = Column(Integer, ForeignKey('storages.id'), primary_key=True)
+    refreshed_at = Column(DateTime)
+    entry_count = Column(Integer, default=0)
+    last_error = Column(Text)
+
+# 文件名三元组全文索引，使子串搜索可以走索引；由触发器与 catalog_entries 保持同步
+for statement in (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_fts USING fts5("
+    "name, content='catalog_entries', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS catalog_entries_ai AFTER INSERT ON catalog_entries BEGIN "
+    "INSERT INTO catalog_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS catalog_entries_ad AFTER DELETE ON catalog_entries BEGIN "
+    "INSERT INTO catalog_fts(catalog_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER IF NOT EXISTS catalog_entries_au AFTER UPDATE OF name ON catalog_entries BEGIN "
+    "INSERT INTO catalog_fts(catalog_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO catalog_fts(rowid, name) VALUES (new.id, new.name); END",
+):
+    event.listen(CatalogEntry.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
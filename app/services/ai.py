@@ -1,6 +1,7 @@
 import openai
 from ..config import settings
 from ..models import File
+from .tokenizer import tokenize, is_cjk
 
 class AIService:
     def __init__(self):
@@ -106,9 +107,9 @@ class AIService:
 
     def _extract_keywords(self, text: str) -> List[str]:
         """从文本中提取关键词"""
-        # 简单的关键词提取实现
-        words = text.lower().split()
-        return list(set([w for w in words if len(w) > 3]))
+        # 拉丁文取长度大于 3 的词，中文按二元组切分，不依赖空格分词
+        tokens = tokenize(text)
+        return list(set(t for t in tokens if len(t) > 3 or (is_cjk(t) and len(t) == 2)))
 
     def _extract_suggestions(self, text: str) -> List[str]:
         """从文本中提取建议"""
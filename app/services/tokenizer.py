@@ -0,0 +1,60 @@
+# services/tokenizer.py 的副本：app 包不依赖仓库根目录的模块，修改时两处保持一致
+import re
+
+# 中日韩统一表意文字（含扩展 A 和兼容区）、日文假名和韩文音节
+CJK_RANGES = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+# 连续的 CJK 字符为一段；其余字母数字（不含下划线）连续为一个词
+_RUN_RE = re.compile(f'([{CJK_RANGES}]+)|([^\\W_{CJK_RANGES}]+)')
+_CJK_RE = re.compile(f'[{CJK_RANGES}]')
+
+def is_cjk(text):
+    """文本是否以 CJK 字符开头"""
+    return bool(text) and _CJK_RE.match(text) is not None
+
+def iter_runs(text):
+    """把文本切分为 (是否 CJK, 片段)：CJK 连续段和拉丁词交替出现"""
+    for match in _RUN_RE.finditer(text or ''):
+        cjk, word = match.groups()
+        if cjk:
+            yield True, cjk
+        else:
+            yield False, word.lower()
+
+def bigrams(run):
+    """CJK 片段的相邻二元组"""
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+def tokenize(text):
+    """索引用分词：拉丁词按词切分，CJK 片段切为二元组
+
+    每个 CJK 片段末尾再补一个单字，这样任意单字都是某个词元的前缀，
+    单字查询可以用前缀匹配命中。
+    """
+    tokens = []
+    for cjk, run in iter_runs(text):
+        if cjk:
+            tokens.extend(bigrams(run))
+            tokens.append(run[-1])
+        else:
+            tokens.append(run)
+    return tokens
+
+def index_text(text):
+    """分词后以空格连接，写入全文索引"""
+    if text is None:
+        return None
+    return ' '.join(tokenize(text))
+
+def query_phrases(query):
+    """查询用分词：返回 (词元列表, 是否前缀匹配) 列表，各项之间为 AND 关系
+
+    多字 CJK 片段转为相邻二元组组成的短语，保证按子串匹配；
+    单个 CJK 字和拉丁词按前缀匹配。
+    """
+    phrases = []
+    for cjk, run in iter_runs(query):
+        if cjk and len(run) > 1:
+            phrases.append((bigrams(run), False))
+        else:
+            phrases.append(([run], True))
+    return phrases
@@ -1,12 +1,25 @@
-from typing import List, Dict, Optional
+import asyncio
+import json
+from typing import List, Dict, Optional, AsyncIterator, Callable
 from .base import StorageBackend
+from .catalog import StorageCatalog
+from .transfer import TransferEngine, ProgressCallback
 from ..models import File, Storage
 from sqlalchemy.orm import Session
 
+# 单个存储后端的默认超时时间（秒），可在存储配置中用 timeout 覆盖
+DEFAULT_BACKEND_TIMEOUT = 10.0
+
 class StorageAggregator:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, timeout: float = DEFAULT_BACKEND_TIMEOUT):
         self.db = db
+        self.timeout = timeout
         self.storages: Dict[int, StorageBackend] = {}
+        # 最近一次并发查询中失败的存储及原因
+        self.errors: Dict[int, str] = {}
+        # 后台维护的跨存储文件目录，搜索优先查询它
+        self.catalog = StorageCatalog(self)
+        self.transfer_engine = TransferEngine()
 
     async def get_storage(self, storage_id: int) -> Optional[StorageBackend]:
         """获取存储后端实例"""
@@ -29,43 +42,106 @@ class StorageAggregator:
             
         return self.storages[storage_id]
 
+    def io_metrics(self) -> Dict[int, Dict]:
+        """各存储后端阻塞 I/O 线程池的运行指标"""
+        return {storage_id: backend.io_metrics() for storage_id, backend in self.storages.items()}
+
+    def _backend_timeout(self, storage: Storage) -> float:
+        """获取存储后端的超时时间"""
+        try:
+            return float(json.loads(storage.config).get("timeout", self.timeout))
+        except (ValueError, TypeError, AttributeError):
+            return self.timeout
+
+    async def _list_storage(self, storage: Storage, path: str,
+                            predicate: Optional[Callable[[File], bool]] = None) -> List[File]:
+        """在超时限制内列出单个存储中的文件"""
+        backend = await self.get_storage(storage.id)
+        if not backend:
+            return []
+
+        files = await asyncio.wait_for(backend.list_files(path), self._backend_timeout(storage))
+        result = []
+        for file in files:
+            if predicate and not predicate(file):
+                continue
+            file.storage_id = storage.id
+            file.storage_name = storage.name
+            result.append(file)
+        return result
+
+    async def _fan_out(self, path: str,
+                       predicate: Optional[Callable[[File], bool]] = None,
+                       storages: Optional[List[Storage]] = None) -> AsyncIterator[List[File]]:
+        """并发查询所有存储（或指定的 storages），按响应先后逐个返回各存储的结果
+
+        超时或出错的存储会被跳过并记录到 self.errors，不影响其它存储。
+        """
+        self.errors = {}
+        if storages is None:
+            storages = self.db.query(Storage).all()
+        tasks = {
+            asyncio.ensure_future(self._list_storage(storage, path, predicate)): storage
+            for storage in storages
+        }
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    storage = tasks[task]
+                    try:
+                        files = task.result()
+                    except asyncio.TimeoutError:
+                        self.errors[storage.id] = "timeout"
+                        print(f"Timed out listing files from storage {storage.name}")
+                        continue
+                    except Exception as e:
+                        self.errors[storage.id] = str(e)
+                        print(f"Error listing files from storage {storage.name}: {e}")
+                        continue
+                    yield files
+        finally:
+            # 调用方提前结束迭代时取消尚未完成的查询
+            for task in pending:
+                task.cancel()
+
+    async def iter_all_files(self, path: str = "/") -> AsyncIterator[List[File]]:
+        """流式列出所有存储中的文件，每个存储响应后立即返回其结果"""
+        async for files in self._fan_out(path):
+            yield files
+
     async def list_all_files(self, path: str = "/") -> List[File]:
         """列出所有存储中的文件"""
         all_files = []
-        storages = self.db.query(Storage).all()
-        
-        for storage in storages:
-            backend = await self.get_storage(storage.id)
-            if backend:
-                try:
-                    files = await backend.list_files(path)
-                    for file in files:
-                        file.storage_id = storage.id
-                        file.storage_name = storage.name
-                    all_files.extend(files)
-                except Exception as e:
-                    print(f"Error listing files from storage {storage.name}: {e}")
-        
+        async for files in self._fan_out(path):
+            all_files.extend(files)
         return all_files
 
-    async def search_files(self, query: str) -> List[File]:
-        """在所有存储中搜索文件"""
-        all_files = []
-        storages = self.db.query(Storage).all()
-        
-        for storage in storages:
-            backend = await self.get_storage(storage.id)
-            if backend:
-                try:
-                    files = await backend.list_files("/")
-                    for file in files:
-                        if query.lower() in file.name.lower():
-                            file.storage_id = storage.id
-                            file.storage_name = storage.name
-                            all_files.append(file)
-                except Exception as e:
-                    print(f"Error searching files in storage {storage.name}: {e}")
-        
+    async def iter_search_files(self, query: str,
+                                storages: Optional[List[Storage]] = None) -> AsyncIterator[List[File]]:
+        """流式在所有存储（或指定的 storages）中搜索文件，每个存储响应后立即返回其匹配结果"""
+        keyword = query.lower()
+        async for files in self._fan_out("/", lambda file: keyword in file.name.lower(), storages):
+            yield files
+
+    async def search_files(self, query: str, live: bool = False) -> List[File]:
+        """在所有存储中搜索文件
+
+        目录已完成首次刷新的存储直接查询目录索引（结果新鲜度见 catalog.staleness()），
+        其余存储（新添加的或一直无法访问的）实时查询；live 为真时全部实时查询。
+        """
+        if live:
+            storages, all_files = None, []
+        else:
+            ready = self.catalog.ready_storages()
+            all_files = self.catalog.search(query, storage_ids=ready) if ready else []
+            storages = [storage for storage in self.db.query(Storage).all() if storage.id not in ready]
+            if not storages:
+                return all_files
+
+        async for files in self.iter_search_files(query, storages):
+            all_files.extend(files)
         return all_files
 
     async def get_file(self, storage_id: int, path: str) -> Optional[File]:
@@ -97,46 +173,30 @@ class StorageAggregator:
         return False
 
     async def move_file(self, src_storage_id: int, src_path: str, 
-                       dst_storage_id: int, dst_path: str) -> bool:
+                       dst_storage_id: int, dst_path: str,
+                       progress: Optional[ProgressCallback] = None) -> bool:
         """在不同存储间移动文件"""
-        src_backend = await self.get_storage(src_storage_id)
-        dst_backend = await self.get_storage(dst_storage_id)
-        
-        if src_backend and dst_backend:
-            try:
-                # 下载源文件
-                file_data = await src_backend.download_file(src_path)
-                if not file_data:
-                    return False
-                
-                # 上传到目标存储
-                await dst_backend.upload_file(dst_path, file_data)
-                
-                # 删除源文件
-                await src_backend.delete_file(src_path)
-                return True
-            except Exception as e:
-                print(f"Error moving file: {e}")
-                return False
-        return False
+        return await self._transfer(src_storage_id, src_path, dst_storage_id, dst_path, True, progress)
 
     async def copy_file(self, src_storage_id: int, src_path: str,
-                       dst_storage_id: int, dst_path: str) -> bool:
+                       dst_storage_id: int, dst_path: str,
+                       progress: Optional[ProgressCallback] = None) -> bool:
         """在不同存储间复制文件"""
+        return await self._transfer(src_storage_id, src_path, dst_storage_id, dst_path, False, progress)
+
+    async def _transfer(self, src_storage_id: int, src_path: str, dst_storage_id: int, dst_path: str,
+                        move: bool, progress: Optional[ProgressCallback]) -> bool:
+        """通过传输引擎复制或移动文件"""
         src_backend = await self.get_storage(src_storage_id)
         dst_backend = await self.get_storage(dst_storage_id)
         
         if src_backend and dst_backend:
             try:
-                # 下载源文件
-                file_data = await src_backend.download_file(src_path)
-                if not file_data:
-                    return False
-                
-                # 上传到目标存储
-                await dst_backend.upload_file(dst_path, file_data)
+                await self.transfer_engine.transfer(
+                    src_backend, src_path, dst_backend, dst_path, move=move, progress=progress
+                )
                 return True
             except Exception as e:
-                print(f"Error copying file: {e}")
+                print(f"Error {'moving' if move else 'copying'} file: {e}")
                 return False
-        return False 
\ No newline at end of file
+        return False
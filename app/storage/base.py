@@ -1,11 +1,34 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator
 from ..models import File
+from .executor import BlockingExecutor
+
+# 流式传输默认分块大小（字节）
+DEFAULT_CHUNK_SIZE = 1024 * 1024
 
 class Storage(ABC):
+    # 阻塞 I/O 线程池的默认并发数，子类可在构造时覆盖
+    max_io_workers: int = 4
+    _executor: Optional[BlockingExecutor] = None
+
+    @property
+    def executor(self) -> BlockingExecutor:
+        """获取该后端独享的阻塞 I/O 线程池"""
+        if self._executor is None:
+            self._executor = BlockingExecutor(type(self).__name__, self.max_io_workers)
+        return self._executor
+
+    async def _run(self, func, *args, **kwargs):
+        """在后端线程池中执行阻塞调用"""
+        return await self.executor.run(func, *args, **kwargs)
+
+    def io_metrics(self) -> Dict[str, Any]:
+        """阻塞 I/O 线程池的运行指标"""
+        return self.executor.metrics()
+
     @abstractmethod
-    async def list_files(self, path: str = "/") -> List[File]:
-        """列出指定路径下的文件"""
+    async def list_files(self, path: str = "/", recursive: bool = False) -> List[File]:
+        """列出指定路径下的文件，recursive 为真时包含所有子目录"""
         pass
 
     @abstractmethod
@@ -23,6 +46,25 @@ class Storage(ABC):
         """下载文件"""
         pass
 
+    async def download_stream(self, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """分块下载文件，默认实现一次性读取整个文件"""
+        data = await self.download_file(path)
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+
+    async def upload_stream(self, path: str, chunks: AsyncIterator[bytes]) -> File:
+        """分块上传文件，默认实现先收集全部数据块"""
+        data = b"".join([chunk async for chunk in chunks])
+        return await self.upload_file(path, data)
+
+    def same_endpoint(self, other: "Storage") -> bool:
+        """两个后端是否位于同一服务端点，可以使用服务端复制/移动"""
+        return False
+
+    async def server_copy(self, src_path: str, dst: "Storage", dst_path: str, move: bool = False):
+        """在同一服务端点内直接复制或移动文件，数据不经过本机"""
+        raise NotImplementedError(f"{type(self).__name__} 不支持服务端复制")
+
     @abstractmethod
     async def delete_file(self, path: str) -> bool:
         """删除文件"""
@@ -41,4 +83,7 @@ class Storage(ABC):
     @abstractmethod
     async def copy_file(self, src_path: str, dst_path: str) -> bool:
         """复制文件"""
-        pass 
\ No newline at end of file
+        pass 
+
+# aggregator、webdav 等模块沿用的名称
+StorageBackend = Storage
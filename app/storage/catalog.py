@@ -0,0 +1,175 @@
+import asyncio
+from datetime import datetime
+from typing import List, Dict, Optional, Set, Iterable, TYPE_CHECKING
+from sqlalchemy import text, bindparam
+from ..models import File, Storage, CatalogEntry, CatalogState
+
+if TYPE_CHECKING:
+    from .aggregator import StorageAggregator
+
+# 后台刷新的默认间隔（秒）
+DEFAULT_REFRESH_INTERVAL = 300
+# 三元组索引要求查询词至少 3 个字符，更短的查询退回 LIKE
+TRIGRAM_MIN_LENGTH = 3
+
+class StorageCatalog:
+    """跨存储文件目录，由后台任务增量刷新，搜索时直接查询本地索引"""
+
+    def __init__(self, aggregator: "StorageAggregator"):
+        self.aggregator = aggregator
+        self.db = aggregator.db
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh_storage(self, storage: Storage) -> Dict[str, int]:
+        """刷新单个存储的目录，只写入大小、修改时间或 ETag 有变化的条目"""
+        backend = await self.aggregator.get_storage(storage.id)
+        if not backend:
+            return {"added": 0, "updated": 0, "removed": 0}
+
+        state = self.db.get(CatalogState, storage.id) or CatalogState(storage_id=storage.id)
+        self.db.add(state)
+        try:
+            files = await asyncio.wait_for(
+                backend.list_files("/", recursive=True),
+                self.aggregator._backend_timeout(storage)
+            )
+        except Exception as e:
+            # 刷新失败时保留旧目录，只记录错误
+            state.last_error = str(e)
+            self.db.commit()
+            raise
+
+        existing = {
+            entry.path: entry
+            for entry in self.db.query(CatalogEntry).filter(CatalogEntry.storage_id == storage.id)
+        }
+        stats = {"added": 0, "updated": 0, "removed": 0}
+        for file in files:
+            modified = getattr(file, "modified", None)
+            etag = getattr(file, "etag", None)
+            entry = existing.pop(file.path, None)
+            if entry is None:
+                self.db.add(CatalogEntry(
+                    storage_id=storage.id,
+                    path=file.path,
+                    name=file.name,
+                    is_dir=file.type == "directory",
+                    size=file.size or 0,
+                    mtime=modified,
+                    etag=etag
+                ))
+                stats["added"] += 1
+            elif (entry.size, entry.mtime, entry.etag) != (file.size or 0, modified, etag):
+                entry.size = file.size or 0
+                entry.mtime = modified
+                entry.etag = etag
+                entry.is_dir = file.type == "directory"
+                stats["updated"] += 1
+
+        # 后端已不存在的条目
+        for entry in existing.values():
+            self.db.delete(entry)
+            stats["removed"] += 1
+
+        state.refreshed_at = datetime.utcnow()
+        state.entry_count = len(files)
+        state.last_error = None
+        self.db.commit()
+        return stats
+
+    async def refresh_all(self) -> Dict[int, Dict[str, int]]:
+        """并发刷新所有存储的目录"""
+        storages = self.db.query(Storage).all()
+        results = await asyncio.gather(
+            *(self.refresh_storage(storage) for storage in storages),
+            return_exceptions=True
+        )
+
+        # 清理已删除存储的条目
+        storage_ids = [storage.id for storage in storages]
+        self.db.query(CatalogEntry).filter(~CatalogEntry.storage_id.in_(storage_ids)).delete(synchronize_session=False)
+        self.db.query(CatalogState).filter(~CatalogState.storage_id.in_(storage_ids)).delete(synchronize_session=False)
+        self.db.commit()
+
+        report = {}
+        for storage, result in zip(storages, results):
+            if isinstance(result, Exception):
+                print(f"Error refreshing catalog for storage {storage.name}: {result}")
+                continue
+            report[storage.id] = result
+        return report
+
+    async def run_forever(self, interval: float = DEFAULT_REFRESH_INTERVAL):
+        """周期性刷新目录"""
+        while True:
+            try:
+                await self.refresh_all()
+            except Exception as e:
+                print(f"Error refreshing catalog: {e}")
+            await asyncio.sleep(interval)
+
+    def start(self, interval: float = DEFAULT_REFRESH_INTERVAL) -> asyncio.Task:
+        """启动后台刷新任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self.run_forever(interval))
+        return self._task
+
+    def stop(self):
+        """停止后台刷新任务"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def staleness(self) -> Dict[int, Optional[float]]:
+        """各存储目录距上次成功刷新的秒数，从未刷新过的为 None"""
+        now = datetime.utcnow()
+        result = {storage.id: None for storage in self.db.query(Storage).all()}
+        for state in self.db.query(CatalogState).all():
+            if state.storage_id in result and state.refreshed_at is not None:
+                result[state.storage_id] = (now - state.refreshed_at).total_seconds()
+        return result
+
+    def ready_storages(self) -> Set[int]:
+        """至少成功刷新过一次的存储，其目录可以代替实时查询"""
+        return {storage_id for storage_id, age in self.staleness().items() if age is not None}
+
+    def search(self, query: str, limit: Optional[int] = None,
+               storage_ids: Optional[Iterable[int]] = None) -> List[File]:
+        """在目录中按文件名子串搜索，storage_ids 不为空时只搜索这些存储"""
+        storage_ids = None if storage_ids is None else list(storage_ids)
+        if len(query) >= TRIGRAM_MIN_LENGTH and self.db.get_bind().dialect.name == "sqlite":
+            statement = text(
+                "SELECT catalog_entries.* FROM catalog_entries "
+                "JOIN catalog_fts ON catalog_fts.rowid = catalog_entries.id "
+                "WHERE catalog_fts MATCH :query"
+                + (" AND catalog_entries.storage_id IN :storage_ids" if storage_ids is not None else "")
+                + (" LIMIT :limit" if limit else "")
+            ).bindparams(query='"' + query.replace('"', '""') + '"')
+            if storage_ids is not None:
+                statement = statement.bindparams(bindparam("storage_ids", storage_ids, expanding=True))
+            if limit:
+                statement = statement.bindparams(limit=limit)
+            entries = self.db.query(CatalogEntry).from_statement(statement).all()
+        else:
+            entries_query = self.db.query(CatalogEntry).filter(CatalogEntry.name.ilike(f"%{query}%"))
+            if storage_ids is not None:
+                entries_query = entries_query.filter(CatalogEntry.storage_id.in_(storage_ids))
+            if limit:
+                entries_query = entries_query.limit(limit)
+            entries = entries_query.all()
+
+        names = {storage.id: storage.name for storage in self.db.query(Storage).all()}
+        files = []
+        for entry in entries:
+            file = File(
+                name=entry.name,
+                path=entry.path,
+                type="directory" if entry.is_dir else "file",
+                size=entry.size
+            )
+            file.modified = entry.mtime
+            file.etag = entry.etag
+            file.storage_id = entry.storage_id
+            file.storage_name = names.get(entry.storage_id)
+            files.append(file)
+        return files
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator
+
+class BlockingExecutor:
+    """存储后端独享的有界线程池，阻塞 I/O 在这里执行，避免卡住事件循环"""
+
+    def __init__(self, name: str, max_workers: int = 4):
+        self.name = name
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"storage-{name}")
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+
+    def _wrap(self, func: Callable, *args, **kwargs) -> Callable:
+        """包装任务以记录运行状态"""
+        def task():
+            with self._lock:
+                self._running += 1
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                with self._lock:
+                    self._failed += 1
+                raise
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+        return task
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """在线程池中执行阻塞函数"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._submitted += 1
+        return await loop.run_in_executor(self._pool, self._wrap(func, *args, **kwargs))
+
+    async def iterate(self, iterator: Iterator) -> AsyncIterator:
+        """在线程池中逐项推进阻塞迭代器"""
+        sentinel = object()
+        while True:
+            item = await self.run(next, iterator, sentinel)
+            if item is sentinel:
+                break
+            yield item
+
+    @property
+    def queue_depth(self) -> int:
+        """已提交但尚未开始执行的任务数"""
+        with self._lock:
+            return self._submitted - self._completed - self._running
+
+    def metrics(self) -> Dict[str, Any]:
+        """线程池运行指标"""
+        with self._lock:
+            return {
+                "name": self.name,
+                "max_workers": self.max_workers,
+                "running": self._running,
+                "queued": self._submitted - self._completed - self._running,
+                "completed": self._completed,
+                "failed": self._failed
+            }
+
+    def shutdown(self, wait: bool = True):
+        """关闭线程池"""
+        self._pool.shutdown(wait=wait)
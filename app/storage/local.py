@@ -1,25 +1,49 @@
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator
 import os
+import errno
+import shutil
 from datetime import datetime
-from .base import Storage
+from .base import Storage, DEFAULT_CHUNK_SIZE
 from ..models import File
 
+# Linux 上创建写时复制克隆（reflink）的 ioctl 请求号
+FICLONE = 0x40049409
+
+def _reflink_or_copy(src: Path, dst: Path):
+    """优先使用 reflink 克隆文件，文件系统不支持时退回普通复制"""
+    try:
+        import fcntl
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        shutil.copystat(src, dst)
+        return
+    except (ImportError, OSError):
+        pass
+    shutil.copy2(src, dst)
+
 class LocalStorage(Storage):
-    def __init__(self, base_path: str = "."):
+    def __init__(self, base_path: str = ".", max_workers: int = 4):
         self.base_path = Path(base_path)
-        
-    async def list_files(self, path: str = "/") -> List[File]:
-        """列出指定目录下的所有文件和文件夹"""
+        # 阻塞的磁盘操作都在独立线程池中执行
+        self.max_io_workers = max_workers
+
+    def _iter_items(self, directory: Path, recursive: bool):
+        for item in directory.iterdir():
+            if item.name.startswith(".") or item.name in ["venv", "node_modules", "__pycache__"]:
+                continue
+
+            yield item
+            if recursive and item.is_dir():
+                yield from self._iter_items(item, recursive)
+
+    def _list_files_sync(self, path: str, recursive: bool = False) -> List[File]:
         target_path = self.base_path / path.lstrip("/")
         if not target_path.exists():
             return []
-            
+
         files = []
-        for item in target_path.iterdir():
-            if item.name.startswith(".") or item.name in ["venv", "node_modules", "__pycache__"]:
-                continue
-                
+        for item in self._iter_items(target_path, recursive):
             stat = item.stat()
             files.append(File(
                 id=len(files) + 1,
@@ -29,15 +53,14 @@ class LocalStorage(Storage):
                 path=str(item.relative_to(self.base_path)),
                 modified=datetime.fromtimestamp(stat.st_mtime).isoformat()
             ))
-            
+
         return files
-        
-    async def get_file(self, path: str) -> Optional[File]:
-        """获取文件信息"""
+
+    def _get_file_sync(self, path: str) -> Optional[File]:
         target_path = self.base_path / path.lstrip("/")
         if not target_path.exists():
             return None
-            
+
         stat = target_path.stat()
         return File(
             name=target_path.name,
@@ -46,74 +69,154 @@ class LocalStorage(Storage):
             path=str(target_path.relative_to(self.base_path)),
             modified=datetime.fromtimestamp(stat.st_mtime).isoformat()
         )
-        
-    async def upload_file(self, path: str, file_data: bytes) -> File:
-        """上传文件"""
+
+    def _write_sync(self, path: str, file_data: bytes):
         target_path = self.base_path / path.lstrip("/")
         target_path.parent.mkdir(parents=True, exist_ok=True)
-        
+
         with open(target_path, "wb") as f:
             f.write(file_data)
-            
-        return await self.get_file(path)
-        
-    async def download_file(self, path: str) -> bytes:
-        """下载文件"""
+
+    def _read_sync(self, path: str) -> bytes:
         target_path = self.base_path / path.lstrip("/")
         if not target_path.exists():
             raise FileNotFoundError(f"文件不存在: {path}")
-            
+
         with open(target_path, "rb") as f:
             return f.read()
-            
-    async def delete_file(self, path: str) -> bool:
-        """删除文件或目录"""
+
+    def _delete_sync(self, path: str) -> bool:
         target_path = self.base_path / path.lstrip("/")
         if not target_path.exists():
             return False
-            
+
         if target_path.is_dir():
             target_path.rmdir()
         else:
             target_path.unlink()
         return True
-        
-    async def create_directory(self, path: str) -> bool:
-        """创建目录"""
+
+    def _mkdir_sync(self, path: str) -> bool:
         target_path = self.base_path / path.lstrip("/")
         if target_path.exists():
             return False
-            
+
         target_path.mkdir(parents=True)
         return True
-        
-    async def move_file(self, src_path: str, dst_path: str) -> bool:
-        """移动文件"""
+
+    def _move_sync(self, src_path: str, dst_path: str) -> bool:
         src = self.base_path / src_path.lstrip("/")
         dst = self.base_path / dst_path.lstrip("/")
-        
+
         if not src.exists():
             return False
-            
+
         dst.parent.mkdir(parents=True, exist_ok=True)
         src.rename(dst)
         return True
-        
-    async def copy_file(self, src_path: str, dst_path: str) -> bool:
-        """复制文件"""
+
+    def _copy_sync(self, src_path: str, dst_path: str) -> bool:
         src = self.base_path / src_path.lstrip("/")
         dst = self.base_path / dst_path.lstrip("/")
-        
+
         if not src.exists():
             return False
-            
+
         dst.parent.mkdir(parents=True, exist_ok=True)
-        
+
         if src.is_dir():
-            import shutil
             shutil.copytree(src, dst)
         else:
-            import shutil
             shutil.copy2(src, dst)
-            
-        return True 
\ No newline at end of file
+
+        return True
+
+    def _server_copy_sync(self, src_path: str, dst_root: Path, dst_path: str, move: bool):
+        src = self.base_path / src_path.lstrip("/")
+        dst = dst_root / dst_path.lstrip("/")
+        if not src.is_file():
+            raise FileNotFoundError(f"文件不存在: {src_path}")
+
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        if move:
+            try:
+                os.replace(src, dst)
+                return
+            except OSError as e:
+                # 跨文件系统时无法直接重命名
+                if e.errno != errno.EXDEV:
+                    raise
+
+        _reflink_or_copy(src, dst)
+        if move:
+            src.unlink()
+
+    async def list_files(self, path: str = "/", recursive: bool = False) -> List[File]:
+        """列出指定目录下的所有文件和文件夹"""
+        return await self._run(self._list_files_sync, path, recursive)
+
+    async def get_file(self, path: str) -> Optional[File]:
+        """获取文件信息"""
+        return await self._run(self._get_file_sync, path)
+
+    async def upload_file(self, path: str, file_data: bytes) -> File:
+        """上传文件"""
+        await self._run(self._write_sync, path, file_data)
+        return await self.get_file(path)
+
+    async def upload_stream(self, path: str, chunks: AsyncIterator[bytes]) -> File:
+        """分块写入文件，每块的写操作都在线程池中执行"""
+        target_path = self.base_path / path.lstrip("/")
+        await self._run(target_path.parent.mkdir, parents=True, exist_ok=True)
+
+        f = await self._run(open, target_path, "wb")
+        try:
+            async for chunk in chunks:
+                await self._run(f.write, chunk)
+        finally:
+            await self._run(f.close)
+        return await self.get_file(path)
+
+    async def download_file(self, path: str) -> bytes:
+        """下载文件"""
+        return await self._run(self._read_sync, path)
+
+    async def download_stream(self, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """分块读取文件，不把整个文件载入内存"""
+        target_path = self.base_path / path.lstrip("/")
+        if not await self._run(target_path.is_file):
+            raise FileNotFoundError(f"文件不存在: {path}")
+
+        f = await self._run(open, target_path, "rb")
+        try:
+            while True:
+                chunk = await self._run(f.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            await self._run(f.close)
+
+    async def delete_file(self, path: str) -> bool:
+        """删除文件或目录"""
+        return await self._run(self._delete_sync, path)
+
+    async def create_directory(self, path: str) -> bool:
+        """创建目录"""
+        return await self._run(self._mkdir_sync, path)
+
+    async def move_file(self, src_path: str, dst_path: str) -> bool:
+        """移动文件"""
+        return await self._run(self._move_sync, src_path, dst_path)
+
+    async def copy_file(self, src_path: str, dst_path: str) -> bool:
+        """复制文件"""
+        return await self._run(self._copy_sync, src_path, dst_path)
+
+    def same_endpoint(self, other: Storage) -> bool:
+        """本地存储之间都可以直接重命名或克隆"""
+        return isinstance(other, LocalStorage)
+
+    async def server_copy(self, src_path: str, dst: Storage, dst_path: str, move: bool = False):
+        """本地重命名，或以 reflink/普通复制的方式复制"""
+        await self._run(self._server_copy_sync, src_path, dst.base_path, dst_path, move)
@@ -0,0 +1,228 @@
+import os
+import json
+from typing import List, Optional, AsyncIterator
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from .base import StorageBackend, DEFAULT_CHUNK_SIZE
+from ..models import File
+
+# S3 分片上传要求除最后一片外每片不小于 5MB
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+class S3Storage(StorageBackend):
+    def __init__(self, config: str):
+        self.config = json.loads(config)
+        self.bucket = self.config['bucket']
+        self.endpoint = self.config.get('endpoint') or None
+        self.region = self.config.get('region', 'us-east-1')
+        self.prefix = self.config.get('path', '/').strip('/')
+        self.max_io_workers = int(self.config.get('max_workers', 8))
+        # 客户端线程安全，连接池大小与线程池一致
+        self.client = boto3.session.Session().client(
+            's3',
+            endpoint_url=self.endpoint,
+            region_name=self.region,
+            aws_access_key_id=self.config.get('access_key'),
+            aws_secret_access_key=self.config.get('secret_key'),
+            config=Config(max_pool_connections=self.max_io_workers)
+        )
+
+    def _key(self, path: str) -> str:
+        """存储内路径转换为对象键"""
+        path = path.strip('/')
+        if not self.prefix:
+            return path
+        return f'{self.prefix}/{path}' if path else self.prefix
+
+    def _path(self, key: str) -> str:
+        """对象键转换为存储内路径"""
+        if self.prefix:
+            key = key[len(self.prefix):]
+        return '/' + key.strip('/')
+
+    def _to_file(self, key: str, size: int = 0, modified=None, etag: Optional[str] = None,
+                 is_dir: bool = False) -> File:
+        path = self._path(key)
+        file = File(
+            name=os.path.basename(path),
+            path=path,
+            type="directory" if is_dir else "file",
+            size=size
+        )
+        file.modified = modified.isoformat() if modified else None
+        file.etag = etag.strip('"') if etag else None
+        return file
+
+    def _list_sync(self, path: str, recursive: bool) -> List[File]:
+        prefix = self._key(path)
+        if prefix:
+            prefix += '/'
+        params = {'Bucket': self.bucket, 'Prefix': prefix}
+        if not recursive:
+            params['Delimiter'] = '/'
+
+        files = []
+        for page in self.client.get_paginator('list_objects_v2').paginate(**params):
+            for common_prefix in page.get('CommonPrefixes', []):
+                files.append(self._to_file(common_prefix['Prefix'], is_dir=True))
+            for obj in page.get('Contents', []):
+                if obj['Key'] == prefix:
+                    continue
+                # 以 / 结尾的空对象是目录占位
+                is_dir = obj['Key'].endswith('/')
+                files.append(self._to_file(obj['Key'], obj['Size'], obj['LastModified'], obj.get('ETag'), is_dir))
+        return files
+
+    def _head_sync(self, path: str) -> Optional[File]:
+        key = self._key(path)
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return self._to_file(key, response['ContentLength'], response['LastModified'], response.get('ETag'))
+
+    def _read_sync(self, path: str) -> bytes:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(path))
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'NoSuchKey':
+                raise FileNotFoundError(f"文件不存在: {path}")
+            raise
+        return response['Body'].read()
+
+    def _copy_sync(self, src_key: str, dst_bucket: str, dst_key: str):
+        # 托管复制，大对象自动使用分片 UploadPartCopy，数据不经过本机
+        self.client.copy({'Bucket': self.bucket, 'Key': src_key}, dst_bucket, dst_key)
+
+    async def list_files(self, path: str = "/", recursive: bool = False) -> List[File]:
+        """列出指定路径下的文件"""
+        try:
+            return await self._run(self._list_sync, path, recursive)
+        except Exception as e:
+            print(f"Error listing files from S3: {e}")
+            return []
+
+    async def get_file(self, path: str) -> Optional[File]:
+        """获取文件信息"""
+        try:
+            return await self._run(self._head_sync, path)
+        except Exception as e:
+            print(f"Error getting file info from S3: {e}")
+            return None
+
+    async def upload_file(self, path: str, file_data: bytes) -> File:
+        """上传文件"""
+        await self._run(self.client.put_object, Bucket=self.bucket, Key=self._key(path), Body=file_data)
+        return await self.get_file(path)
+
+    async def upload_stream(self, path: str, chunks: AsyncIterator[bytes]) -> File:
+        """分片上传，内存中最多缓存一个分片"""
+        key = self._key(path)
+        buffer = bytearray()
+        upload_id = None
+        parts = []
+
+        async def flush():
+            response = await self._run(
+                self.client.upload_part,
+                Bucket=self.bucket, Key=key, UploadId=upload_id,
+                PartNumber=len(parts) + 1, Body=bytes(buffer)
+            )
+            parts.append({'ETag': response['ETag'], 'PartNumber': len(parts) + 1})
+
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                if len(buffer) < MIN_PART_SIZE:
+                    continue
+                if upload_id is None:
+                    response = await self._run(self.client.create_multipart_upload, Bucket=self.bucket, Key=key)
+                    upload_id = response['UploadId']
+                await flush()
+                buffer = bytearray()
+
+            if upload_id is None:
+                return await self.upload_file(path, bytes(buffer))
+
+            if buffer:
+                await flush()
+            await self._run(
+                self.client.complete_multipart_upload,
+                Bucket=self.bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+        except BaseException:
+            if upload_id is not None:
+                await self._run(self.client.abort_multipart_upload, Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+        return await self.get_file(path)
+
+    async def download_file(self, path: str) -> bytes:
+        """下载文件"""
+        return await self._run(self._read_sync, path)
+
+    async def download_stream(self, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """分块下载文件"""
+        try:
+            response = await self._run(self.client.get_object, Bucket=self.bucket, Key=self._key(path))
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'NoSuchKey':
+                raise FileNotFoundError(f"文件不存在: {path}")
+            raise
+        body = response['Body']
+        try:
+            async for chunk in self.executor.iterate(body.iter_chunks(chunk_size)):
+                yield chunk
+        finally:
+            body.close()
+
+    async def delete_file(self, path: str) -> bool:
+        """删除文件"""
+        try:
+            await self._run(self.client.delete_object, Bucket=self.bucket, Key=self._key(path))
+            return True
+        except Exception as e:
+            print(f"Error deleting file from S3: {e}")
+            return False
+
+    async def create_directory(self, path: str) -> bool:
+        """创建目录（写入以 / 结尾的占位对象）"""
+        try:
+            await self._run(self.client.put_object, Bucket=self.bucket, Key=self._key(path) + '/', Body=b'')
+            return True
+        except Exception as e:
+            print(f"Error creating directory in S3: {e}")
+            return False
+
+    async def move_file(self, src_path: str, dst_path: str) -> bool:
+        """移动文件"""
+        if not await self.copy_file(src_path, dst_path):
+            return False
+        return await self.delete_file(src_path)
+
+    async def copy_file(self, src_path: str, dst_path: str) -> bool:
+        """复制文件"""
+        try:
+            await self._run(self._copy_sync, self._key(src_path), self.bucket, self._key(dst_path))
+            return True
+        except Exception as e:
+            print(f"Error copying file in S3: {e}")
+            return False
+
+    def same_endpoint(self, other: StorageBackend) -> bool:
+        """同一服务端点和凭据下的存储之间可以直接 CopyObject"""
+        return (
+            isinstance(other, S3Storage)
+            and other.endpoint == self.endpoint
+            and other.region == self.region
+            and other.config.get('access_key') == self.config.get('access_key')
+        )
+
+    async def server_copy(self, src_path: str, dst: StorageBackend, dst_path: str, move: bool = False):
+        """服务端复制或移动"""
+        await self._run(self._copy_sync, self._key(src_path), dst.bucket, dst._key(dst_path))
+        if move:
+            await self._run(self.client.delete_object, Bucket=self.bucket, Key=self._key(src_path))
@@ -0,0 +1,105 @@
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+from .base import StorageBackend, DEFAULT_CHUNK_SIZE
+
+# 进度回调：(已传输字节数, 总字节数，未知时为 None)
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+class TransferError(Exception):
+    """跨存储传输失败"""
+
+class TransferEngine:
+    """在存储后端之间流式传输文件
+
+    同一服务端点之间优先使用服务端复制/移动；否则通过有界缓冲区
+    把源端的数据块直接管道到目标端，内存占用不超过
+    buffer_chunks * chunk_size，并用 sha256 校验目标文件。
+    """
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE, buffer_chunks: int = 4, verify: bool = True):
+        self.chunk_size = chunk_size
+        self.buffer_chunks = buffer_chunks
+        self.verify = verify
+
+    async def transfer(self, src: StorageBackend, src_path: str, dst: StorageBackend, dst_path: str,
+                       move: bool = False, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """复制或移动文件，返回传输结果"""
+        info = await src.get_file(src_path)
+        if info is None:
+            raise FileNotFoundError(f"文件不存在: {src_path}")
+        if info.type == "directory":
+            raise TransferError(f"不支持跨存储传输目录: {src_path}")
+        total = info.size
+
+        if src.same_endpoint(dst):
+            await src.server_copy(src_path, dst, dst_path, move=move)
+            copied = await dst.get_file(dst_path)
+            if copied is None or (total is not None and copied.size != total):
+                raise TransferError(f"服务端复制后目标文件不完整: {dst_path}")
+            if progress:
+                progress(total, total)
+            return {"mode": "server", "size": total, "checksum": None}
+
+        size, checksum = await self._pipe(src, src_path, dst, dst_path, total, progress)
+
+        if self.verify:
+            dst_checksum = await self._checksum(dst, dst_path)
+            if dst_checksum != checksum:
+                raise TransferError(f"校验和不一致: {src_path} -> {dst_path}")
+
+        if move:
+            await src.delete_file(src_path)
+        return {"mode": "stream", "size": size, "checksum": checksum}
+
+    async def _pipe(self, src: StorageBackend, src_path: str, dst: StorageBackend, dst_path: str,
+                    total: Optional[int], progress: Optional[ProgressCallback]):
+        """通过有界队列把源端数据块送入目标端"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.buffer_chunks)
+        digest = hashlib.sha256()
+        done = object()
+
+        async def produce():
+            try:
+                async for chunk in src.download_stream(src_path, self.chunk_size):
+                    digest.update(chunk)
+                    await queue.put(chunk)
+                await queue.put(done)
+            except BaseException as e:
+                # 把源端错误交给消费端抛出，避免目标端一直等待
+                await queue.put(e)
+                raise
+
+        transferred = 0
+
+        async def consume() -> AsyncIterator[bytes]:
+            nonlocal transferred
+            while True:
+                item = await queue.get()
+                if item is done:
+                    return
+                if isinstance(item, BaseException):
+                    raise TransferError(f"读取源文件失败: {item}") from item
+                transferred += len(item)
+                if progress:
+                    progress(transferred, total)
+                yield item
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            await dst.upload_stream(dst_path, consume())
+        finally:
+            if not producer.done():
+                producer.cancel()
+            try:
+                await producer
+            except (asyncio.CancelledError, Exception):
+                pass
+        return transferred, digest.hexdigest()
+
+    async def _checksum(self, storage: StorageBackend, path: str) -> str:
+        """流式计算文件的 sha256"""
+        digest = hashlib.sha256()
+        async for chunk in storage.download_stream(path, self.chunk_size):
+            digest.update(chunk)
+        return digest.hexdigest()
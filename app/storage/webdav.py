@@ -1,10 +1,28 @@
 import os
-from typing import List, Optional
+import asyncio
+from typing import List, Optional, Dict, Any, AsyncIterator
 import json
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote, unquote, urlsplit
+from xml.etree import ElementTree
 from webdav3.client import Client
-from .base import StorageBackend
+from webdav3.exceptions import ResponseErrorCode
+from requests.adapters import HTTPAdapter
+from .base import StorageBackend, DEFAULT_CHUNK_SIZE
 from ..models import File
 
+# 只请求列表需要的属性，避免 allprop 返回大量无用数据
+PROPFIND_BODY = b"""<?xml version="1.0" encoding="utf-8"?>
+<d:propfind xmlns:d="DAV:">
+  <d:prop>
+    <d:resourcetype/>
+    <d:getcontentlength/>
+    <d:getlastmodified/>
+    <d:getetag/>
+  </d:prop>
+</d:propfind>"""
+
 class WebDAVStorage(StorageBackend):
     def __init__(self, config: str):
         self.config = json.loads(config)
@@ -14,36 +32,127 @@ class WebDAVStorage(StorageBackend):
             'webdav_password': self.config['password'],
             'webdav_timeout': 30,
         })
+        # 服务器返回的 href 带有挂载路径前缀，需要去掉才能得到存储内路径
+        self.href_prefix = urlsplit(self.config['url']).path.rstrip('/')
+        # 递归列表时的最大并发 PROPFIND 数
+        self.max_parallel = int(self.config.get('max_parallel', 8))
+        # 同步的 webdav3 调用都放到独立线程池执行，并发数与连接池大小一致
+        self.max_io_workers = int(self.config.get('max_workers', self.max_parallel))
+        # 很多服务器禁用 Depth: infinity，可以在配置中直接关闭
+        self.depth_infinity = bool(self.config.get('depth_infinity', True))
+        # 所有请求共用同一个 Session，连接池大小与并发数一致，保持长连接复用
+        self.client.session.mount(
+            self.config['url'],
+            HTTPAdapter(pool_connections=1, pool_maxsize=self.max_io_workers)
+        )
+
+    def _propfind(self, path: str, depth) -> List[Dict[str, Any]]:
+        """执行一次 PROPFIND，返回路径下各资源的属性"""
+        response = self.client.execute_request(
+            'list',
+            quote(path),
+            data=PROPFIND_BODY,
+            headers_ext=[f'Depth: {depth}', 'Content-Type: application/xml; charset=utf-8']
+        )
+        return self._parse_multistatus(response.content)
+
+    def _parse_multistatus(self, content: bytes) -> List[Dict[str, Any]]:
+        """解析 207 Multi-Status 响应"""
+        entries = []
+        for response in ElementTree.fromstring(content).iter('{DAV:}response'):
+            href = response.findtext('{DAV:}href')
+            if not href:
+                continue
+
+            entry = {
+                'path': self._href_to_path(href),
+                'is_dir': False,
+                'size': 0,
+                'modified': None,
+                'etag': None
+            }
+            for propstat in response.findall('{DAV:}propstat'):
+                # 只取成功返回的属性，缺失的属性会单独以 404 propstat 返回
+                status = propstat.findtext('{DAV:}status') or ''
+                if ' 200 ' not in status:
+                    continue
+                prop = propstat.find('{DAV:}prop')
+                if prop is None:
+                    continue
+                resourcetype = prop.find('{DAV:}resourcetype')
+                if resourcetype is not None and resourcetype.find('{DAV:}collection') is not None:
+                    entry['is_dir'] = True
+                length = prop.findtext('{DAV:}getcontentlength')
+                if length:
+                    entry['size'] = int(length)
+                modified = prop.findtext('{DAV:}getlastmodified')
+                if modified:
+                    entry['modified'] = parsedate_to_datetime(modified).isoformat()
+                etag = prop.findtext('{DAV:}getetag')
+                if etag:
+                    entry['etag'] = etag.strip('"')
+            entries.append(entry)
+        return entries
+
+    def _href_to_path(self, href: str) -> str:
+        """将服务器返回的 href 转换为存储内路径"""
+        path = unquote(urlsplit(href).path)
+        if self.href_prefix and path.startswith(self.href_prefix):
+            path = path[len(self.href_prefix):]
+        path = '/' + path.strip('/')
+        return path
+
+    def _to_file(self, entry: Dict[str, Any]) -> File:
+        """将 PROPFIND 结果转换为文件对象"""
+        file = File(
+            name=os.path.basename(entry['path']),
+            path=entry['path'],
+            type="directory" if entry['is_dir'] else "file",
+            size=entry['size']
+        )
+        file.modified = entry['modified']
+        file.etag = entry['etag']
+        return file
+
+    async def _list_recursive(self, path: str) -> List[Dict[str, Any]]:
+        """递归列出目录，优先使用 Depth: infinity，不支持时改为并发广度优先遍历"""
+        if self.depth_infinity:
+            try:
+                return await self._run(self._propfind, path, 'infinity')
+            except ResponseErrorCode as e:
+                # RFC 4918 中服务器以 403 (propfind-finite-depth) 拒绝无限深度
+                if e.code != 403:
+                    raise
 
-    async def list_files(self, path: str = "/") -> List[File]:
-        """列出指定路径下的文件"""
+        # 每层目录并发请求，并发度由后端线程池限制
+        entries = []
+        level = [path]
+        while level:
+            results = await asyncio.gather(*(self._run(self._propfind, directory, 1) for directory in level))
+            next_level = []
+            for directory, children in zip(level, results):
+                for entry in children:
+                    if entry['path'] == directory:
+                        continue
+                    entries.append(entry)
+                    if entry['is_dir']:
+                        next_level.append(entry['path'])
+            level = next_level
+        return entries
+
+    async def list_files(self, path: str = "/", recursive: bool = False) -> List[File]:
+        """列出指定路径下的文件，一次 PROPFIND 获取全部子项属性"""
         try:
             # 确保路径以/开头
-            path = path if path.startswith('/') else f'/{path}'
+            path = '/' + path.strip('/')
             
-            # 获取文件列表
-            files = self.client.list(path)
-            result = []
+            if recursive:
+                entries = await self._list_recursive(path)
+            else:
+                entries = await self._run(self._propfind, path, 1)
             
-            for file_path in files:
-                # 跳过当前目录
-                if file_path == path:
-                    continue
-                    
-                # 获取文件信息
-                info = self.client.info(file_path)
-                is_dir = info.get('type') == 'directory'
-                
-                # 创建文件对象
-                file = File(
-                    name=os.path.basename(file_path),
-                    path=file_path,
-                    type="directory" if is_dir else "file",
-                    size=info.get('size', 0)
-                )
-                result.append(file)
-                
-            return result
+            # 跳过当前目录
+            return [self._to_file(entry) for entry in entries if entry['path'] != path]
         except Exception as e:
             print(f"Error listing files from WebDAV: {e}")
             return []
@@ -55,17 +164,11 @@ class WebDAVStorage(StorageBackend):
             path = path if path.startswith('/') else f'/{path}'
             
             # 获取文件信息
-            info = self.client.info(path)
-            if not info:
+            entries = await self._run(self._propfind, path, 0)
+            if not entries:
                 return None
                 
-            is_dir = info.get('type') == 'directory'
-            return File(
-                name=os.path.basename(path),
-                path=path,
-                type="directory" if is_dir else "file",
-                size=info.get('size', 0)
-            )
+            return self._to_file(entries[0])
         except Exception as e:
             print(f"Error getting file info from WebDAV: {e}")
             return None
@@ -76,16 +179,8 @@ class WebDAVStorage(StorageBackend):
             # 确保路径以/开头
             path = path if path.startswith('/') else f'/{path}'
             
-            # 创建临时文件
-            temp_path = f"/tmp/{os.path.basename(path)}"
-            with open(temp_path, 'wb') as f:
-                f.write(file_data)
-            
-            # 上传文件
-            self.client.upload_sync(temp_path, path)
-            
-            # 删除临时文件
-            os.remove(temp_path)
+            # 直接以请求体发送，不经过临时文件
+            await self._run(self.client.execute_request, 'upload', quote(path), data=file_data)
             
             # 返回文件信息
             return await self.get_file(path)
@@ -93,30 +188,53 @@ class WebDAVStorage(StorageBackend):
             print(f"Error uploading file to WebDAV: {e}")
             raise
 
-    async def download_file(self, path: str) -> bytes:
-        """下载文件"""
+    async def upload_stream(self, path: str, chunks: AsyncIterator[bytes]) -> File:
+        """以分块传输编码流式上传，数据块直接写入 HTTP 连接"""
         try:
             # 确保路径以/开头
             path = path if path.startswith('/') else f'/{path}'
+            loop = asyncio.get_running_loop()
             
-            # 创建临时文件
-            temp_path = f"/tmp/{os.path.basename(path)}"
-            
-            # 下载文件
-            self.client.download_sync(path, temp_path)
+            async def next_chunk():
+                return await chunks.__anext__()
             
-            # 读取文件内容
-            with open(temp_path, 'rb') as f:
-                content = f.read()
+            def body():
+                # 在线程池中运行，从事件循环逐块拉取数据
+                while True:
+                    try:
+                        chunk = asyncio.run_coroutine_threadsafe(next_chunk(), loop).result()
+                    except StopAsyncIteration:
+                        return
+                    if chunk:
+                        yield chunk
             
-            # 删除临时文件
-            os.remove(temp_path)
-            
-            return content
+            await self._run(self.client.execute_request, 'upload', quote(path), data=body())
+            return await self.get_file(path)
+        except Exception as e:
+            print(f"Error uploading file to WebDAV: {e}")
+            raise
+
+    async def download_file(self, path: str) -> bytes:
+        """下载文件"""
+        try:
+            chunks = [chunk async for chunk in self.download_stream(path)]
+            return b"".join(chunks)
         except Exception as e:
             print(f"Error downloading file from WebDAV: {e}")
             raise
 
+    async def download_stream(self, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """分块下载文件，数据直接从 HTTP 连接读出，不落盘"""
+        # 确保路径以/开头
+        path = path if path.startswith('/') else f'/{path}'
+        response = await self._run(self.client.execute_request, 'download', quote(path))
+        try:
+            async for chunk in self.executor.iterate(response.iter_content(chunk_size)):
+                if chunk:
+                    yield chunk
+        finally:
+            response.close()
+
     async def delete_file(self, path: str) -> bool:
         """删除文件"""
         try:
@@ -124,7 +242,7 @@ class WebDAVStorage(StorageBackend):
             path = path if path.startswith('/') else f'/{path}'
             
             # 删除文件
-            self.client.clean(path)
+            await self._run(self.client.clean, path)
             return True
         except Exception as e:
             print(f"Error deleting file from WebDAV: {e}")
@@ -137,7 +255,7 @@ class WebDAVStorage(StorageBackend):
             path = path if path.startswith('/') else f'/{path}'
             
             # 创建目录
-            self.client.mkdir(path)
+            await self._run(self.client.mkdir, path)
             return True
         except Exception as e:
             print(f"Error creating directory in WebDAV: {e}")
@@ -151,7 +269,7 @@ class WebDAVStorage(StorageBackend):
             dst_path = dst_path if dst_path.startswith('/') else f'/{dst_path}'
             
             # 移动文件
-            self.client.move(src_path, dst_path)
+            await self._run(self.client.move, src_path, dst_path)
             return True
         except Exception as e:
             print(f"Error moving file in WebDAV: {e}")
@@ -165,8 +283,29 @@ class WebDAVStorage(StorageBackend):
             dst_path = dst_path if dst_path.startswith('/') else f'/{dst_path}'
             
             # 复制文件
-            self.client.copy(src_path, dst_path)
+            await self._run(self.client.copy, src_path, dst_path)
             return True
         except Exception as e:
             print(f"Error copying file in WebDAV: {e}")
-            return False 
\ No newline at end of file
+            return False 
+
+    def same_endpoint(self, other: StorageBackend) -> bool:
+        """同一服务器和账号下的存储之间可以直接 COPY/MOVE"""
+        if not isinstance(other, WebDAVStorage):
+            return False
+        mine, theirs = urlsplit(self.config['url']), urlsplit(other.config['url'])
+        return (
+            (mine.scheme, mine.netloc) == (theirs.scheme, theirs.netloc)
+            and self.config.get('username') == other.config.get('username')
+        )
+
+    async def server_copy(self, src_path: str, dst: StorageBackend, dst_path: str, move: bool = False):
+        """使用 WebDAV COPY/MOVE 在服务器端完成复制或移动"""
+        src_path = src_path if src_path.startswith('/') else f'/{src_path}'
+        dst_path = dst_path if dst_path.startswith('/') else f'/{dst_path}'
+        await self._run(
+            self.client.execute_request,
+            'move' if move else 'copy',
+            quote(src_path),
+            headers_ext=[f'Destination: {dst.client.get_url(quote(dst_path))}', 'Overwrite: T']
+        )
@@ -0,0 +1,148 @@
+"""AI 分析模式基准测试
+
+在本机启动一个模拟的 chat/completions 服务，对比 AIService.analyze_text 的几种模式：
+- separate：摘要、标签、情感分析分别请求（三次请求，文件内容发送三次）
+- structured：一次请求返回 JSON 结果
+- structured（结果无效）：模拟模型返回无法解析的 JSON，退回 separate 模式
+
+模拟服务按 固定开销 + 输入 token 数 × 预填充耗时 + 输出 token 数 × 生成耗时 计算每个请求的延迟，
+并在服务端统计收到的请求数和输入 token 数（CJK 字符按 1 个 token，其余字符按 4 个一 token 估算）。
+
+用法: python bench_ai_modes.py [每种模式的次数] [固定开销毫秒] [每个输出 token 毫秒]
+"""
+import io
+import re
+import sys
+import json
+import time
+import threading
+import statistics
+import contextlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from services.ai_service import AIService, STRUCTURED_PROMPT
+from services.tokenizer import CJK_RANGES
+from services.rate_limit import TokenBucket
+
+_CJK_RE = re.compile(f'[{CJK_RANGES}]')
+# 预填充每个输入 token 的耗时（毫秒）
+PREFILL_MS_PER_TOKEN = 0.02
+
+def estimate_tokens(text):
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+class MockServer:
+    """模拟的 chat/completions 服务，按系统提示词返回对应格式的结果"""
+
+    def __init__(self, overhead_ms, ms_per_output_token):
+        self.overhead_ms = overhead_ms
+        self.ms_per_output_token = ms_per_output_token
+        self.broken_json = False
+        self.requests = 0
+        self.prompt_tokens = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}/v1'
+
+    def reply(self, system_prompt):
+        if system_prompt == STRUCTURED_PROMPT:
+            if self.broken_json:
+                return '{"summary": "季度经营情况总结", "tags": ["财务", '
+            return json.dumps({
+                'summary': '本文总结了公司本季度的经营情况，收入同比增长，成本控制良好，并提出了下季度的工作重点。',
+                'tags': ['季度报告', '财务', '经营', '增长', '成本'],
+                'sentiment': 0.6
+            }, ensure_ascii=False)
+        if '标签' in system_prompt:
+            return '季度报告, 财务, 经营, 增长, 成本'
+        if '情感' in system_prompt:
+            return '0.6'
+        return '本文总结了公司本季度的经营情况，收入同比增长，成本控制良好，并提出了下季度的工作重点。'
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                prompt = ''.join(message['content'] for message in body['messages'])
+                prompt_tokens = estimate_tokens(prompt)
+                content = server.reply(body['messages'][0]['content'])
+                completion_tokens = estimate_tokens(content)
+                with server._lock:
+                    server.requests += 1
+                    server.prompt_tokens += prompt_tokens
+                time.sleep((server.overhead_ms + prompt_tokens * PREFILL_MS_PER_TOKEN
+                            + completion_tokens * server.ms_per_output_token) / 1000)
+
+                payload = json.dumps({
+                    'choices': [{'message': {'role': 'assistant', 'content': content}}],
+                    'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens}
+                }).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+
+    def reset(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+
+def make_document(chars=6000):
+    paragraph = ('本季度公司实现营业收入同比增长百分之十二，主要得益于新产品线的推出和海外市场的拓展。'
+                 'Operating costs were kept under control while R&D investment increased. ')
+    return (paragraph * (chars // len(paragraph) + 1))[:chars]
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    overhead_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 150
+    ms_per_output_token = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    server = MockServer(overhead_ms, ms_per_output_token)
+    server.start()
+    service = AIService()
+    service.api_base = server.url
+    service.config = {'apiKey': 'bench', 'temperature': 0.7}
+    # 只比较请求本身的耗时，不受 API 速率限制影响
+    service.rate_limiter = TokenBucket(1e9, 1e9)
+    document = make_document()
+
+    cases = [
+        ('separate', 'separate', False),
+        ('structured', 'structured', False),
+        ('structured（结果无效）', 'structured', True),
+    ]
+    print(f'文档 {len(document)} 字符，每种模式 {runs} 次，固定开销 {overhead_ms:.0f}ms，'
+          f'每个输出 token {ms_per_output_token:.1f}ms\n')
+    print(f'{"模式":<22}{"平均(ms)":>10}{"中位数(ms)":>12}{"请求数":>8}{"输入 token":>12}')
+    try:
+        for label, mode, broken_json in cases:
+            server.broken_json = broken_json
+            server.reset()
+            timings = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                # 退回 separate 模式时的提示信息不打印到结果表格中
+                with contextlib.redirect_stdout(io.StringIO()):
+                    summary, tags, sentiment = service.analyze_text(document, mode)
+                timings.append((time.perf_counter() - started) * 1000)
+                assert summary and tags and -1 <= sentiment <= 1
+            print(f'{label:<20}{statistics.mean(timings):>10.1f}{statistics.median(timings):>12.1f}'
+                  f'{server.requests / runs:>8.1f}{server.prompt_tokens / runs:>12.0f}')
+    finally:
+        server.stop()
+
+if __name__ == '__main__':
+    main()
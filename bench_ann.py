@@ -0,0 +1,80 @@
+"""近似最近邻索引基准测试
+
+在临时目录中生成合成的聚类向量数据，对比精确检索与不同 nprobe 下 IVF 近似检索的延迟和 recall@k。
+recall@k 为近似检索返回的 k 个文件中属于精确检索前 k 个的比例。
+
+用法: python bench_ann.py [向量数] [维度] [查询数] [nlist]
+"""
+import sys
+import time
+import tempfile
+import statistics
+import numpy as np
+from services import vector_store as store_module
+from services.vector_store import VectorStore, normalize
+from services.ann_index import default_nlist
+
+K = 10
+NPROBES = (1, 2, 4, 8, 16, 32, 64)
+
+def make_dataset(count, dim, rng, clusters=1000, noise=2.0):
+    """围绕随机中心生成的向量，接近真实嵌入向量按主题聚集的分布"""
+    centers = normalize(rng.normal(size=(clusters, dim)))
+    labels = rng.integers(0, clusters, count)
+    data = centers[labels] + rng.normal(scale=noise / np.sqrt(dim), size=(count, dim))
+    return normalize(data)
+
+def measure(store, queries, **options):
+    """返回 (每次检索的毫秒数列表, 每个查询返回的文件ID列表)"""
+    timings = []
+    results = []
+    for query in queries:
+        started = time.perf_counter()
+        hits = store.search(query, K, **options)
+        timings.append((time.perf_counter() - started) * 1000)
+        results.append([file_id for file_id, _, _ in hits])
+    return timings, results
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    query_count = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    nlist = int(sys.argv[4]) if len(sys.argv) > 4 else default_nlist(count)
+    # 数据量小于默认阈值时也使用近似索引
+    store_module.ANN_MIN_VECTORS = 0
+
+    rng = np.random.default_rng(0)
+    data = make_dataset(count, dim, rng)
+    # 查询取数据点附近的向量
+    queries = normalize(data[rng.choice(count, query_count, replace=False)]
+                        + rng.normal(scale=0.3 / np.sqrt(dim), size=(query_count, dim)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = VectorStore(directory)
+        started = time.perf_counter()
+        for start in range(0, count, 50000):
+            batch = data[start:start + 50000]
+            store.add_many(np.arange(start, start + len(batch)), batch, np.zeros(len(batch), dtype=np.int64))
+        print(f'{count} 个 {dim} 维向量，写入耗时 {time.perf_counter() - started:.1f}s')
+
+        exact_timings, truth = measure(store, queries, exact=True)
+
+        started = time.perf_counter()
+        store.build_index(nlist)
+        print(f'训练 IVF 索引（nlist={nlist}）耗时 {time.perf_counter() - started:.1f}s，查询 {query_count} 次，k={K}\n')
+
+        print(f'{"方式":<16}{"平均(ms)":>10}{"P95(ms)":>10}{"recall@k":>10}{"加速比":>8}')
+        exact_mean = statistics.mean(exact_timings)
+        print(f'{"精确检索":<14}{exact_mean:>12.2f}{np.percentile(exact_timings, 95):>10.2f}{1.0:>10.3f}{1.0:>9.1f}')
+        for nprobe in NPROBES:
+            if nprobe > nlist:
+                break
+            timings, results = measure(store, queries, nprobe=nprobe)
+            recall = statistics.mean(len(set(result) & set(expected)) / K
+                                     for result, expected in zip(results, truth))
+            mean = statistics.mean(timings)
+            print(f'{f"IVF nprobe={nprobe}":<16}{mean:>10.2f}{np.percentile(timings, 95):>10.2f}'
+                  f'{recall:>10.3f}{exact_mean / mean:>9.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""文件列表查询基准测试
+
+在临时 SQLite 数据库中生成合成的文件目录，对比旧版（content 列在 files 表中）
+与新版（content 在 file_contents 表中）列表查询的耗时和内存峰值。
+
+用法: python bench_listing.py [行数] [每行内容字节数]
+"""
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+import datetime
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text
+from sqlalchemy.orm import Session, declarative_base
+from models.file import File, FileContent
+# 导入外键引用的表，使 create_all 能建出完整的新版表结构
+from models.storage import Storage
+from models.blob import Blob
+from database import Base
+
+LegacyBase = declarative_base()
+
+class LegacyFile(LegacyBase):
+    """旧版 files 表结构：content 与元数据在同一行"""
+    __tablename__ = 'files'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(255), nullable=False)
+    original_name = Column(String(255), nullable=False)
+    path = Column(String(255), nullable=False)
+    size = Column(Integer, nullable=False)
+    type = Column(String(50), nullable=False)
+    mime_type = Column(String(100))
+    content = Column(Text)
+    storage_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+
+def make_rows(count, content_size):
+    base = datetime.datetime(2024, 1, 1)
+    text = ('季度报告 quarterly report ' * (content_size // 20 + 1))[:content_size]
+    for i in range(1, count + 1):
+        created_at = base + datetime.timedelta(seconds=i)
+        yield {
+            'id': i,
+            'name': f'file{i}.txt',
+            'original_name': f'file{i}.txt',
+            'path': f'20240101/file{i}.txt',
+            'size': content_size,
+            'type': 'text/plain',
+            'mime_type': 'text/plain',
+            'storage_id': 1,
+            'created_at': created_at,
+            'updated_at': created_at,
+            'content': text
+        }
+
+def populate(engine, legacy, count, content_size, batch=5000):
+    rows = []
+    with engine.begin() as conn:
+        for row in make_rows(count, content_size):
+            rows.append(row)
+            if len(rows) < batch:
+                continue
+            insert_batch(conn, legacy, rows)
+            rows = []
+        if rows:
+            insert_batch(conn, legacy, rows)
+
+def insert_batch(conn, legacy, rows):
+    if legacy:
+        conn.execute(LegacyFile.__table__.insert(), rows)
+        return
+    conn.execute(File.__table__.insert(), [
+        {key: value for key, value in row.items() if key != 'content'} for row in rows
+    ])
+    conn.execute(FileContent.__table__.insert(), [
+        {'file_id': row['id'], 'content': row['content']} for row in rows
+    ])
+
+def measure(engine, model, limit=None, repeat=3):
+    """返回 (最短耗时秒数, 内存峰值字节数)"""
+    best, peak = None, 0
+    for _ in range(repeat):
+        with Session(engine) as session:
+            query = session.query(model).filter_by(storage_id=1).order_by(model.created_at.desc())
+            if limit:
+                query = query.limit(limit)
+            tracemalloc.start()
+            started = time.perf_counter()
+            rows = query.all()
+            elapsed = time.perf_counter() - started
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            del rows
+        best = elapsed if best is None else min(best, elapsed)
+    return best, peak
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    content_size = int(sys.argv[2]) if len(sys.argv) > 2 else 2048
+
+    with tempfile.TemporaryDirectory() as directory:
+        engines = {}
+        for label, legacy in (('旧版（content 在 files 表）', True), ('新版（content 在 file_contents 表）', False)):
+            engine = create_engine(f'sqlite:///{os.path.join(directory, "legacy.db" if legacy else "split.db")}')
+            (LegacyBase if legacy else Base).metadata.create_all(engine)
+            started = time.perf_counter()
+            populate(engine, legacy, count, content_size)
+            print(f'{label}: 生成 {count} 行用时 {time.perf_counter() - started:.1f}s')
+            engines[label] = (engine, LegacyFile if legacy else File)
+
+        print(f'\n{"布局":<34}{"查询":<12}{"耗时(ms)":>10}{"内存峰值(MB)":>14}')
+        for label, (engine, model) in engines.items():
+            for name, limit in (('全部', None), ('前 50 行', 50)):
+                elapsed, peak = measure(engine, model, limit)
+                print(f'{label:<30}{name:<12}{elapsed * 1000:>10.1f}{peak / 1024 / 1024:>14.1f}')
+
+if __name__ == '__main__':
+    main()
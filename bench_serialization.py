@@ -0,0 +1,100 @@
+"""文件列表序列化基准测试
+
+在临时 SQLite 数据库中生成合成的文件目录，对比列表接口的几种序列化方式每秒处理的行数：
+- ORM 对象 + File.to_dict() + json（改动前 /files/api/files 的做法）
+- 只查询列的元组 + 标准库 json
+- 只查询列的元组 + orjson（未安装时跳过）
+
+用法: python bench_serialization.py [行数] [每页行数]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from models.file import File
+# 导入外键引用的表，使 create_all 能建出完整的表结构
+from models.storage import Storage
+from models.blob import Blob
+from database import Base
+from services import serialization
+from services.serialization import FILE_COLUMNS, rows_to_dicts
+
+def populate(engine, count, batch=5000):
+    base = datetime.datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        for start in range(1, count + 1, batch):
+            rows = []
+            for i in range(start, min(start + batch, count + 1)):
+                created_at = base + datetime.timedelta(seconds=i, microseconds=i % 1000)
+                rows.append({
+                    'id': i,
+                    'name': f'file{i}.pdf',
+                    'original_name': f'季度报告 {i}.pdf',
+                    'path': f'20240101/file{i}.pdf',
+                    'size': 1024 * i,
+                    'type': 'pdf',
+                    'mime_type': 'application/pdf',
+                    'checksum': f'{i:064x}',
+                    'storage_id': 1,
+                    'created_at': created_at,
+                    'updated_at': created_at
+                })
+            conn.execute(File.__table__.insert(), rows)
+
+def orm_to_dict(session, limit):
+    files = session.query(File).filter_by(storage_id=1).order_by(File.created_at.desc(), File.id.desc()).limit(limit).all()
+    return json.dumps({'files': [file.to_dict() for file in files]}).encode('utf-8')
+
+def columns_json(session, limit):
+    rows = session.query(*FILE_COLUMNS).filter(File.storage_id == 1) \
+        .order_by(File.created_at.desc(), File.id.desc()).limit(limit).all()
+    return json.dumps({'files': rows_to_dicts(rows)}, default=serialization._default).encode('utf-8')
+
+def columns_orjson(session, limit):
+    rows = session.query(*FILE_COLUMNS).filter(File.storage_id == 1) \
+        .order_by(File.created_at.desc(), File.id.desc()).limit(limit).all()
+    return serialization.dumps({'files': rows_to_dicts(rows)})
+
+def measure(engine, fn, limit, repeat=5):
+    """返回最短耗时秒数"""
+    best = None
+    for _ in range(repeat):
+        with Session(engine) as session:
+            started = time.perf_counter()
+            fn(session, limit)
+            elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    page_sizes = [int(sys.argv[2])] if len(sys.argv) > 2 else [50, 200, count]
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f'sqlite:///{os.path.join(directory, "bench.db")}')
+        Base.metadata.create_all(engine)
+        populate(engine, count)
+
+        cases = [('ORM + to_dict + json', orm_to_dict), ('列元组 + json', columns_json)]
+        if serialization.orjson is not None:
+            cases.append(('列元组 + orjson', columns_orjson))
+        else:
+            print('未安装 orjson，跳过对应的测试')
+
+        # 确认各方式输出的内容一致
+        with Session(engine) as session:
+            outputs = [json.loads(fn(session, 50)) for _, fn in cases]
+        assert all(output == outputs[0] for output in outputs), '序列化结果不一致'
+
+        print(f'\n{"方式":<24}{"每页行数":>10}{"耗时(ms)":>12}{"行/秒":>14}')
+        for limit in page_sizes:
+            for label, fn in cases:
+                elapsed = measure(engine, fn, limit)
+                print(f'{label:<24}{limit:>10}{elapsed * 1000:>12.1f}{limit / elapsed:>14.0f}')
+
+if __name__ == '__main__':
+    main()
@@ -1,29 +1,134 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, event, insert
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from services.tokenizer import index_text
+from alembic import command
+from alembic.config import Config
 import os
 
-# 创建数据库引擎
-engine = create_engine('sqlite:///ailist.db')
+# Alembic 配置文件及引入迁移前的表结构对应的版本
+ALEMBIC_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alembic.ini')
+BASELINE_REVISION = '0001'
+
+# 数据库配置，均可通过环境变量覆盖
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///ailist.db')
+# 只读连接使用的地址（如 PostgreSQL 只读副本），未设置时与 DATABASE_URL 相同
+DATABASE_READ_URL = os.getenv('DATABASE_READ_URL', DATABASE_URL)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 3600))
+# SQLite 连接参数：WAL 模式下读不阻塞写；NORMAL 同步级别在 WAL 下仍能保证一致性
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    # 负数表示 KiB，默认 64MB 页缓存
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -64000)),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    # 写锁被占用时等待的毫秒数，而不是立即报 database is locked
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+    'temp_store': 'MEMORY',
+}
+
+def is_sqlite(bind):
+    """数据库是否为 SQLite（全文索引、分词函数等只在 SQLite 上启用）"""
+    return bind.dialect.name == 'sqlite'
+
+def insert_ignore(bind, table):
+    """唯一约束冲突时不插入的 INSERT，用于并发事务同时插入同一行的情况"""
+    if bind.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif bind.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return insert(table)
+    return dialect_insert(table).on_conflict_do_nothing()
+
+def create_db_engine(url, readonly=False):
+    """按配置创建数据库引擎"""
+    url = make_url(url)
+    options = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_pre_ping': url.get_backend_name() != 'sqlite',
+    }
+    if url.get_backend_name() == 'sqlite':
+        # 连接在线程池和请求线程之间复用
+        options['connect_args'] = {
+            'check_same_thread': False,
+            'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000
+        }
+        if url.database in (None, '', ':memory:'):
+            # 内存数据库每个连接各自独立，不能使用连接池
+            options = {'connect_args': options['connect_args']}
+    else:
+        options['pool_recycle'] = DB_POOL_RECYCLE
+        if readonly and url.get_backend_name() == 'postgresql':
+            options['execution_options'] = {'postgresql_readonly': True}
+
+    new_engine = create_engine(url, **options)
+    if is_sqlite(new_engine):
+        event.listen(new_engine, 'connect', _configure_sqlite_connection)
+        if readonly:
+            event.listen(new_engine, 'connect', _set_sqlite_readonly)
+    return new_engine
+
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    """设置 SQLite 连接参数，并注册全文索引使用的中英文分词函数"""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
+    dbapi_connection.create_function('search_tokens', 1, index_text, deterministic=True)
+
+def _set_sqlite_readonly(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA query_only = ON')
+    cursor.close()
+
+# 读写引擎，以及供列表、搜索等只读查询使用的引擎
+engine = create_db_engine(DATABASE_URL)
+read_engine = create_db_engine(DATABASE_READ_URL, readonly=True)
 
 # 创建会话工厂
 db_session = scoped_session(sessionmaker(autocommit=False,
                                        autoflush=False,
                                        bind=engine))
+# 只读会话：连接处于只读模式，误写入时由数据库直接报错
+read_session = scoped_session(sessionmaker(autocommit=False,
+                                         autoflush=False,
+                                         bind=read_engine))
 
 # 创建基类
 Base = declarative_base()
 Base.query = db_session.query_property()
 
 def init_db():
-    """初始化数据库"""
+    """初始化数据库：执行 Alembic 迁移到最新版本"""
     # 导入所有模型，确保它们被注册到 Base.metadata
     import models.storage
     import models.file
+    import models.blob
+    import models.ai
+    import models.stats
+    from services import search_index
+    # 注册维护统计表的映射事件
+    import services.stats
+    
+    config = Config(ALEMBIC_CONFIG)
+    with engine.begin() as connection:
+        config.attributes['connection'] = connection
+        inspector = inspect(connection)
+        # 引入 Alembic 之前由 create_all 建的库：标记为初始版本，后续迁移会跳过已存在的表和列
+        if inspector.has_table('files') and not inspector.has_table('alembic_version'):
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, 'head')
     
-    # 创建所有表
-    Base.metadata.create_all(bind=engine)
+    search_index.create_index()
 
 def shutdown_session(exception=None):
-    """关闭数据库会话"""
-    db_session.remove() 
\ No newline at end of file
+    """关闭数据库会话，归还连接并结束只读事务，避免长时间持有旧快照"""
+    db_session.remove()
+    read_session.remove() 
\ No newline at end of file
@@ -0,0 +1,56 @@
+from logging.config import fileConfig
+from alembic import context
+from database import Base, engine
+import models.storage
+import models.file
+import models.blob
+import models.ai
+import models.stats
+
+config = context.config
+
+# 由 init_db 以编程方式调用时沿用应用的日志配置
+if config.config_file_name is not None and 'connection' not in config.attributes:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+def include_object(object, name, type_, reflected, compare_to):
+    """全文索引虚拟表及其影子表由 services.search_index 维护，不参与自动生成"""
+    return not (type_ == 'table' and name.startswith('files_fts'))
+
+def run_migrations_offline():
+    context.configure(
+        url=engine.url.render_as_string(hide_password=False),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        render_as_batch=True,
+        include_object=include_object
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    # 允许调用方（init_db、测试）传入已打开的连接
+    connection = config.attributes.get('connection')
+    if connection is not None:
+        _run(connection)
+        return
+    with engine.connect() as connection:
+        _run(connection)
+
+def _run(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        # SQLite 不支持大多数 ALTER TABLE，以批处理方式重建表
+        render_as_batch=True,
+        include_object=include_object
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,26 @@
+"""文件内容的 sha256 校验和
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 引入 Alembic 之前的数据库可能已由旧版 upgrade_schema 补过该列
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('files')}
+    if 'checksum' not in columns:
+        op.add_column('files', sa.Column('checksum', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('files') as batch_op:
+        batch_op.drop_column('checksum')
@@ -0,0 +1,43 @@
+"""按内容去重的内容块表及文件引用
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('blobs'):
+        op.create_table(
+            'blobs',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('storage_id', sa.Integer(), nullable=False),
+            sa.Column('checksum', sa.String(length=64), nullable=False),
+            sa.Column('path', sa.String(length=255), nullable=False),
+            sa.Column('size', sa.Integer(), nullable=False),
+            sa.Column('ref_count', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['storage_id'], ['storages.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('storage_id', 'checksum', name='uq_blobs_storage_checksum')
+        )
+    columns = {column['name'] for column in inspector.get_columns('files')}
+    if 'blob_id' not in columns:
+        with op.batch_alter_table('files') as batch_op:
+            batch_op.add_column(sa.Column('blob_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key('fk_files_blob_id_blobs', 'blobs', ['blob_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('files') as batch_op:
+        batch_op.drop_column('blob_id')
+    op.drop_table('blobs')
@@ -0,0 +1,45 @@
+"""把 files.content 移到 file_contents 表，列表查询不再读取大字段
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('file_contents'):
+        op.create_table(
+            'file_contents',
+            sa.Column('file_id', sa.Integer(), nullable=False),
+            sa.Column('content', sa.Text(), nullable=True),
+            sa.ForeignKeyConstraint(['file_id'], ['files.id']),
+            sa.PrimaryKeyConstraint('file_id')
+        )
+    columns = {column['name'] for column in inspector.get_columns('files')}
+    if 'content' in columns:
+        op.execute(
+            'INSERT INTO file_contents (file_id, content) '
+            'SELECT id, content FROM files WHERE content IS NOT NULL '
+            'AND id NOT IN (SELECT file_id FROM file_contents)'
+        )
+        with op.batch_alter_table('files') as batch_op:
+            batch_op.drop_column('content')
+
+
+def downgrade():
+    with op.batch_alter_table('files') as batch_op:
+        batch_op.add_column(sa.Column('content', sa.Text(), nullable=True))
+    op.execute(
+        'UPDATE files SET content = '
+        '(SELECT content FROM file_contents WHERE file_contents.file_id = files.id)'
+    )
+    op.drop_table('file_contents')
@@ -0,0 +1,34 @@
+"""按实际查询形状建立的索引
+
+- 列表页和 /files/api/files：WHERE storage_id = ? ORDER BY created_at DESC, id DESC，
+  翻页条件 (created_at, id) < (?, ?)
+- 大小过滤：WHERE storage_id = ? AND size BETWEEN ? AND ?
+- 类型过滤：WHERE storage_id = ? AND type ...
+- get_file_analysis：WHERE file_id = ?
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_files_storage_created', 'files', ['storage_id', 'created_at', 'id'])
+    op.create_index('ix_files_storage_type', 'files', ['storage_id', 'type'])
+    op.create_index('ix_files_storage_size', 'files', ['storage_id', 'size'])
+    op.create_index('ix_file_analysis_file_id', 'file_analysis', ['file_id'])
+
+
+def downgrade():
+    op.drop_index('ix_file_analysis_file_id', table_name='file_analysis')
+    op.drop_index('ix_files_storage_size', table_name='files')
+    op.drop_index('ix_files_storage_type', table_name='files')
+    op.drop_index('ix_files_storage_created', table_name='files')
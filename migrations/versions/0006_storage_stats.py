@@ -0,0 +1,114 @@
+"""首页使用的存储池统计表，并按现有文件回填
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+import datetime
+import mimetypes
+
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+# 本迁移执行时的分类规则。迁移不引用 services.file_types，规则以后变化时本迁移的结果不变
+_MIME_PREFIXES = (
+    ('image/', 'image'),
+    ('video/', 'video'),
+    ('audio/', 'audio'),
+    ('application/vnd.openxmlformats-officedocument.wordprocessingml', 'document'),
+    ('application/msword', 'document'),
+    ('application/pdf', 'document'),
+    ('application/rtf', 'document'),
+    ('application/vnd.oasis.opendocument.text', 'document'),
+    ('application/vnd.openxmlformats-officedocument.spreadsheetml', 'spreadsheet'),
+    ('application/vnd.ms-excel', 'spreadsheet'),
+    ('application/vnd.oasis.opendocument.spreadsheet', 'spreadsheet'),
+    ('text/csv', 'spreadsheet'),
+    ('application/vnd.openxmlformats-officedocument.presentationml', 'presentation'),
+    ('application/vnd.ms-powerpoint', 'presentation'),
+    ('application/vnd.oasis.opendocument.presentation', 'presentation'),
+    ('text/', 'text'),
+    ('application/json', 'text'),
+    ('application/xml', 'text'),
+    ('application/zip', 'archive'),
+    ('application/x-tar', 'archive'),
+    ('application/gzip', 'archive'),
+    ('application/x-7z-compressed', 'archive'),
+    ('application/x-rar', 'archive'),
+    ('application/x-bzip2', 'archive'),
+    ('application/x-xz', 'archive'),
+)
+_EXTENSIONS = {
+    'md': 'text',
+    'log': 'text',
+    'yaml': 'text',
+    'yml': 'text',
+    'rar': 'archive',
+    '7z': 'archive',
+}
+
+
+def _file_category(mime_type, extension):
+    mime_type = (mime_type or '').lower()
+    if not mime_type or mime_type == 'application/octet-stream':
+        extension = (extension or '').lower().lstrip('.')
+        if extension in _EXTENSIONS:
+            return _EXTENSIONS[extension]
+        mime_type = (mimetypes.guess_type(f'file.{extension}')[0] or '').lower() if extension else ''
+    for prefix, category in _MIME_PREFIXES:
+        if mime_type.startswith(prefix):
+            return category
+    return 'other'
+
+
+def upgrade():
+    op.create_table(
+        'storage_stats',
+        sa.Column('storage_id', sa.Integer(), nullable=False),
+        sa.Column('file_count', sa.Integer(), nullable=False),
+        sa.Column('total_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('last_upload_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['storage_id'], ['storages.id']),
+        sa.PrimaryKeyConstraint('storage_id')
+    )
+    category_stats = op.create_table(
+        'storage_category_stats',
+        sa.Column('storage_id', sa.Integer(), nullable=False),
+        sa.Column('category', sa.String(length=20), nullable=False),
+        sa.Column('file_count', sa.Integer(), nullable=False),
+        sa.Column('total_bytes', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['storage_id'], ['storages.id']),
+        sa.PrimaryKeyConstraint('storage_id', 'category')
+    )
+
+    # 回填：总数直接在 SQL 中汇总，分类按 MIME 类型和扩展名分组后在 Python 中归并
+    bind = op.get_bind()
+    bind.execute(sa.text(
+        'INSERT INTO storage_stats (storage_id, file_count, total_bytes, last_upload_at, updated_at) '
+        'SELECT storage_id, count(*), coalesce(sum(size), 0), max(created_at), :now FROM files GROUP BY storage_id'
+    ), {'now': datetime.datetime.utcnow()})
+    categories = {}
+    rows = bind.execute(sa.text(
+        'SELECT storage_id, mime_type, type, count(*), coalesce(sum(size), 0) '
+        'FROM files GROUP BY storage_id, mime_type, type'
+    ))
+    for storage_id, mime_type, type, count, size in rows:
+        category = _file_category(mime_type, type)
+        item = categories.setdefault((storage_id, category), {
+            'storage_id': storage_id, 'category': category, 'file_count': 0, 'total_bytes': 0
+        })
+        item['file_count'] += count
+        item['total_bytes'] += size
+    if categories:
+        op.bulk_insert(category_stats, list(categories.values()))
+
+
+def downgrade():
+    op.drop_table('storage_category_stats')
+    op.drop_table('storage_stats')
@@ -0,0 +1,113 @@
+"""文件分类列：上传时计算并建索引，类型过滤和分面统计不再扫描文件表
+
+- 按 (mime_type, type) 的不同组合回填，每个组合一条 UPDATE
+- ix_files_storage_type 只服务于旧的按 MIME 前缀过滤，改为分类索引
+- 分类规则新增了 code，按新列重新计算分类统计
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+import mimetypes
+
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+# 本迁移执行时的分类规则。迁移不引用 services.file_types，规则以后变化时本迁移的结果不变
+_MIME_PREFIXES = (
+    ('image/', 'image'),
+    ('video/', 'video'),
+    ('audio/', 'audio'),
+    ('application/vnd.openxmlformats-officedocument.wordprocessingml', 'document'),
+    ('application/msword', 'document'),
+    ('application/pdf', 'document'),
+    ('application/rtf', 'document'),
+    ('application/vnd.oasis.opendocument.text', 'document'),
+    ('application/vnd.openxmlformats-officedocument.spreadsheetml', 'spreadsheet'),
+    ('application/vnd.ms-excel', 'spreadsheet'),
+    ('application/vnd.oasis.opendocument.spreadsheet', 'spreadsheet'),
+    ('text/csv', 'spreadsheet'),
+    ('application/vnd.openxmlformats-officedocument.presentationml', 'presentation'),
+    ('application/vnd.ms-powerpoint', 'presentation'),
+    ('application/vnd.oasis.opendocument.presentation', 'presentation'),
+    ('text/', 'text'),
+    ('application/json', 'text'),
+    ('application/xml', 'text'),
+    ('application/zip', 'archive'),
+    ('application/x-tar', 'archive'),
+    ('application/gzip', 'archive'),
+    ('application/x-7z-compressed', 'archive'),
+    ('application/x-rar', 'archive'),
+    ('application/x-bzip2', 'archive'),
+    ('application/x-xz', 'archive'),
+)
+_CODE_EXTENSIONS = frozenset((
+    'py', 'js', 'mjs', 'ts', 'tsx', 'jsx', 'java', 'kt', 'scala', 'c', 'h', 'cc', 'cpp', 'hpp', 'cs',
+    'go', 'rs', 'rb', 'php', 'swift', 'm', 'sh', 'bash', 'ps1', 'bat', 'sql', 'r', 'lua', 'pl',
+    'html', 'htm', 'css', 'scss', 'vue', 'ipynb'
+))
+_EXTENSIONS = {
+    'md': 'text',
+    'log': 'text',
+    'yaml': 'text',
+    'yml': 'text',
+    'rar': 'archive',
+    '7z': 'archive',
+}
+
+
+def _file_category(mime_type, extension):
+    mime_type = (mime_type or '').lower()
+    extension = (extension or '').lower().lstrip('.')
+    if extension in _CODE_EXTENSIONS:
+        return 'code'
+    if not mime_type or mime_type == 'application/octet-stream':
+        if extension in _EXTENSIONS:
+            return _EXTENSIONS[extension]
+        mime_type = (mimetypes.guess_type(f'file.{extension}')[0] or '').lower() if extension else ''
+    for prefix, category in _MIME_PREFIXES:
+        if mime_type.startswith(prefix):
+            return category
+    return 'other'
+
+
+def upgrade():
+    with op.batch_alter_table('files') as batch_op:
+        batch_op.add_column(sa.Column('category', sa.String(length=20), nullable=False, server_default='other'))
+
+    bind = op.get_bind()
+    files = sa.table('files', sa.column('mime_type', sa.String), sa.column('type', sa.String),
+                     sa.column('category', sa.String))
+    pairs = bind.execute(sa.select(files.c.mime_type, files.c.type).distinct()).all()
+    for mime_type, type in pairs:
+        category = _file_category(mime_type, type)
+        if category == 'other':
+            continue
+        bind.execute(
+            files.update()
+            .where(files.c.mime_type.is_not_distinct_from(mime_type), files.c.type == type)
+            .values(category=category)
+        )
+
+    op.drop_index('ix_files_storage_type', table_name='files')
+    op.create_index('ix_files_storage_category', 'files', ['storage_id', 'category', 'created_at', 'id'])
+    op.create_index('ix_files_storage_category_size', 'files', ['storage_id', 'category', 'size'])
+
+    op.execute('DELETE FROM storage_category_stats')
+    op.execute(
+        'INSERT INTO storage_category_stats (storage_id, category, file_count, total_bytes) '
+        'SELECT storage_id, category, count(*), coalesce(sum(size), 0) FROM files GROUP BY storage_id, category'
+    )
+
+
+def downgrade():
+    op.drop_index('ix_files_storage_category_size', table_name='files')
+    op.drop_index('ix_files_storage_category', table_name='files')
+    op.create_index('ix_files_storage_type', 'files', ['storage_id', 'type'])
+    with op.batch_alter_table('files') as batch_op:
+        batch_op.drop_column('category')
@@ -0,0 +1,34 @@
+"""分析结果按 (内容哈希, 模型, 提示词版本, 温度) 缓存
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 已有的分析结果没有记录生成条件，不参与缓存
+    with op.batch_alter_table('file_analysis') as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('model', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column('prompt_version', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('temperature', sa.Float(), nullable=True))
+    op.create_index('ix_file_analysis_cache_key', 'file_analysis',
+                    ['content_hash', 'model', 'prompt_version', 'temperature'])
+
+
+def downgrade():
+    op.drop_index('ix_file_analysis_cache_key', table_name='file_analysis')
+    with op.batch_alter_table('file_analysis') as batch_op:
+        batch_op.drop_column('temperature')
+        batch_op.drop_column('prompt_version')
+        batch_op.drop_column('model')
+        batch_op.drop_column('content_hash')
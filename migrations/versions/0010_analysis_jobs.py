@@ -0,0 +1,44 @@
+"""后台分析任务队列
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'analysis_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('file_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('force', sa.Boolean(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('run_after', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['file_id'], ['files.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    active = sa.text("status IN ('pending', 'running')")
+    op.create_index('ux_analysis_jobs_active_file', 'analysis_jobs', ['file_id'], unique=True,
+                    sqlite_where=active, postgresql_where=active)
+    op.create_index('ix_analysis_jobs_status_run_after', 'analysis_jobs', ['status', 'run_after', 'id'])
+    op.create_index('ix_analysis_jobs_status_finished', 'analysis_jobs', ['status', 'finished_at'])
+
+
+def downgrade():
+    op.drop_index('ix_analysis_jobs_status_finished', table_name='analysis_jobs')
+    op.drop_index('ix_analysis_jobs_status_run_after', table_name='analysis_jobs')
+    op.drop_index('ux_analysis_jobs_active_file', table_name='analysis_jobs')
+    op.drop_table('analysis_jobs')
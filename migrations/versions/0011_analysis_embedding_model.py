@@ -0,0 +1,27 @@
+"""记录已为分析结果对应的文件尝试生成向量时使用的向量模型
+
+查看分析结果时只有未记录（或向量模型已更换）的文件才会加入后台队列补充向量，
+内容为空或向量接口一直失败的文件不再在每次查看时重试。
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('file_analysis') as batch_op:
+        batch_op.add_column(sa.Column('embedding_model', sa.String(length=100), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('file_analysis') as batch_op:
+        batch_op.drop_column('embedding_model')
@@ -1,14 +1,51 @@
 from database import Base
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Float, Boolean, Index, text
 from datetime import datetime
 
 class FileAnalysis(Base):
     __tablename__ = 'file_analysis'
+    __table_args__ = (
+        # 分析结果缓存：相同内容、模型、提示词版本和温度的分析结果可以直接复用
+        Index('ix_file_analysis_cache_key', 'content_hash', 'model', 'prompt_version', 'temperature'),
+    )
     
     id = Column(Integer, primary_key=True)
-    file_id = Column(Integer, ForeignKey('files.id'))
+    file_id = Column(Integer, ForeignKey('files.id'), index=True)
     content_summary = Column(Text)
     suggested_tags = Column(Text)  # 存储为JSON字符串
     sentiment_score = Column(Integer)  # -100 到 100
+    content_hash = Column(String(64))  # 分析时文件内容的 sha256
+    model = Column(String(50))  # 生成结果的模型
+    prompt_version = Column(Integer)  # 提示词版本
+    temperature = Column(Float)
+    embedding_model = Column(String(100))  # 已为文件尝试生成向量时使用的向量模型
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow) 
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow) 
+
+class AnalysisJob(Base):
+    """后台分析队列中的任务，由分析工作线程领取执行"""
+    __tablename__ = 'analysis_jobs'
+    __table_args__ = (
+        # 同一文件同时最多只有一个等待或执行中的任务，重复入队由数据库忽略
+        Index('ux_analysis_jobs_active_file', 'file_id', unique=True,
+              sqlite_where=text("status IN ('pending', 'running')"),
+              postgresql_where=text("status IN ('pending', 'running')")),
+        # 领取任务：WHERE status = 'pending' AND run_after <= ? ORDER BY run_after, id
+        Index('ix_analysis_jobs_status_run_after', 'status', 'run_after', 'id'),
+        # 吞吐量统计：最近完成的任务
+        Index('ix_analysis_jobs_status_finished', 'status', 'finished_at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    file_id = Column(Integer, ForeignKey('files.id', ondelete='CASCADE'), nullable=False)
+    status = Column(String(20), nullable=False, default='pending')  # pending、running、done、failed
+    force = Column(Boolean, nullable=False, default=False)  # 忽略已有结果，重新分析
+    attempts = Column(Integer, nullable=False, default=0)  # 已执行的次数
+    last_error = Column(Text)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)  # 重试时推迟到该时间之后
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    def __repr__(self):
+        return f'<AnalysisJob {self.id} {self.status}>'
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from database import Base
+import datetime
+
+class Blob(Base):
+    __tablename__ = 'blobs'
+    __table_args__ = (
+        UniqueConstraint('storage_id', 'checksum', name='uq_blobs_storage_checksum'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    storage_id = Column(Integer, ForeignKey('storages.id'), nullable=False)
+    checksum = Column(String(64), nullable=False)  # 内容的 sha256
+    path = Column(String(255), nullable=False)  # 内容寻址的存储路径
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)  # 引用该内容的文件记录数
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Blob {self.checksum}>'
@@ -1,10 +1,27 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index, select
 from sqlalchemy.orm import relationship
+from sqlalchemy.ext.hybrid import hybrid_property
 from database import Base
 import datetime
 
+class FileContent(Base):
+    """文件提取出的文本内容，与 files 分表存放，列表查询不会读到这个大字段"""
+    __tablename__ = 'file_contents'
+
+    file_id = Column(Integer, ForeignKey('files.id'), primary_key=True)
+    content = Column(Text)
+
 class File(Base):
     __tablename__ = 'files'
+    __table_args__ = (
+        # 列表分页：WHERE storage_id = ? ORDER BY created_at DESC, id DESC
+        Index('ix_files_storage_created', 'storage_id', 'created_at', 'id'),
+        # 按分类过滤后同样按 (created_at, id) 倒序分页
+        Index('ix_files_storage_category', 'storage_id', 'category', 'created_at', 'id'),
+        Index('ix_files_storage_size', 'storage_id', 'size'),
+        # 分类和大小分面统计只需扫描索引
+        Index('ix_files_storage_category_size', 'storage_id', 'category', 'size'),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String(255), nullable=False)
@@ -12,14 +29,35 @@ class File(Base):
     path = Column(String(255), nullable=False)
     size = Column(Integer, nullable=False)  # 文件大小（字节）
     type = Column(String(50), nullable=False)  # 文件类型
+    category = Column(String(20), nullable=False, default='other', server_default='other')  # 文件分类，上传时计算
     mime_type = Column(String(100))
-    content = Column(Text)
+    checksum = Column(String(64))  # 内容的 sha256
+    blob_id = Column(Integer, ForeignKey('blobs.id'))  # 去重模式下引用的内容块
     storage_id = Column(Integer, ForeignKey('storages.id'), nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
     # 关联到存储池
     storage = relationship('Storage', back_populates='files')
+    blob = relationship('Blob')
+    # 文本内容，只在访问 content 时才查询
+    content_record = relationship('FileContent', uselist=False, cascade='all, delete-orphan')
+
+    @hybrid_property
+    def content(self):
+        return self.content_record.content if self.content_record else None
+
+    @content.inplace.setter
+    def _content_setter(self, value):
+        if self.content_record is None:
+            self.content_record = FileContent(content=value)
+        else:
+            self.content_record.content = value
+
+    @content.inplace.expression
+    @classmethod
+    def _content_expression(cls):
+        return select(FileContent.content).where(FileContent.file_id == cls.id).scalar_subquery()
 
     def to_dict(self):
         return {
@@ -29,7 +67,9 @@ class File(Base):
             'path': self.path,
             'size': self.size,
             'type': self.type,
+            'category': self.category,
             'mime_type': self.mime_type,
+            'checksum': self.checksum,
             'storage_id': self.storage_id,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
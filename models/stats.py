@@ -0,0 +1,42 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, BigInteger
+from sqlalchemy.orm import relationship
+from database import Base
+import datetime
+
+class StorageStats(Base):
+    """存储池的汇总统计，随文件上传和删除在同一事务内增量维护"""
+    __tablename__ = 'storage_stats'
+
+    storage_id = Column(Integer, ForeignKey('storages.id'), primary_key=True)
+    file_count = Column(Integer, nullable=False, default=0)
+    total_bytes = Column(BigInteger, nullable=False, default=0)
+    last_upload_at = Column(DateTime)  # 最近一次上传的时间
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    categories = relationship('StorageCategoryStats', order_by='StorageCategoryStats.total_bytes.desc()',
+                              primaryjoin='StorageStats.storage_id == foreign(StorageCategoryStats.storage_id)',
+                              viewonly=True)
+
+    def to_dict(self):
+        return {
+            'storage_id': self.storage_id,
+            'file_count': self.file_count,
+            'total_bytes': self.total_bytes,
+            'last_upload_at': self.last_upload_at.isoformat() if self.last_upload_at else None,
+            'categories': {item.category: item.total_bytes for item in self.categories}
+        }
+
+    def __repr__(self):
+        return f'<StorageStats {self.storage_id}>'
+
+class StorageCategoryStats(Base):
+    """存储池中各类文件（图片、文档等）的数量和字节数"""
+    __tablename__ = 'storage_category_stats'
+
+    storage_id = Column(Integer, ForeignKey('storages.id'), primary_key=True)
+    category = Column(String(20), primary_key=True)
+    file_count = Column(Integer, nullable=False, default=0)
+    total_bytes = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<StorageCategoryStats {self.storage_id} {self.category}>'
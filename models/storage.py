@@ -28,4 +28,11 @@ class Storage(Base):
             'is_active': self.is_active,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
-        } 
\ No newline at end of file
+        }
+
+class StorageVersion(Base):
+    """存储池配置的版本号，任何存储池变更都会加一，各进程据此判断本地缓存是否过期"""
+    __tablename__ = 'storage_version'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
@@ -1,13 +1,16 @@
 from flask import Blueprint, jsonify, request, render_template, flash, redirect, url_for, current_app
-from services.ai_service import AIService
+from services.ai_service import AIService, DEFAULT_ANALYSIS_MODE
+from services.analysis_queue import AnalysisWorkerPool, enqueue_files, queue_stats
 from models.file import File
-from models.storage import Storage
+from services.storage_registry import get_pool
 from database import db_session
 import os
 import json
 
 ai_bp = Blueprint('ai', __name__)
 ai_service = AIService()
+# 后台分析队列的工作线程，在第一个请求到来时启动
+analysis_workers = AnalysisWorkerPool(ai_service)
 
 CONFIG_FILE = 'ai_config.json'
 
@@ -18,7 +21,9 @@ def load_config():
             return json.load(f)
     return {
         'apiKey': '',
-        'temperature': 0.7
+        'temperature': 0.7,
+        'analysis_mode': DEFAULT_ANALYSIS_MODE,
+        'auto_analyze': False
     }
 
 def save_config(config):
@@ -31,11 +36,16 @@ def config():
     """AI配置页面"""
     if request.method == 'POST':
         config = {
-            'apiKey': request.form.get('apiKey'),
-            'temperature': float(request.form.get('temperature', 0.7))
+            'apiKey': request.form.get('api_key', request.form.get('apiKey')),
+            'temperature': float(request.form.get('temperature', 0.7)),
+            'analysis_mode': request.form.get('analysis_mode', DEFAULT_ANALYSIS_MODE),
+            # 上传后自动加入分析队列
+            'auto_analyze': request.form.get('auto_analyze') in ('on', 'true', '1')
         }
         with open('ai_config.json', 'w') as f:
             json.dump(config, f)
+        # 温度等参数是分析缓存键的一部分，立即生效
+        ai_service.config = config
         return jsonify({'success': True})
     
     # 加载配置
@@ -54,6 +64,7 @@ def update_config():
     config = request.json
     with open('ai_config.json', 'w') as f:
         json.dump(config, f)
+    ai_service.config = config
     return jsonify({'success': True})
 
 @ai_bp.route('/api/test-connection', methods=['POST'])
@@ -66,6 +77,18 @@ def test_connection():
     success = ai_service.test_connection(api_key)
     return jsonify({'success': success})
 
+def enqueue_embeddings(file):
+    """缺少向量的文件交给后台任务补充，页面不等待读取文件和调用向量接口"""
+    try:
+        queued = enqueue_files(db_session, [file.id])
+        db_session.commit()
+    except Exception as e:
+        db_session.rollback()
+        current_app.logger.error(f"加入分析队列失败: {str(e)}")
+        return
+    if queued:
+        analysis_workers.notify()
+
 @ai_bp.route('/analysis/<int:file_id>')
 def analysis(file_id):
     """文件分析页面"""
@@ -74,22 +97,15 @@ def analysis(file_id):
         return '文件不存在', 404
     
     # 获取存储池
-    storage = db_session.query(Storage).get(file.storage_id)
+    storage = get_pool(file.storage_id)
     if not storage:
         return '存储池不存在', 404
     
-    # 获取存储客户端
-    storage_client = ai_service.get_storage_client(storage)
-    
     try:
-        # 获取文件内容
-        file_content = storage_client.get_file_content(file.path)
-        
-        # 获取文件类型
-        file_type = file.mime_type or 'text/plain'
-        
-        # 分析文件内容
-        analysis = ai_service.analyze_file_content(file_content, file_id, file_type)
+        # 内容和配置未变化时直接使用缓存的结果，force=1 时强制重新分析
+        analysis = ai_service.analyze_file(file, storage.client, force=request.args.get('force') == '1')
+        if ai_service.needs_embeddings(file, analysis):
+            enqueue_embeddings(file)
         
         return render_template('ai/analysis.html', 
                              file=file,
@@ -100,10 +116,46 @@ def analysis(file_id):
                              file=file,
                              error=str(e))
 
+@ai_bp.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    """分析结果缓存的命中统计"""
+    return jsonify(ai_service.cache_stats())
+
+@ai_bp.route('/api/queue', methods=['GET'])
+def get_queue_stats():
+    """后台分析队列的深度、吞吐量和本进程工作线程的状态"""
+    return jsonify({**queue_stats(), 'local': analysis_workers.status()})
+
+@ai_bp.route('/api/queue', methods=['POST'])
+def enqueue_analysis():
+    """把指定文件加入后台分析队列，force 为 true 时忽略已有结果重新分析"""
+    data = request.get_json(silent=True) or {}
+    file_ids = data.get('file_ids')
+    if not isinstance(file_ids, list) or not all(isinstance(file_id, int) for file_id in file_ids):
+        return jsonify({'success': False, 'message': '请提供文件ID列表'}), 400
+    
+    try:
+        queued = enqueue_files(db_session, file_ids, force=bool(data.get('force')))
+        db_session.commit()
+    except Exception as e:
+        db_session.rollback()
+        current_app.logger.error(f"加入分析队列失败: {str(e)}")
+        return jsonify({'success': False, 'message': f'加入分析队列失败: {str(e)}'}), 500
+    analysis_workers.notify()
+    return jsonify({'success': True, 'queued': queued})
+
 @ai_bp.route('/search')
 def search():
     """智能搜索页面"""
-    return render_template('ai/search.html')
+    query = request.args.get('q', '')
+    semantic = request.args.get('semantic') == 'true'
+    content = request.args.get('content') == 'true'
+    results = ai_service.search_similar_files(query, semantic, content) if query else []
+    return render_template('ai/search.html',
+                         query=query,
+                         semantic=semantic,
+                         content=content,
+                         results=results)
 
 @ai_bp.route('/api/search', methods=['POST'])
 def api_search():
@@ -123,6 +175,7 @@ def api_search():
             'name': file.name,
             'type': file.type,
             'size': file.size,
-            'created_at': file.created_at.isoformat()
+            'created_at': file.created_at.isoformat(),
+            'snippet': str(getattr(file, 'snippet', '') or '')
         } for file in results]
     }) 
\ No newline at end of file
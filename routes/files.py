@@ -1,146 +1,74 @@
-from flask import Blueprint, request, jsonify, send_file, render_template, redirect, url_for, flash
+from flask import Blueprint, request, jsonify, send_file, render_template, redirect, url_for, flash, current_app, \
+    Response, stream_with_context
 from models.file import File
-from models.storage import Storage
-from database import db_session
+from database import db_session, read_session
+from services.storage import DEFAULT_CHUNK_SIZE
+from services.storage_registry import get_active_pool, get_all_pools, get_pool
+from services.http_range import make_etag, build_download_response
+from services import search_index
+from services.serialization import FILE_COLUMNS, json_response, rows_to_dicts, ndjson_lines
+from services.file_types import CATEGORIES, CATEGORY_LABELS, file_category
+from services.dedup import find_blob, acquire_blob, release_blob, store_blob, discard_blobs
+from services.analysis_queue import enqueue_files, enqueue_query
+from routes.ai import ai_service, analysis_workers
 import os
+import re
 import json
-import boto3
+import base64
+import binascii
 from werkzeug.utils import secure_filename
 import mimetypes
-from sqlalchemy import or_, and_
-from datetime import datetime
+from sqlalchemy import or_, and_, func, tuple_, case
+from datetime import datetime, timezone
 import humanize
 
 files_bp = Blueprint('files', __name__)
 
-def get_storage_client(storage):
-    """根据存储池类型获取对应的存储客户端"""
-    config = json.loads(storage.config)
-    if storage.type == 'local':
-        return LocalStorage(config)
-    elif storage.type == 's3':
-        return S3Storage(config)
-    raise ValueError(f'不支持的存储类型: {storage.type}')
+# 每页文件数的默认值和上限
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# 文件总数最多统计到该值，超过时只显示“超过 N 个”，避免对整个存储池做 COUNT
+COUNT_CAP = 1000
+# 流式导出时每批读取的行数
+EXPORT_BATCH_SIZE = 1000
+# 分面统计的大小区间：(名称, 上限字节数)，最后一个区间没有上限
+SIZE_BUCKETS = (
+    ('小于 1 MB', 1024 ** 2),
+    ('1 MB - 10 MB', 10 * 1024 ** 2),
+    ('10 MB - 100 MB', 100 * 1024 ** 2),
+    ('100 MB - 1 GB', 1024 ** 3),
+    ('1 GB 以上', None),
+)
 
-class LocalStorage:
-    def __init__(self, config):
-        self.base_path = config.get('path', '')
-    
-    def get_file_path(self, filename):
-        return os.path.join(self.base_path, filename)
-    
-    def get_file(self, filename):
-        file_path = filename # filename here is already the full path
-        if os.path.exists(file_path):
-            return file_path
+def convert_to_bytes(size, unit):
+    """将大小转换为字节"""
+    if not size:
         return None
+    size = float(size)
+    units = {'B': 1, 'KB': 1024, 'MB': 1024**2, 'GB': 1024**3}
+    return size * units.get(unit, 1)
 
-    def save_file(self, file_obj, filename):
-        # 确保目录存在
-        os.makedirs(self.base_path, exist_ok=True)
-        file_path = os.path.join(self.base_path, filename)
-        file_obj.save(file_path)
-        return file_path
-
-    def delete_file(self, file_path):
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            return True
-        return False
-
-class S3Storage:
-    def __init__(self, config):
-        self.bucket = config.get('bucket')
-        self.region = config.get('region')
-        self.access_key = config.get('access_key')
-        self.secret_key = config.get('secret_key')
-    
-    def get_file(self, filename):
-        import boto3
-        from botocore.exceptions import ClientError
-        
-        try:
-            s3 = boto3.client(
-                's3',
-                region_name=self.region,
-                aws_access_key_id=self.access_key,
-                aws_secret_access_key=self.secret_key
-            )
-            
-            # 生成预签名URL
-            url = s3.generate_presigned_url(
-                'get_object',
-                Params={
-                    'Bucket': self.bucket,
-                    'Key': filename
-                },
-                ExpiresIn=3600  # URL有效期1小时
-            )
-            return url
-        except ClientError as e:
-            print(f"Error getting file from S3: {e}")
-            return None
-
-    def save_file(self, file_obj, filename):
-        import boto3
-        
-        s3 = boto3.client(
-            's3',
-            region_name=self.region,
-            aws_access_key_id=self.access_key,
-            aws_secret_access_key=self.secret_key
-        )
-        s3.upload_fileobj(file_obj, self.bucket, filename)
-        return f"s3://{self.bucket}/{filename}"
-
-    def delete_file(self, file_path):
-        import boto3
-
-        s3 = boto3.client(
-            's3',
-            region_name=self.region,
-            aws_access_key_id=self.access_key,
-            aws_secret_access_key=self.secret_key
-        )
-        # 解析 S3 路径，获取 bucket 和 key
-        if file_path.startswith('s3://'):
-            path_parts = file_path[len('s3://'):].split('/', 1)
-            bucket_name = path_parts[0]
-            key = path_parts[1] if len(path_parts) > 1 else ''
-        else:
-            # 如果不是 s3:// 开头，则假定为默认 bucket 的 key
-            bucket_name = self.bucket
-            key = file_path
-
-        s3.delete_object(Bucket=bucket_name, Key=key)
-        return True
-
-@files_bp.route('/')
-def index():
-    """文件列表页面"""
-    # 获取搜索参数
-    search_query = request.args.get('search', '')
-    date_from = request.args.get('date_from', '')
-    date_to = request.args.get('date_to', '')
-    size_from = request.args.get('size_from', '')
-    size_to = request.args.get('size_to', '')
-    size_unit = request.args.get('size_unit', 'B')
-    file_type = request.args.get('file_type', '')
-    
-    # 获取当前激活的存储池
-    active_pool = Storage.query.filter_by(is_active=True).first()
-    if not active_pool:
-        flash('请先配置存储池', 'error')
-        return redirect(url_for('storage.index'))
+def filter_files_query(storage_id, args, facets=False):
+    """按搜索词、日期、大小和类型过滤存储池中的文件，返回 (查询, 全文索引子查询)
 
-    # 获取所有存储池
-    all_storages = db_session.query(Storage).all()
+    facets 为 True 时不应用大小和类型过滤，用于计算分面统计。
+    """
+    search_query = args.get('search', '')
+    date_from = args.get('date_from', '')
+    date_to = args.get('date_to', '')
+    size_from = args.get('size_from', '')
+    size_to = args.get('size_to', '')
+    size_unit = args.get('size_unit', 'B')
+    file_type = args.get('file_type', '')
     
-    # 构建查询
-    query = File.query.filter_by(storage_id=active_pool.id)
+    # 构建查询，列表和搜索只读，走只读会话
+    query = read_session.query(File).filter_by(storage_id=storage_id)
     
-    # 应用搜索条件
-    if search_query:
+    # 应用搜索条件：优先走全文索引并按相关度排序
+    fts = search_index.match_subquery(search_query) if search_query and search_index.is_available() else None
+    if fts is not None:
+        query = query.join(fts, fts.c.file_id == File.id)
+    elif search_query:
         query = query.filter(
             or_(
                 File.name.ilike(f'%{search_query}%'),
@@ -151,77 +79,283 @@ def index():
     # 应用日期范围过滤
     if date_from:
         try:
-            date_from = datetime.strptime(date_from, '%Y-%m-%d')
-            query = query.filter(File.created_at >= date_from)
+            query = query.filter(File.created_at >= datetime.strptime(date_from, '%Y-%m-%d'))
         except ValueError:
             pass
     
     if date_to:
         try:
-            date_to = datetime.strptime(date_to, '%Y-%m-%d')
             # 将日期设置为当天的最后一刻
-            date_to = date_to.replace(hour=23, minute=59, second=59)
+            date_to = datetime.strptime(date_to, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
             query = query.filter(File.created_at <= date_to)
         except ValueError:
             pass
     
+    if facets:
+        return query, fts
+    
     # 应用文件大小过滤
-    if size_from or size_to:
-        # 将大小转换为字节
-        def convert_to_bytes(size, unit):
-            if not size:
-                return None
-            size = float(size)
-            units = {'B': 1, 'KB': 1024, 'MB': 1024**2, 'GB': 1024**3}
-            return size * units.get(unit, 1)
-        
+    try:
         size_from_bytes = convert_to_bytes(size_from, size_unit)
         size_to_bytes = convert_to_bytes(size_to, size_unit)
-        
-        if size_from_bytes is not None:
-            query = query.filter(File.size >= size_from_bytes)
-        if size_to_bytes is not None:
-            query = query.filter(File.size <= size_to_bytes)
-    
-    # 应用文件类型过滤
-    if file_type:
-        type_mapping = {
-            'image': ['image/'],
-            'document': ['application/vnd.openxmlformats-officedocument.wordprocessingml', 'application/msword'],
-            'spreadsheet': ['application/vnd.openxmlformats-officedocument.spreadsheetml', 'application/vnd.ms-excel'],
-            'presentation': ['application/vnd.openxmlformats-officedocument.presentationml', 'application/vnd.ms-powerpoint']
-        }
-        
-        if file_type in type_mapping:
-            type_filters = [File.type.like(f'{prefix}%') for prefix in type_mapping[file_type]]
-            query = query.filter(or_(*type_filters))
+    except ValueError:
+        size_from_bytes = size_to_bytes = None
+    if size_from_bytes is not None:
+        query = query.filter(File.size >= size_from_bytes)
+    if size_to_bytes is not None:
+        query = query.filter(File.size <= size_to_bytes)
+    
+    # 应用文件类型过滤：分类在上传时已计算好并建有索引
+    if file_type in CATEGORIES:
+        query = query.filter(File.category == file_type)
+    
+    return query, fts
+
+def size_bucket_column():
+    """文件大小所在区间的序号，对应 SIZE_BUCKETS"""
+    return case(
+        *[(File.size < upper, index) for index, (_, upper) in enumerate(SIZE_BUCKETS) if upper is not None],
+        else_=len(SIZE_BUCKETS) - 1
+    )
+
+def file_facets(storage_id, args):
+    """按分类和大小区间统计匹配的文件数，只执行一次分组查询
+
+    统计时忽略大小和类型过滤，以便显示其他选项的数量；大小区间的数量限定在当前选中的分类内。
+    返回 {'categories': [(分类, 名称, 数量)], 'sizes': [(名称, 最小字节数, 最大字节数, 数量)]}。
+    """
+    query, _ = filter_files_query(storage_id, args, facets=True)
+    bucket = size_bucket_column()
+    rows = query.with_entities(File.category, bucket, func.count()).group_by(File.category, bucket).all()
+    
+    file_type = args.get('file_type', '')
+    category_counts = {}
+    size_counts = [0] * len(SIZE_BUCKETS)
+    for category, index, count in rows:
+        category_counts[category] = category_counts.get(category, 0) + count
+        if file_type not in CATEGORIES or category == file_type:
+            size_counts[index] += count
+    
+    lower = 0
+    sizes = []
+    for (label, upper), count in zip(SIZE_BUCKETS, size_counts):
+        sizes.append((label, lower, upper, count))
+        lower = upper
+    return {
+        'categories': [(category, CATEGORY_LABELS[category], category_counts.get(category, 0))
+                       for category in CATEGORIES],
+        'sizes': sizes
+    }
+
+def encode_cursor(sort_value, file_id):
+    """把上一页最后一行的排序键编码为游标"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, file_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """解码游标，格式错误时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_value, file_id = json.loads(raw)
+        # 排序键只能是时间字符串或相关度数值，其他类型无法绑定到查询参数
+        if isinstance(sort_value, (list, dict)) or sort_value is None:
+            raise ValueError(sort_value)
+        return sort_value, int(file_id)
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise ValueError(f'无效的分页游标: {cursor}') from e
+
+def get_page_size(args):
+    """每页数量，限制在 1 到 MAX_PAGE_SIZE 之间"""
+    per_page = args.get('per_page', DEFAULT_PAGE_SIZE, type=int) or DEFAULT_PAGE_SIZE
+    return min(max(per_page, 1), MAX_PAGE_SIZE)
+
+def build_page_query(query, fts, cursor=None, per_page=DEFAULT_PAGE_SIZE):
+    """构造键集分页查询：默认按 (created_at, id) 倒序，搜索时按 (相关度, id) 排序
+
+    查询结果为 (File, 排序键) 行，多取一行用于判断是否还有下一页。
+    """
+    if fts is not None:
+        sort_column, descending = fts.c.rank, False
+    else:
+        sort_column, descending = File.created_at, True
+    
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor)
+        if fts is None:
+            sort_value = datetime.fromisoformat(str(sort_value))
+        key = tuple_(sort_column, File.id)
+        bound = tuple_(sort_value, last_id)
+        query = query.filter(key < bound if descending else key > bound)
+    
+    if descending:
+        query = query.order_by(sort_column.desc(), File.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), File.id.asc())
+    return query.add_columns(sort_column).limit(per_page + 1)
+
+def paginate_files(query, fts, cursor=None, per_page=DEFAULT_PAGE_SIZE, columns=None):
+    """键集分页，返回 (本页文件, 下一页游标)，没有下一页时游标为 None
+
+    指定 columns 时只查询这些列（第一列须为 File.id），本页文件为元组而不是 File 对象。
+    """
+    if columns is not None:
+        query = query.with_entities(*columns)
+    rows = build_page_query(query, fts, cursor, per_page).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last_row = rows[-1]
+        last_id = last_row[0] if columns is not None else last_row[0].id
+        next_cursor = encode_cursor(last_row[-1], last_id)
+    if columns is not None:
+        return [tuple(row[:-1]) for row in rows], next_cursor
+    return [row[0] for row in rows], next_cursor
+
+def iter_file_rows(query, fts, columns=FILE_COLUMNS, batch_size=EXPORT_BATCH_SIZE):
+    """按键集分页逐批读取全部匹配的文件行，内存占用与总行数无关"""
+    cursor = None
+    while True:
+        rows, cursor = paginate_files(query, fts, cursor, batch_size, columns)
+        # 批次之间结束只读事务，长时间导出不会一直占用同一个数据库快照
+        read_session.rollback()
+        yield from rows
+        if cursor is None:
+            break
+
+def enqueue_uploaded(files):
+    """开启上传后自动分析时，在上传的同一事务中把新文件加入分析队列，返回新增的任务数"""
+    if not ai_service.config.get('auto_analyze'):
+        return 0
+    db_session.flush()
+    return enqueue_files(db_session, [file.id for file in files])
+
+def capped_count_query(query, cap=COUNT_CAP):
+    """构造最多数到 cap 的计数查询"""
+    limited = query.with_entities(File.id).limit(cap).subquery()
+    return read_session.query(func.count()).select_from(limited)
+
+def capped_count(query, cap=COUNT_CAP):
+    """统计匹配的文件数，最多数到 cap"""
+    return capped_count_query(query, cap).scalar()
+
+@files_bp.route('/')
+def index():
+    """文件列表页面"""
+    # 获取当前激活的存储池，存储池信息来自进程内缓存
+    active_pool = get_active_pool()
+    if not active_pool:
+        flash('请先配置存储池', 'error')
+        return redirect(url_for('storage.index'))
+
+    # 获取所有存储池
+    all_storages = get_all_pools()
+    
+    search_query = request.args.get('search', '')
+    cursor = request.args.get('cursor', '')
+    query, fts = filter_files_query(active_pool.id, request.args)
+    
+    # 搜索时按相关度排序，否则按上传时间倒序排序
+    try:
+        files, next_cursor = paginate_files(query, fts, cursor, get_page_size(request.args))
+    except ValueError:
+        cursor = ''
+        files, next_cursor = paginate_files(query, fts, None, get_page_size(request.args))
+    total = capped_count(query)
+    snippets = search_index.snippets(search_query, [f.id for f in files]) if fts is not None else {}
+    facets = file_facets(active_pool.id, request.args)
     
-    # 按上传时间倒序排序
-    files = query.order_by(File.created_at.desc()).all()
+    # 翻页链接保留当前的过滤条件
+    page_args = {key: value for key, value in request.args.items() if key != 'cursor'}
+    next_url = url_for('files.index', cursor=next_cursor, **page_args) if next_cursor else None
+    first_url = url_for('files.index', **page_args) if cursor else None
     
     return render_template('files/index.html',
                          files=files,
+                         snippets=snippets,
+                         total=total,
+                         total_capped=total >= COUNT_CAP,
+                         next_url=next_url,
+                         first_url=first_url,
+                         facets=facets,
+                         category_labels=CATEGORY_LABELS,
+                         page_args=page_args,
                          search_query=search_query,
-                         date_from=date_from,
-                         date_to=date_to,
-                         size_from=size_from,
-                         size_to=size_to,
-                         size_unit=size_unit,
-                         file_type=file_type,
+                         date_from=request.args.get('date_from', ''),
+                         date_to=request.args.get('date_to', ''),
+                         size_from=request.args.get('size_from', ''),
+                         size_to=request.args.get('size_to', ''),
+                         size_unit=request.args.get('size_unit', 'B'),
+                         file_type=request.args.get('file_type', ''),
                          active_pool=active_pool,
-                         all_storages=all_storages)
+                         all_storages=all_storages,
+                         dedup_enabled=active_pool.dedup)
 
 @files_bp.route('/api/files', methods=['GET'])
 def list_files():
-    """获取当前存储池的文件列表（API）"""
+    """获取当前存储池的文件列表（API），支持与列表页相同的过滤条件和游标分页，facets=1 时附带分面统计"""
     # 获取当前活动的存储池
-    storage = db_session.query(Storage).filter_by(is_active=1).first()
+    storage = get_active_pool()
     if not storage:
         return jsonify({'error': '没有活动的存储池'}), 404
     
-    # 获取该存储池下的所有文件
-    files = db_session.query(File).filter_by(storage_id=storage.id).all()
-    return jsonify([file.to_dict() for file in files])
+    query, fts = filter_files_query(storage.id, request.args)
+    try:
+        # 只查询需要的列并直接编码为 JSON，不构造 File 对象
+        rows, next_cursor = paginate_files(query, fts, request.args.get('cursor'),
+                                           get_page_size(request.args), FILE_COLUMNS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    total = capped_count(query)
+    result = {
+        'files': rows_to_dicts(rows),
+        'next_cursor': next_cursor,
+        'total': total,
+        'total_capped': total >= COUNT_CAP
+    }
+    if request.args.get('facets'):
+        facets = file_facets(storage.id, request.args)
+        result['facets'] = {
+            'categories': {category: count for category, _, count in facets['categories']},
+            'sizes': [{'label': label, 'min': lower, 'max': upper, 'count': count}
+                      for label, lower, upper, count in facets['sizes']]
+        }
+    return json_response(result)
+
+@files_bp.route('/api/files/export', methods=['GET'])
+def export_files():
+    """以 NDJSON 流式返回当前存储池中所有匹配的文件，每行一个文件，过滤条件与列表接口相同"""
+    storage = get_active_pool()
+    if not storage:
+        return jsonify({'error': '没有活动的存储池'}), 404
+    
+    query, fts = filter_files_query(storage.id, request.args)
+    return Response(stream_with_context(ndjson_lines(iter_file_rows(query, fts))),
+                    mimetype='application/x-ndjson')
+
+@files_bp.route('/api/files/analyze', methods=['POST'])
+def analyze_files():
+    """把存储池中匹配过滤条件的所有文件加入后台分析队列，过滤条件与列表接口相同
+
+    storage_id 指定存储池，默认为当前存储池；force=1 时忽略已有结果重新分析。
+    """
+    storage_id = request.args.get('storage_id', type=int)
+    storage = get_pool(storage_id) if storage_id else get_active_pool()
+    if not storage:
+        return jsonify({'error': '存储池不存在'}), 404
+    
+    query, _ = filter_files_query(storage.id, request.args)
+    try:
+        queued = enqueue_query(db_session, query, force=request.args.get('force') == '1')
+        db_session.commit()
+    except Exception as e:
+        db_session.rollback()
+        current_app.logger.error(f"加入分析队列失败: {str(e)}")
+        return jsonify({'error': f'加入分析队列失败: {str(e)}'}), 500
+    analysis_workers.notify()
+    return jsonify({'success': True, 'queued': queued, 'message': f'已将 {queued} 个文件加入分析队列'})
 
 @files_bp.route('/upload', methods=['POST'])
 def upload_file():
@@ -234,49 +368,130 @@ def upload_file():
         return jsonify({'success': False, 'message': '没有选择文件'})
     
     # 获取当前激活的存储池
-    active_pool = Storage.query.filter_by(is_active=True).first()
+    active_pool = get_active_pool()
     if not active_pool:
         return jsonify({'success': False, 'message': '请先激活一个存储池'})
     
     # 获取存储客户端
-    storage_client = get_storage_client(active_pool)
+    storage_client = active_pool.client
+    chunk_size = current_app.config.get('UPLOAD_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    dedup = active_pool.dedup
     
     uploaded_files = []
+    # 本次新写入的去重内容，任何一个文件失败时整批回滚并删除
+    new_blobs = []
     for file in files:
         try:
             # 生成安全的文件名
             filename = secure_filename(file.filename)
-            # 生成存储路径
-            file_path = f"{datetime.datetime.now().strftime('%Y%m%d')}/{filename}"
             
-            # 保存文件
-            file_content = file.read()
-            storage_client.save_file(file_path, file_content)
+            if dedup:
+                # 去重模式：内容按哈希存储，相同内容的文件共享同一份数据
+                blob, created = store_blob(storage_client, active_pool.id, file.stream, chunk_size)
+                if created:
+                    new_blobs.append(blob.checksum)
+                file_path, size, checksum = blob.path, blob.size, blob.checksum
+            else:
+                blob = None
+                # 生成存储路径
+                file_path = f"{datetime.now().strftime('%Y%m%d')}/{filename}"
+                # 分块流式保存文件，同时计算大小和校验和
+                size, checksum = storage_client.save_stream(file_path, file.stream, chunk_size)
             
-            # 创建文件记录
+            # 创建文件记录，分类在上传时计算一次
+            extension = os.path.splitext(filename)[1][1:]
             file_record = File(
                 name=filename,
                 original_name=file.filename,
                 path=file_path,
-                size=len(file_content),
-                type=os.path.splitext(filename)[1][1:],
+                size=size,
+                type=extension,
+                category=file_category(file.content_type, extension),
                 mime_type=file.content_type,
+                checksum=checksum,
+                blob_id=blob.id if blob else None,
                 storage_id=active_pool.id
             )
             db_session.add(file_record)
             uploaded_files.append(file_record)
             
         except Exception as e:
+            db_session.rollback()
+            discard_blobs(storage_client, active_pool.id, new_blobs)
             current_app.logger.error(f"上传文件失败: {str(e)}")
             return jsonify({'success': False, 'message': f'上传文件失败: {str(e)}'})
     
     try:
+        queued = enqueue_uploaded(uploaded_files)
         db_session.commit()
+        if queued:
+            analysis_workers.notify()
         return jsonify({
             'success': True,
             'message': f'成功上传 {len(uploaded_files)} 个文件',
             'files': [f.to_dict() for f in uploaded_files]
         })
+    except Exception as e:
+        db_session.rollback()
+        discard_blobs(storage_client, active_pool.id, new_blobs)
+        current_app.logger.error(f"保存文件记录失败: {str(e)}")
+        return jsonify({'success': False, 'message': f'保存文件记录失败: {str(e)}'})
+
+@files_bp.route('/upload/hash', methods=['POST'])
+def upload_by_hash():
+    """秒传：客户端已知内容哈希，存储池中已有相同内容时直接引用，不再传输文件"""
+    data = request.get_json(silent=True) or {}
+    checksum = str(data.get('checksum', '')).lower()
+    original_name = data.get('name', '')
+    if not re.fullmatch(r'[0-9a-f]{64}', checksum) or not original_name:
+        return jsonify({'success': False, 'message': '缺少文件名或哈希值无效'})
+    
+    # 获取当前激活的存储池
+    active_pool = get_active_pool()
+    if not active_pool:
+        return jsonify({'success': False, 'message': '请先激活一个存储池'})
+    if not active_pool.dedup:
+        return jsonify({'success': False, 'found': False, 'message': '当前存储池未开启去重'})
+    
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': '文件大小无效'}), 400
+    
+    blob = find_blob(active_pool.id, checksum)
+    # 大小也必须一致，避免仅凭哈希值就引用他人的文件
+    if blob is None or blob.size != size \
+            or not active_pool.client.exists(blob.path) or not acquire_blob(blob):
+        return jsonify({'success': False, 'found': False, 'message': '需要上传文件内容'})
+    
+    filename = secure_filename(original_name)
+    extension = os.path.splitext(filename)[1][1:]
+    mime_type = data.get('mime_type') or mimetypes.guess_type(filename)[0]
+    file_record = File(
+        name=filename,
+        original_name=original_name,
+        path=blob.path,
+        size=blob.size,
+        type=extension,
+        category=file_category(mime_type, extension),
+        mime_type=mime_type,
+        checksum=blob.checksum,
+        blob_id=blob.id,
+        storage_id=active_pool.id
+    )
+    
+    try:
+        db_session.add(file_record)
+        queued = enqueue_uploaded([file_record])
+        db_session.commit()
+        if queued:
+            analysis_workers.notify()
+        return jsonify({
+            'success': True,
+            'found': True,
+            'message': '秒传成功',
+            'files': [file_record.to_dict()]
+        })
     except Exception as e:
         db_session.rollback()
         current_app.logger.error(f"保存文件记录失败: {str(e)}")
@@ -292,31 +507,40 @@ def download_file(file_id):
         return redirect(url_for('files.index'))
     
     # 获取存储池
-    storage = db_session.query(Storage).get(file_record.storage_id)
+    storage = get_pool(file_record.storage_id)
     if not storage:
         flash('存储池不存在', 'error')
         return redirect(url_for('files.index'))
     
     try:
         # 获取存储客户端
-        storage_client = get_storage_client(storage)
+        storage_client = storage.client
         
-        # 获取文件
-        file_path = storage_client.get_file(file_record.path)
-        if not file_path:
+        # S3存储默认返回预签名URL，开启代理下载时由服务器转发区间数据
+        if storage.type == 's3' and not storage.options.get('proxy_downloads'):
+            return redirect(storage_client.get_download_url(file_record.path))
+        
+        try:
+            info = storage_client.stat(file_record.path)
+        except FileNotFoundError:
             flash('文件不存在', 'error')
             return redirect(url_for('files.index'))
         
-        # 如果是S3存储，返回预签名URL
-        if storage.type == 's3':
-            return redirect(file_path)
+        etag = make_etag(info['size'], info['mtime'], file_record.checksum or info['etag'])
+        last_modified = datetime.fromtimestamp(info['mtime'], timezone.utc)
+        chunk_size = current_app.config.get('UPLOAD_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+        
+        def read_range(start, stop):
+            return storage_client.read_range(file_record.path, start, stop, chunk_size)
         
-        # 如果是本地存储，直接发送文件
-        return send_file(
-            file_path,
-            as_attachment=True,
-            download_name=file_record.original_name,
-            mimetype=file_record.type
+        return build_download_response(
+            request,
+            read_range,
+            size=info['size'],
+            etag=etag,
+            last_modified=last_modified,
+            mimetype=file_record.mime_type or mimetypes.guess_type(file_record.original_name)[0] or 'application/octet-stream',
+            download_name=file_record.original_name
         )
     
     except Exception as e:
@@ -327,7 +551,7 @@ def download_file(file_id):
 def delete_file(file_id):
     """删除文件"""
     # 获取当前活动的存储池
-    storage = db_session.query(Storage).filter_by(is_active=1).first()
+    storage = get_active_pool()
     if not storage:
         return jsonify({'error': '没有活动的存储池'}), 404
     
@@ -342,18 +566,26 @@ def delete_file(file_id):
     
     try:
         # 获取存储客户端
-        storage_client = get_storage_client(storage)
+        storage_client = storage.client
         
-        # 删除文件
-        storage_client.delete_file(file_record.path)
+        if file_record.blob_id:
+            # 去重存储的内容只在最后一个引用删除后才删除
+            orphan_path = release_blob(file_record.blob_id)
+        else:
+            storage_client.delete_file(file_record.path)
+            orphan_path = None
         
         # 删除文件记录
         db_session.delete(file_record)
         db_session.commit()
         
+        if orphan_path:
+            storage_client.delete_file(orphan_path)
+        
         flash('文件删除成功！', 'success')
         return jsonify({'message': '文件已删除'})
     
     except Exception as e:
+        db_session.rollback()
         flash(f'文件删除失败: {str(e)}', 'error')
         return jsonify({'error': str(e)}), 500 
\ No newline at end of file
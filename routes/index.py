@@ -1,32 +1,45 @@
 from flask import Blueprint, render_template
+from sqlalchemy import func
 from models.file import File
-from models.storage import Storage
-from database import db_session
+from models.stats import StorageStats
+from services.file_types import CATEGORY_LABELS
+from services.storage_registry import get_active_pool, get_all_pools
+from database import db_session, read_session
 
 index_bp = Blueprint('index', __name__)
 
 @index_bp.route('/')
 def index():
     """首页"""
-    # 获取文件统计信息
-    total_files = File.query.count()
-    total_storage = Storage.query.count()
-    active_storage = Storage.query.filter_by(is_active=True).first()
-    
-    # 获取最近上传的文件
-    recent_files = File.query.order_by(File.created_at.desc()).limit(5).all()
-    
-    # 获取存储池使用情况
+    # 文件统计来自增量维护的统计表，每个存储池一行，不再扫描文件表
+    total_files = read_session.query(func.coalesce(func.sum(StorageStats.file_count), 0)).scalar()
+    total_storage = len(get_all_pools())
+    active_storage = get_active_pool()
+
+    # 获取存储池使用情况和最近上传的文件
     storage_usage = {}
+    recent_files = []
     if active_storage:
+        stats = read_session.get(StorageStats, active_storage.id)
         storage_usage = {
             'name': active_storage.name,
             'type': active_storage.type,
-            'files_count': File.query.filter_by(storage_id=active_storage.id).count()
+            'files_count': stats.file_count if stats else 0,
+            'total_bytes': stats.total_bytes if stats else 0,
+            'last_upload_at': stats.last_upload_at if stats else None,
+            'categories': [
+                {'name': CATEGORY_LABELS.get(item.category, item.category),
+                 'files_count': item.file_count,
+                 'total_bytes': item.total_bytes}
+                for item in (stats.categories if stats else []) if item.file_count > 0
+            ]
         }
-    
+        # 按 (storage_id, created_at) 索引倒序读取前几行
+        recent_files = read_session.query(File).filter_by(storage_id=active_storage.id) \
+            .order_by(File.created_at.desc(), File.id.desc()).limit(5).all()
+
     return render_template('index.html',
                          total_files=total_files,
                          total_storage=total_storage,
                          recent_files=recent_files,
-                         storage_usage=storage_usage) 
\ No newline at end of file
+                         storage_usage=storage_usage)
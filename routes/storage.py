@@ -1,10 +1,18 @@
-from flask import Blueprint, request, jsonify, render_template, redirect, url_for, flash
+from flask import Blueprint, request, jsonify, render_template, redirect, url_for, flash, abort
 from models.storage import Storage
 from database import db_session
+from services import storage_registry
 import json
 
 storage_bp = Blueprint('storage', __name__)
 
+def get_storage_or_404(id):
+    """按 ID 获取存储池，不存在时返回 404"""
+    storage = db_session.get(Storage, id)
+    if storage is None:
+        abort(404)
+    return storage
+
 @storage_bp.route('/')
 def index():
     """存储池列表页面"""
@@ -21,14 +29,17 @@ def create():
         
         if type == 'local':
             config = {
-                'path': request.form.get('path')
+                'path': request.form.get('path'),
+                'dedup': request.form.get('dedup') == 'on'
             }
         elif type == 's3':
             config = {
                 'access_key': request.form.get('access_key'),
                 'secret_key': request.form.get('secret_key'),
                 'bucket': request.form.get('bucket'),
-                'region': request.form.get('region')
+                'region': request.form.get('region'),
+                'proxy_downloads': request.form.get('proxy_downloads') == 'on',
+                'dedup': request.form.get('dedup') == 'on'
             }
         
         storage = Storage(
@@ -40,7 +51,9 @@ def create():
         
         try:
             db_session.add(storage)
+            storage_registry.bump_version(db_session)
             db_session.commit()
+            storage_registry.invalidate()
             flash('存储池创建成功！', 'success')
             return redirect(url_for('storage.index'))
         except Exception as e:
@@ -52,7 +65,7 @@ def create():
 @storage_bp.route('/edit/<int:id>', methods=['GET', 'POST'])
 def edit(id):
     """编辑存储池"""
-    storage = Storage.query.get_or_404(id)
+    storage = get_storage_or_404(id)
     
     if request.method == 'POST':
         storage.name = request.form.get('name')
@@ -60,18 +73,24 @@ def edit(id):
         
         if storage.type == 'local':
             storage.config = json.dumps({
-                'path': request.form.get('path')
+                'path': request.form.get('path'),
+                'dedup': request.form.get('dedup') == 'on'
             })
         elif storage.type == 's3':
             storage.config = json.dumps({
                 'access_key': request.form.get('access_key'),
                 'secret_key': request.form.get('secret_key'),
                 'bucket': request.form.get('bucket'),
-                'region': request.form.get('region')
+                'region': request.form.get('region'),
+                'proxy_downloads': request.form.get('proxy_downloads') == 'on',
+                'dedup': request.form.get('dedup') == 'on'
             })
         
         try:
+            storage_registry.bump_version(db_session)
             db_session.commit()
+            # 配置已变更，各进程重新加载存储池并丢弃旧的存储客户端
+            storage_registry.invalidate()
             flash('存储池更新成功！', 'success')
             return redirect(url_for('storage.index'))
         except Exception as e:
@@ -87,11 +106,13 @@ def edit(id):
 @storage_bp.route('/delete/<int:id>', methods=['POST'])
 def delete(id):
     """删除存储池"""
-    storage = Storage.query.get_or_404(id)
+    storage = get_storage_or_404(id)
     
     try:
         db_session.delete(storage)
+        storage_registry.bump_version(db_session)
         db_session.commit()
+        storage_registry.invalidate()
         return jsonify({'success': True, 'message': '存储池删除成功'})
     except Exception as e:
         db_session.rollback()
@@ -100,15 +121,14 @@ def delete(id):
 @storage_bp.route('/activate/<int:id>', methods=['POST'])
 def activate(id):
     """激活存储池"""
+    storage = get_storage_or_404(id)
     try:
-        # 先将所有存储池设置为非激活状态
+        # 先将所有存储池设置为非激活状态，再激活指定的存储池，在同一事务中完成
         Storage.query.update({Storage.is_active: False})
-        db_session.commit()
-        
-        # 激活指定的存储池
-        storage = Storage.query.get_or_404(id)
         storage.is_active = True
+        storage_registry.bump_version(db_session)
         db_session.commit()
+        storage_registry.invalidate()
         
         return jsonify({'success': True, 'message': '存储池激活成功'})
     except Exception as e:
@@ -1,5 +1,9 @@
 import json
+import hashlib
+import threading
+from sqlalchemy import func
 from models.ai import FileAnalysis
+from models.file import File
 from database import db_session
 import os
 from dotenv import load_dotenv
@@ -7,14 +11,149 @@ import requests
 import numpy as np
 import mimetypes
 import chardet
-from services.storage import LocalStorage, S3Storage
+from services.storage import create_storage_client
+from services.rate_limit import TokenBucket
+from services.vector_store import vector_store, normalize, FILE_CHUNK
+from services import search_index
 
 load_dotenv()
 
+# 调用 API 的速率限制：每分钟请求数和允许的突发请求数，本进程内所有分析共享
+AI_RATE_LIMIT = float(os.getenv('AI_RATE_LIMIT', 60))
+AI_RATE_BURST = float(os.getenv('AI_RATE_BURST', 5))
+# 接口返回 429 且没有 Retry-After 时暂停发送请求的秒数
+AI_RATE_LIMIT_PAUSE = 10
+AI_REQUEST_TIMEOUT = float(os.getenv('AI_REQUEST_TIMEOUT', 60))
+
+# 生成分析结果的模型
+ANALYSIS_MODEL = 'deepseek-chat'
+# 语义搜索使用的向量模型，更换模型后需要重新生成向量
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'deepseek-embed')
+# 文本按字符切块生成向量，相邻块有重叠；每个文件最多取前 MAX_EMBED_CHUNKS 块
+EMBED_CHUNK_SIZE = 1000
+EMBED_CHUNK_OVERLAP = 200
+MAX_EMBED_CHUNKS = 32
+# 每次向量接口请求包含的文本块数
+EMBED_BATCH_SIZE = 16
+# 分析模式：structured 一次请求返回 JSON 结果；separate 分别请求摘要、标签和情感分析
+ANALYSIS_MODES = ('structured', 'separate')
+DEFAULT_ANALYSIS_MODE = 'structured'
+# 各分析模式提示词的版本，修改提示词或结果格式时加一，旧的缓存结果随之失效。
+# 两种模式的版本号互不相同，切换模式后不会命中另一种模式的结果
+PROMPT_VERSIONS = {'separate': 1, 'structured': 2}
+STRUCTURED_PROMPT = (
+    '你是一个专业的文件分析助手。请分析用户提供的内容，只返回一个 JSON 对象，不要输出其他文字。'
+    'JSON 格式为：{"summary": "内容的简洁摘要", "tags": ["5-10个关键词标签"], '
+    '"sentiment": 情感倾向，-1到1之间的数字，-1表示非常负面，0表示中性，1表示非常正面}'
+)
+# 结构化结果中标签数量的上限
+MAX_TAGS = 20
+# 可以分析的文件类型（MIME 类型前缀）
+TEXT_MIME_PREFIXES = (
+    'text/',
+    'application/json',
+    'application/xml',
+    'application/javascript',
+    'application/x-python',
+    'application/x-java',
+    'application/x-c',
+    'application/x-cpp',
+    'application/x-csharp',
+    'application/x-php',
+    'application/x-ruby',
+    'application/x-shellscript',
+    'application/x-yaml',
+    'application/x-markdown',
+    'application/x-latex',
+    'application/x-tex',
+    'application/x-html',
+    'application/x-css'
+)
+
+class AnalysisFormatError(ValueError):
+    """模型返回的结构化分析结果无法解析或不符合格式"""
+
+class APIError(ValueError):
+    """API 返回了错误状态码"""
+
+    def __init__(self, message, status_code, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        """限流和服务端错误稍后重试可能成功"""
+        return self.status_code == 429 or self.status_code >= 500
+
+def parse_retry_after(value):
+    """解析 Retry-After 响应头中的秒数，不支持的格式返回 None"""
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def chunk_text(text, size=EMBED_CHUNK_SIZE, overlap=EMBED_CHUNK_OVERLAP, limit=MAX_EMBED_CHUNKS):
+    """把文本切成有重叠的块，空白块会被跳过"""
+    step = size - overlap
+    chunks = []
+    for start in range(0, len(text), step):
+        chunk = text[start:start + size]
+        if chunk.strip():
+            chunks.append(chunk)
+        if len(chunks) == limit or start + size >= len(text):
+            break
+    return chunks
+
+def parse_structured_analysis(content):
+    """解析并校验结构化分析结果，返回 (摘要, 标签列表, 情感得分)"""
+    text = (content or '').strip()
+    # 部分模型会用 Markdown 代码块包裹 JSON
+    if text.startswith('```'):
+        text = text.strip('`').strip()
+        if text.lower().startswith('json'):
+            text = text[4:]
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise AnalysisFormatError(f'不是有效的 JSON: {e}')
+    if not isinstance(data, dict):
+        raise AnalysisFormatError('结果不是 JSON 对象')
+    
+    summary = data.get('summary')
+    if not isinstance(summary, str) or not summary.strip():
+        raise AnalysisFormatError('缺少 summary')
+    
+    tags = data.get('tags')
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise AnalysisFormatError('tags 不是字符串列表')
+    tags = [tag.strip() for tag in tags if tag.strip()][:MAX_TAGS]
+    if not tags:
+        raise AnalysisFormatError('缺少 tags')
+    
+    sentiment = data.get('sentiment')
+    if isinstance(sentiment, bool):
+        raise AnalysisFormatError('sentiment 不是数字')
+    try:
+        sentiment = float(sentiment)
+    except (TypeError, ValueError):
+        raise AnalysisFormatError('sentiment 不是数字')
+    if not -1 <= sentiment <= 1:
+        raise AnalysisFormatError(f'sentiment 超出范围: {sentiment}')
+    
+    return summary.strip(), tags, sentiment
+
 class AIService:
     def __init__(self):
         self.config = self.load_config()
-        self.api_base = 'https://api.deepseek.com/v1'
+        self.api_base = os.getenv('DEEPSEEK_API_BASE', 'https://api.deepseek.com/v1')
+        # 分析结果缓存的命中和未命中次数（本进程）
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._stats_lock = threading.Lock()
+        self.rate_limiter = TokenBucket(AI_RATE_LIMIT / 60, AI_RATE_BURST)
     
     def load_config(self):
         """加载AI配置"""
@@ -59,42 +198,12 @@ class AIService:
 
     def get_storage_client(self, storage):
         """获取存储客户端"""
-        config = json.loads(storage.config)
-        if storage.type == 'local':
-            return LocalStorage(config['path'])
-        elif storage.type == 's3':
-            return S3Storage(
-                access_key=config['access_key'],
-                secret_key=config['secret_key'],
-                bucket=config['bucket'],
-                region=config['region']
-            )
-        raise ValueError(f'不支持的存储类型: {storage.type}')
+        return create_storage_client(storage)
 
     def can_analyze_file(self, file_type):
         """检查文件是否可以分析"""
         # 只分析文本类型的文件
-        text_types = [
-            'text/',
-            'application/json',
-            'application/xml',
-            'application/javascript',
-            'application/x-python',
-            'application/x-java',
-            'application/x-c',
-            'application/x-cpp',
-            'application/x-csharp',
-            'application/x-php',
-            'application/x-ruby',
-            'application/x-shellscript',
-            'application/x-yaml',
-            'application/x-markdown',
-            'application/x-latex',
-            'application/x-tex',
-            'application/x-html',
-            'application/x-css'
-        ]
-        return any(file_type.startswith(t) for t in text_types)
+        return any(file_type.startswith(t) for t in TEXT_MIME_PREFIXES)
 
     def decode_file_content(self, content):
         """解码文件内容"""
@@ -114,131 +223,301 @@ class AIService:
                     continue
             raise ValueError('无法解码文件内容')
 
-    def analyze_file_content(self, file_content, file_id, file_type):
-        """分析文件内容并生成摘要、标签和情感分析"""
+    @property
+    def prompt_version(self):
+        """当前分析模式的提示词版本"""
+        mode = self.config.get('analysis_mode', DEFAULT_ANALYSIS_MODE)
+        return PROMPT_VERSIONS.get(mode, PROMPT_VERSIONS[DEFAULT_ANALYSIS_MODE])
+
+    def cache_key(self, content_hash):
+        """分析结果的缓存键：内容或生成条件（包括分析模式）任一变化都需要重新分析"""
+        return {
+            'content_hash': content_hash,
+            'model': ANALYSIS_MODEL,
+            'prompt_version': self.prompt_version,
+            'temperature': float(self.config.get('temperature', 0.7))
+        }
+
+    def _count(self, hit):
+        with self._stats_lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def find_cached_analysis(self, file_id, content_hash):
+        """查找相同内容在当前配置下的分析结果，优先使用本文件的结果
+
+        命中其他文件（内容相同）的结果时为本文件复制一份，不再调用 API。
+        """
+        if not content_hash:
+            return None
+        key = self.cache_key(content_hash)
+        cached = db_session.query(FileAnalysis).filter_by(**key).order_by(
+            (FileAnalysis.file_id == file_id).desc(), FileAnalysis.id.desc()
+        ).first()
+        if cached is None or cached.file_id == file_id:
+            return cached
+        
+        try:
+            analysis = FileAnalysis(
+                file_id=file_id,
+                content_summary=cached.content_summary,
+                suggested_tags=cached.suggested_tags,
+                sentiment_score=cached.sentiment_score,
+                embedding_model=cached.embedding_model,
+                **key
+            )
+            db_session.add(analysis)
+            db_session.commit()
+        except Exception as e:
+            print(f"复制缓存的分析结果失败: {str(e)}")
+            db_session.rollback()
+            raise
+        try:
+            # 内容相同，向量也直接复用
+            vector_store.copy(cached.file_id, file_id)
+        except Exception as e:
+            print(f"复制文件向量失败: {str(e)}")
+            analysis.embedding_model = None
+            db_session.commit()
+        return analysis
+
+    def analyze_file(self, file, storage_client, force=False, embed=False):
+        """获取文件的分析结果：内容和配置都未变化时直接返回已有结果，force 为 True 时总是重新分析
+
+        embed 为 True 时（后台分析任务）命中缓存但缺少向量的文件会读取内容补充向量；
+        页面请求不传 embed，命中缓存时不读取文件，缺少的向量用 needs_embeddings 判断后交给队列。
+        """
+        file_type = file.mime_type or 'text/plain'
+        if not force:
+            # 上传时已记录内容哈希，命中缓存时无需读取文件
+            cached = self.find_cached_analysis(file.id, file.checksum)
+            if cached is not None:
+                self._count(hit=True)
+                if embed and not vector_store.contains(file.id) and self.can_analyze_file(file_type):
+                    text_content = self.decode_file_content(storage_client.get_file_content(file.path))
+                    self.backfill_embeddings(cached, file.id, text_content)
+                return cached
+        
+        file_content = storage_client.get_file_content(file.path)
+        return self.analyze_file_content(file_content, file.id, file_type, force, embed)
+
+    def needs_embeddings(self, file, analysis):
+        """已有分析结果，但还没有用当前向量模型为文件尝试生成过向量"""
+        return analysis.embedding_model != EMBEDDING_MODEL and not vector_store.contains(file.id) \
+            and self.can_analyze_file(file.mime_type or 'text/plain')
+
+    def backfill_embeddings(self, analysis, file_id, text_content):
+        """为已有分析结果的文件补充生成向量
+
+        先记录已尝试，内容切不出文本块或向量接口一直失败的文件不会被反复加入队列；
+        错误继续抛出，可重试的错误由队列按退避策略重试。
+        """
+        analysis.embedding_model = EMBEDDING_MODEL
+        db_session.commit()
+        self.index_embeddings(file_id, text_content)
+
+    def cache_stats(self):
+        """分析结果缓存的统计信息"""
+        lookups = self.cache_hits + self.cache_misses
+        entries = db_session.query(func.count(func.distinct(FileAnalysis.content_hash))).filter(
+            FileAnalysis.content_hash.isnot(None)
+        ).scalar()
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'hit_rate': self.cache_hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'model': ANALYSIS_MODEL,
+            'prompt_version': self.prompt_version
+        }
+
+    def analyze_file_content(self, file_content, file_id, file_type, force=False, embed=False):
+        """分析文件内容并生成摘要、标签和情感分析，相同内容和配置的结果会被缓存"""
         try:
+            content_hash = hashlib.sha256(file_content).hexdigest()
+            if not force:
+                cached = self.find_cached_analysis(file_id, content_hash)
+                if cached is not None:
+                    self._count(hit=True)
+                    if embed and not vector_store.contains(file_id) and self.can_analyze_file(file_type):
+                        self.backfill_embeddings(cached, file_id, self.decode_file_content(file_content))
+                    return cached
+                # 强制重新分析不计入命中率
+                self._count(hit=False)
+            
             # 检查文件类型
             if not self.can_analyze_file(file_type):
                 raise ValueError('不支持分析此类型的文件')
 
             # 解码文件内容
             text_content = self.decode_file_content(file_content)
-            
-            # 使用DeepSeek API生成内容摘要
-            summary_response = requests.post(
-                f'{self.api_base}/chat/completions',
-                headers={
-                    'Authorization': f'Bearer {self.config.get("apiKey")}',
-                    'Content-Type': 'application/json'
-                },
-                json={
-                    'model': 'deepseek-chat',
-                    'messages': [
-                        {'role': 'system', 'content': '你是一个专业的文件分析助手。请为以下内容生成简洁的摘要。'},
-                        {'role': 'user', 'content': text_content[:4000]}  # 限制内容长度
-                    ],
-                    'temperature': self.config.get('temperature', 0.7),
-                    'max_tokens': 500
-                }
-            )
-            
-            if summary_response.status_code != 200:
-                raise ValueError(f'生成摘要失败: {summary_response.text}')
-                
-            summary = summary_response.json()['choices'][0]['message']['content']
-
-            # 生成标签
-            tags_response = requests.post(
-                f'{self.api_base}/chat/completions',
-                headers={
-                    'Authorization': f'Bearer {self.config.get("apiKey")}',
-                    'Content-Type': 'application/json'
-                },
-                json={
-                    'model': 'deepseek-chat',
-                    'messages': [
-                        {'role': 'system', 'content': '请为以下内容生成5-10个关键词标签，以逗号分隔。'},
-                        {'role': 'user', 'content': text_content[:2000]}
-                    ],
-                    'temperature': self.config.get('temperature', 0.7),
-                    'max_tokens': 100
-                }
-            )
-            
-            if tags_response.status_code != 200:
-                raise ValueError(f'生成标签失败: {tags_response.text}')
-                
-            tags = [tag.strip() for tag in tags_response.json()['choices'][0]['message']['content'].split(',')]
-
-            # 情感分析
-            sentiment_response = requests.post(
-                f'{self.api_base}/chat/completions',
-                headers={
-                    'Authorization': f'Bearer {self.config.get("apiKey")}',
-                    'Content-Type': 'application/json'
-                },
-                json={
-                    'model': 'deepseek-chat',
-                    'messages': [
-                        {'role': 'system', 'content': '请分析以下内容的情感倾向，返回一个-1到1之间的数字，-1表示非常负面，0表示中性，1表示非常正面。'},
-                        {'role': 'user', 'content': text_content[:2000]}
-                    ],
-                    'temperature': 0.3,
-                    'max_tokens': 10
-                }
-            )
-            
-            if sentiment_response.status_code != 200:
-                raise ValueError(f'情感分析失败: {sentiment_response.text}')
-                
-            sentiment_score = float(sentiment_response.json()['choices'][0]['message']['content'].strip())
+            summary, tags, sentiment_score = self.analyze_text(text_content)
 
             # 保存分析结果
             analysis = FileAnalysis(
                 file_id=file_id,
                 content_summary=summary,
                 suggested_tags=json.dumps(tags),
-                sentiment_score=sentiment_score
+                sentiment_score=sentiment_score,
+                **self.cache_key(content_hash)
             )
             db_session.add(analysis)
             db_session.commit()
 
-            return analysis
-
         except Exception as e:
             print(f"AI分析过程中出错: {str(e)}")
             db_session.rollback()
             raise
 
-    def get_file_analysis(self, file_id):
-        """获取文件的分析结果"""
-        return db_session.query(FileAnalysis).filter_by(file_id=file_id).first()
+        if self.try_index_embeddings(file_id, text_content):
+            analysis.embedding_model = EMBEDDING_MODEL
+            db_session.commit()
+        return analysis
+
+    def embed(self, texts):
+        """生成文本的向量，返回 (文本数, 维度) 的矩阵"""
+        vectors = []
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            data = self._post('embeddings', {
+                'model': EMBEDDING_MODEL,
+                'input': texts[start:start + EMBED_BATCH_SIZE],
+                'encoding_format': 'float'
+            }, '生成向量失败')['data']
+            vectors.extend(item['embedding'] for item in sorted(data, key=lambda item: item['index']))
+        return np.array(vectors, dtype=np.float32)
+
+    def index_embeddings(self, file_id, text_content):
+        """为文件的各文本块生成向量，多于一块时另存一个块向量均值作为文件整体的向量"""
+        chunks = chunk_text(text_content)
+        if not chunks:
+            return
+        vectors = normalize(self.embed(chunks))
+        keys = list(range(len(chunks)))
+        if len(chunks) > 1:
+            vectors = np.vstack([normalize(vectors.mean(axis=0)), vectors])
+            keys = [FILE_CHUNK] + keys
+        vector_store.add(file_id, vectors, keys)
+
+    def try_index_embeddings(self, file_id, text_content):
+        """生成向量失败不影响分析结果，返回是否成功；失败的文件之后由后台任务补充"""
+        try:
+            self.index_embeddings(file_id, text_content)
+            return True
+        except Exception as e:
+            print(f"生成文件向量失败: {str(e)}")
+            return False
+
+    def analyze_text(self, text_content, mode=None):
+        """生成 (摘要, 标签列表, 情感得分)
+
+        structured 模式一次请求返回 JSON 结果，解析或校验失败时退回 separate 模式的三次请求。
+        """
+        mode = mode or self.config.get('analysis_mode', DEFAULT_ANALYSIS_MODE)
+        if mode == 'structured':
+            try:
+                return self._analyze_structured(text_content)
+            except AnalysisFormatError as e:
+                print(f"结构化分析结果无效，改为分别请求: {str(e)}")
+        return self._analyze_separately(text_content)
+
+    def _post(self, path, payload, error):
+        """调用 API 并返回响应内容，受速率限制；失败时抛出以 error 开头的 APIError"""
+        self.rate_limiter.acquire()
+        response = requests.post(
+            f'{self.api_base}/{path}',
+            headers={
+                'Authorization': f'Bearer {self.config.get("apiKey")}',
+                'Content-Type': 'application/json'
+            },
+            json=payload,
+            timeout=AI_REQUEST_TIMEOUT
+        )
+        if response.status_code != 200:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if response.status_code == 429:
+                # 已触发限流，所有线程一起暂停，避免继续被拒绝
+                self.rate_limiter.pause(retry_after or AI_RATE_LIMIT_PAUSE)
+            raise APIError(f'{error}: {response.text}', response.status_code, retry_after)
+        return response.json()
+
+    def _chat(self, messages, temperature, max_tokens, error, response_format=None):
+        """调用对话补全接口，返回回复内容"""
+        payload = {
+            'model': ANALYSIS_MODEL,
+            'messages': messages,
+            'temperature': temperature,
+            'max_tokens': max_tokens
+        }
+        if response_format:
+            payload['response_format'] = response_format
+        return self._post('chat/completions', payload, error)['choices'][0]['message']['content']
+
+    def _analyze_structured(self, text_content):
+        content = self._chat(
+            [
+                {'role': 'system', 'content': STRUCTURED_PROMPT},
+                {'role': 'user', 'content': text_content[:4000]}
+            ],
+            self.config.get('temperature', 0.7),
+            700,
+            '生成分析结果失败',
+            response_format={'type': 'json_object'}
+        )
+        return parse_structured_analysis(content)
+
+    def _analyze_separately(self, text_content):
+        temperature = self.config.get('temperature', 0.7)
+        
+        # 使用DeepSeek API生成内容摘要
+        summary = self._chat([
+            {'role': 'system', 'content': '你是一个专业的文件分析助手。请为以下内容生成简洁的摘要。'},
+            {'role': 'user', 'content': text_content[:4000]}  # 限制内容长度
+        ], temperature, 500, '生成摘要失败')
+
+        # 生成标签
+        tags = self._chat([
+            {'role': 'system', 'content': '请为以下内容生成5-10个关键词标签，以逗号分隔。'},
+            {'role': 'user', 'content': text_content[:2000]}
+        ], temperature, 100, '生成标签失败')
+        tags = [tag.strip() for tag in tags.split(',')]
+
+        # 情感分析
+        sentiment = self._chat([
+            {'role': 'system', 'content': '请分析以下内容的情感倾向，返回一个-1到1之间的数字，-1表示非常负面，0表示中性，1表示非常正面。'},
+            {'role': 'user', 'content': text_content[:2000]}
+        ], 0.3, 10, '情感分析失败')
+
+        return summary, tags, float(sentiment.strip())
 
     def search_similar_files(self, query, semantic=True, content=False, limit=5):
         """搜索相似文件"""
         try:
             if semantic:
-                # 使用DeepSeek API进行语义搜索
-                response = requests.post(
-                    f'{self.api_base}/embeddings',
-                    headers={
-                        'Authorization': f'Bearer {self.config.get("apiKey")}',
-                        'Content-Type': 'application/json'
-                    },
-                    json={
-                        'model': 'deepseek-embed',
-                        'input': query,
-                        'encoding_format': 'float'
-                    }
-                )
-                query_embedding = response.json()['data'][0]['embedding']
-
-                # TODO: 实现向量数据库存储和检索
-                # 这里需要添加向量数据库支持，如Pinecone或Milvus
-                return []
+                # 在本地向量存储中按余弦相似度检索，每个文件取最相近的文本块
+                hits = vector_store.search(self.embed([query])[0], limit)
+                file_ids = [file_id for file_id, _, _ in hits]
+                files = {file.id: file for file in db_session.query(File).filter(File.id.in_(file_ids))}
+                summaries = dict(db_session.query(FileAnalysis.file_id, FileAnalysis.content_summary)
+                                 .filter(FileAnalysis.file_id.in_(file_ids)).order_by(FileAnalysis.id))
+                results = []
+                for file_id, score, _ in hits:
+                    file = files.get(file_id)
+                    if file is None:
+                        continue
+                    file.score = score
+                    file.snippet = summaries.get(file_id)
+                    results.append(file)
+                return results
 
             else:
-                # 使用传统关键词搜索
+                # 使用全文索引按相关度搜索；不搜索内容时只匹配文件名
+                if search_index.is_available():
+                    columns = None if content else search_index.NAME_COLUMNS
+                    return search_index.search(query, limit=limit, columns=columns)
+                
+                # 全文索引不可用时退回传统关键词搜索
                 files = db_session.query(File).filter(
                     File.name.ilike(f'%{query}%')
                 ).limit(limit).all()
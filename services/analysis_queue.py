@@ -0,0 +1,303 @@
+import os
+import time
+import random
+import datetime
+import threading
+import requests
+from sqlalchemy import select, update, func, or_, exists, literal, Boolean, DateTime
+from models.ai import AnalysisJob
+from models.file import File
+from database import engine, db_session, read_session, insert_ignore
+from services.ai_service import APIError, TEXT_MIME_PREFIXES
+from services.storage_registry import get_pool
+
+# 本进程启动的分析工作线程数，为 0 时只入队，由 flask analysis-worker 单独处理
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', 2))
+# 每个任务最多执行的次数（含第一次）
+ANALYSIS_MAX_ATTEMPTS = int(os.getenv('ANALYSIS_MAX_ATTEMPTS', 5))
+# 执行超过该秒数仍未结束的任务视为工作进程已退出，重新放回队列
+ANALYSIS_JOB_TIMEOUT = int(os.getenv('ANALYSIS_JOB_TIMEOUT', 600))
+# 重试等待时间：第 n 次失败后等待 RETRY_BASE_DELAY * 2^(n-1) 秒，不超过 RETRY_MAX_DELAY
+RETRY_BASE_DELAY = 2
+RETRY_MAX_DELAY = 300
+# 队列为空时工作线程再次检查的间隔秒数
+POLL_INTERVAL = 1.0
+# 空闲时检查执行超时任务的间隔秒数
+RECOVER_INTERVAL = 60
+
+# 等待中和执行中的任务，同一文件只能有一个
+ACTIVE_STATUSES = ('pending', 'running')
+
+_jobs = AnalysisJob.__table__
+
+def _utcnow():
+    return datetime.datetime.utcnow()
+
+def analyzable_filter():
+    """可以分析的文件，与 AIService.can_analyze_file 一致；没有 MIME 类型的文件按纯文本处理"""
+    return or_(File.mime_type.is_(None), File.mime_type == '',
+               *[File.mime_type.like(f'{prefix}%') for prefix in TEXT_MIME_PREFIXES])
+
+def _enqueue(session, statement, force):
+    now = _utcnow()
+    statement = statement.where(analyzable_filter())
+    upgraded = 0
+    if force:
+        # 已在等待中的普通任务改为强制重新分析，否则本次请求会被去重忽略
+        upgraded = session.execute(
+            update(_jobs)
+            .where(_jobs.c.status == 'pending', _jobs.c.force.is_(False), _jobs.c.file_id.in_(statement))
+            .values(force=True)
+        ).rowcount
+    statement = statement.where(
+        ~exists().where(_jobs.c.file_id == File.id, _jobs.c.status.in_(ACTIVE_STATUSES))
+    ).add_columns(
+        literal('pending'), literal(bool(force), Boolean()), literal(0),
+        literal(now, DateTime()), literal(now, DateTime())
+    )
+    # 并发入队同一文件时由部分唯一索引兜底，冲突的行直接忽略
+    insert = insert_ignore(session.get_bind(), _jobs).from_select(
+        ['file_id', 'status', 'force', 'attempts', 'run_after', 'created_at'], statement
+    )
+    return session.execute(insert).rowcount + upgraded
+
+def enqueue_files(session, file_ids, force=False):
+    """在 session 的事务中把文件加入分析队列，返回新增的任务数
+
+    已在队列中的文件和不能分析的文件会被跳过；force 为真时等待中的同一文件任务改为强制分析，也计入返回值。
+    """
+    if not file_ids:
+        return 0
+    return _enqueue(session, select(File.id).where(File.id.in_(file_ids)), force)
+
+def enqueue_query(session, query, force=False):
+    """把文件查询（如 filter_files_query 的结果）匹配的所有文件加入分析队列，返回新增的任务数"""
+    return _enqueue(session, query.with_entities(File.id).statement, force)
+
+def next_job_query(now):
+    """最早到期的等待中任务，按 (status, run_after, id) 索引顺序读取第一行"""
+    return select(_jobs.c.id) \
+        .where(_jobs.c.status == 'pending', _jobs.c.run_after <= now) \
+        .order_by(_jobs.c.run_after, _jobs.c.id) \
+        .limit(1)
+
+def claim_job():
+    """领取一个到期的任务并标记为执行中，没有可执行的任务时返回 None
+
+    先查出候选任务再按状态条件更新，更新成功才算领到，多个线程或进程可以同时领取。
+    """
+    with engine.connect() as conn:
+        for _ in range(5):
+            now = _utcnow()
+            job_id = conn.execute(next_job_query(now)).scalar()
+            if job_id is None:
+                return None
+            claimed = conn.execute(
+                update(_jobs)
+                .where(_jobs.c.id == job_id, _jobs.c.status == 'pending')
+                .values(status='running', started_at=now, attempts=_jobs.c.attempts + 1)
+            ).rowcount
+            conn.commit()
+            if claimed:
+                return conn.execute(select(_jobs).where(_jobs.c.id == job_id)).first()
+    return None
+
+def _update_job(job_id, **values):
+    with engine.begin() as conn:
+        conn.execute(update(_jobs).where(_jobs.c.id == job_id).values(**values))
+
+def complete_job(job_id):
+    _update_job(job_id, status='done', last_error=None, finished_at=_utcnow())
+
+def fail_job(job_id, error):
+    _update_job(job_id, status='failed', last_error=error, finished_at=_utcnow())
+
+def retry_job(job_id, error, delay):
+    """任务放回队列，delay 秒后再执行"""
+    _update_job(job_id, status='pending', last_error=error,
+                run_after=_utcnow() + datetime.timedelta(seconds=delay))
+
+def recover_stale_jobs():
+    """把执行超时的任务放回队列，返回恢复的任务数"""
+    now = _utcnow()
+    with engine.begin() as conn:
+        return conn.execute(
+            update(_jobs)
+            .where(_jobs.c.status == 'running',
+                   _jobs.c.started_at < now - datetime.timedelta(seconds=ANALYSIS_JOB_TIMEOUT))
+            .values(status='pending', run_after=now)
+        ).rowcount
+
+def retry_delay(error, attempts):
+    """失败后重试前等待的秒数，不应重试时返回 None
+
+    只重试限流、服务端错误和网络错误，等待时间按指数增长并加入随机抖动，
+    接口给出 Retry-After 时至少等待该时间。
+    """
+    if attempts >= ANALYSIS_MAX_ATTEMPTS:
+        return None
+    if isinstance(error, APIError):
+        if not error.retryable:
+            return None
+        retry_after = error.retry_after or 0
+    elif isinstance(error, requests.RequestException):
+        retry_after = 0
+    else:
+        return None
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempts - 1))
+    # 同时失败的任务错开重试时间
+    return max(random.uniform(delay / 2, delay), retry_after)
+
+def queue_stats():
+    """队列深度和最近的吞吐量"""
+    now = _utcnow()
+    with engine.connect() as conn:
+        counts = dict(conn.execute(select(_jobs.c.status, func.count()).group_by(_jobs.c.status)).all())
+        ready = conn.execute(
+            select(func.count()).where(_jobs.c.status == 'pending', _jobs.c.run_after <= now)
+        ).scalar()
+        next_run_at = conn.execute(
+            select(func.min(_jobs.c.run_after)).where(_jobs.c.status == 'pending')
+        ).scalar()
+        finished = {}
+        for minutes in (1, 5, 60):
+            finished[minutes] = conn.execute(
+                select(func.count()).where(_jobs.c.status == 'done',
+                                           _jobs.c.finished_at >= now - datetime.timedelta(minutes=minutes))
+            ).scalar()
+    pending = counts.get('pending', 0)
+    return {
+        'pending': pending,
+        'ready': ready,  # 已到执行时间的任务，其余为等待重试的任务
+        'delayed': pending - ready,
+        'running': counts.get('running', 0),
+        'done': counts.get('done', 0),
+        'failed': counts.get('failed', 0),
+        'depth': pending + counts.get('running', 0),
+        'next_run_at': next_run_at.isoformat() if next_run_at else None,
+        'done_last_minute': finished[1],
+        'done_per_minute_5m': finished[5] / 5,
+        'done_per_minute_1h': finished[60] / 60
+    }
+
+class AnalysisWorkerPool:
+    """后台分析工作线程池，从队列领取任务并调用 AIService 分析
+
+    API 调用速率由 AIService 的令牌桶统一限制，线程数只决定同时进行的请求数上限。
+    """
+
+    def __init__(self, service, workers=ANALYSIS_WORKERS):
+        self.service = service
+        self.workers = workers
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._recovered_at = 0.0
+
+    def _recover(self):
+        self._recovered_at = time.monotonic()
+        recovered = recover_stale_jobs()
+        if recovered:
+            print(f"已将 {recovered} 个执行超时的分析任务放回队列")
+
+    def start(self):
+        """启动工作线程，已启动时不做任何事"""
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            self._recover()
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'analysis-worker-{number + 1}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def ensure_started(self):
+        """按 ANALYSIS_WORKERS 在本进程中启动工作线程，可以在每个请求前调用"""
+        if self.workers > 0 and not self._threads:
+            self.start()
+
+    def notify(self):
+        """有新任务入队，唤醒空闲的工作线程"""
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        """通知工作线程在当前任务完成后退出，并等待它们结束"""
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+    def status(self):
+        """本进程工作线程的数量和处理计数"""
+        return {
+            'workers': len(self._threads),
+            'completed': self.completed,
+            'failed': self.failed,
+            'retried': self.retried,
+            'rate_limit_tokens': round(self.service.rate_limiter.available(), 2)
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job = claim_job()
+            except Exception as e:
+                print(f"领取分析任务失败: {str(e)}")
+                job = None
+            if job is None:
+                self._wake.wait(POLL_INTERVAL)
+                self._wake.clear()
+                # 其他进程的工作线程退出后留下的任务
+                if time.monotonic() - self._recovered_at > RECOVER_INTERVAL:
+                    try:
+                        self._recover()
+                    except Exception as e:
+                        print(f"恢复超时的分析任务失败: {str(e)}")
+                continue
+            try:
+                self.run_job(job)
+            except Exception as e:
+                # 更新任务状态失败时任务保持执行中，超时后会被放回队列
+                print(f"更新分析任务 {job.id} 失败: {str(e)}")
+
+    def _count(self, name):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def run_job(self, job):
+        """执行一个已领取的任务，按结果标记完成、失败或稍后重试"""
+        try:
+            file = db_session.get(File, job.file_id)
+            if file is None:
+                fail_job(job.id, '文件不存在')
+                self._count('failed')
+                return
+            storage = get_pool(file.storage_id)
+            if storage is None:
+                fail_job(job.id, '存储池不存在')
+                self._count('failed')
+                return
+            self.service.analyze_file(file, storage.client, force=job.force, embed=True)
+            complete_job(job.id)
+            self._count('completed')
+        except Exception as e:
+            delay = retry_delay(e, job.attempts)
+            if delay is None:
+                print(f"分析文件 {job.file_id} 失败: {str(e)}")
+                fail_job(job.id, str(e))
+                self._count('failed')
+            else:
+                retry_job(job.id, str(e), delay)
+                self._count('retried')
+        finally:
+            # 工作线程各自持有会话，每个任务结束后归还连接
+            db_session.remove()
+            read_session.remove()
@@ -0,0 +1,108 @@
+import os
+import math
+import numpy as np
+
+# 默认检索的倒排列表数：越大召回率越高、越慢
+ANN_NPROBE = int(os.getenv('ANN_NPROBE', 8))
+# 向量数少于该值时直接精确检索，不使用近似索引
+ANN_MIN_VECTORS = int(os.getenv('ANN_MIN_VECTORS', 50000))
+# k-means 迭代次数，以及每个聚类中心使用的训练样本数
+KMEANS_ITERATIONS = 10
+SAMPLES_PER_LIST = 32
+# 计算最近聚类中心时每批处理的向量数，限制临时矩阵的大小
+ASSIGN_BATCH_SIZE = 65536
+
+def default_nlist(count):
+    """倒排列表数的经验值：约为向量数平方根的 4 倍"""
+    return max(1, min(count, int(4 * math.sqrt(count))))
+
+def assign(vectors, centroids):
+    """每个向量最近（点积最大）的聚类中心序号"""
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BATCH_SIZE):
+        batch = np.asarray(vectors[start:start + ASSIGN_BATCH_SIZE], dtype=np.float32)
+        labels[start:start + len(batch)] = np.argmax(batch @ centroids.T, axis=1)
+    return labels
+
+def kmeans(vectors, k, iterations=KMEANS_ITERATIONS, seed=0):
+    """球面 k-means：向量和聚类中心都是单位向量，按点积分配，中心取均值后归一化"""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = assign(vectors, centroids)
+        order = np.argsort(labels, kind='stable')
+        clusters, starts = np.unique(labels[order], return_index=True)
+        sums = np.add.reduceat(vectors[order], starts, axis=0)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids[clusters] = sums / np.where(norms == 0, 1, norms)
+        # 没有分到向量的中心换成随机样本
+        empty = np.setdiff1d(np.arange(k), clusters)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+    return centroids
+
+class IVFIndex:
+    """倒排文件（IVF）近似最近邻索引
+
+    用 k-means 把向量划分到 nlist 个聚类，检索时只计算与查询最近的 nprobe 个聚类中的向量。
+    labels 与向量存储的行一一对应（-1 为空位），新增的行直接分配到最近的聚类，不重新训练。
+    """
+
+    def __init__(self, centroids, labels, count):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.labels = labels
+        self._stale = 0
+        self._build_lists(count)
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def train(cls, vectors, labels, nlist, used=None, seed=0):
+        """用 vectors 中 used 为真的行训练聚类中心并分配聚类，结果写入 labels，其余行为 -1"""
+        count = len(vectors)
+        used = np.ones(count, dtype=bool) if used is None else used
+        rng = np.random.default_rng(seed)
+        rows = np.flatnonzero(used)
+        sample = np.sort(rng.choice(rows, min(len(rows), nlist * SAMPLES_PER_LIST), replace=False))
+        centroids = kmeans(vectors[sample], nlist, seed=seed)
+        labels[:count] = assign(vectors, centroids)
+        labels[:count][~used] = -1
+        return cls(centroids, labels, count)
+
+    def _build_lists(self, count):
+        labels = self.labels[:count]
+        rows = np.flatnonzero(labels >= 0)
+        order = rows[np.argsort(labels[rows], kind='stable')]
+        bounds = np.searchsorted(labels[order], np.arange(self.nlist + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(self.nlist)]
+        self._count = count
+        self._stale = 0
+
+    def add(self, rows, vectors):
+        """为新写入的行分配聚类"""
+        new_labels = assign(vectors, self.centroids)
+        self.labels[rows] = new_labels
+        order = np.argsort(new_labels, kind='stable')
+        clusters, starts = np.unique(new_labels[order], return_index=True)
+        for label, group in zip(clusters, np.split(rows[order], starts[1:])):
+            self._lists[label] = np.concatenate([self._lists[label], group])
+        self._count = max(self._count, int(rows.max()) + 1)
+
+    def remove(self, rows):
+        """标记行已删除；倒排列表中的旧行号在检索时过滤，积累过多时重建列表"""
+        self.labels[rows] = -1
+        self._stale += len(rows)
+        if self._stale > self._count // 5:
+            self._build_lists(self._count)
+
+    def candidates(self, query, nprobe=ANN_NPROBE):
+        """与查询最近的 nprobe 个聚类中的行号"""
+        nprobe = min(nprobe, self.nlist)
+        scores = self.centroids @ query
+        probe = np.argpartition(-scores, nprobe - 1)[:nprobe] if nprobe < self.nlist else np.arange(self.nlist)
+        rows = np.concatenate([self._lists[label] for label in probe])
+        # 行被删除或复用后可能已不属于这些聚类
+        return rows[np.isin(self.labels[rows], probe)]
@@ -0,0 +1,94 @@
+import json
+import uuid
+import datetime
+from models.blob import Blob
+from database import db_session, insert_ignore
+
+# 内容寻址存储的根目录
+BLOB_PREFIX = 'blobs'
+
+def blob_path(checksum):
+    """内容寻址的存储路径：blobs/ab/cd/<sha256>"""
+    return f'{BLOB_PREFIX}/{checksum[:2]}/{checksum[2:4]}/{checksum}'
+
+def is_dedup_enabled(storage):
+    """存储池是否开启了按内容去重"""
+    try:
+        return bool(json.loads(storage.config).get('dedup'))
+    except (TypeError, ValueError):
+        return False
+
+def find_blob(storage_id, checksum):
+    """按内容哈希查找存储池中已有的内容块"""
+    return db_session.query(Blob).filter_by(storage_id=storage_id, checksum=checksum).first()
+
+def acquire_blob(blob):
+    """引用计数加一，在数据库端自增以免并发请求互相覆盖；内容块已被删除时返回 False"""
+    updated = db_session.query(Blob).filter_by(id=blob.id).update(
+        {Blob.ref_count: Blob.ref_count + 1},
+        synchronize_session=False
+    )
+    return updated == 1
+
+def release_blob(blob_id):
+    """引用计数减一，引用归零时删除记录并返回需要删除的存储路径"""
+    db_session.query(Blob).filter_by(id=blob_id).update(
+        {Blob.ref_count: Blob.ref_count - 1},
+        synchronize_session=False
+    )
+    blob = db_session.get(Blob, blob_id)
+    if blob is None:
+        return None
+    db_session.refresh(blob)
+    if blob.ref_count > 0:
+        return None
+    db_session.delete(blob)
+    return blob.path
+
+def store_blob(storage_client, storage_id, stream, chunk_size):
+    """流式保存上传内容并计算哈希；相同内容已存在时丢弃本次数据，只增加引用
+
+    记录与调用方的文件记录在同一事务中写入，不使用保存点：pysqlite 下最外层的 SAVEPOINT
+    释放时就会提交。返回 (blob, created)，created 为真表示内容是本次新写入的，
+    事务回滚后应交给 discard_blobs 删除。
+    """
+    # 哈希要等数据全部写完才知道，先写入临时路径
+    staging_path = f'{BLOB_PREFIX}/staging/{uuid.uuid4().hex}'
+    size, checksum = storage_client.save_stream(staging_path, stream, chunk_size)
+
+    try:
+        blob = find_blob(storage_id, checksum)
+        if blob is not None and acquire_blob(blob):
+            if storage_client.exists(blob.path):
+                storage_client.delete_file(staging_path)
+            else:
+                # 存储中的内容丢失时用本次上传的数据补回
+                storage_client.move_file(staging_path, blob.path)
+            return blob, False
+
+        storage_client.move_file(staging_path, blob_path(checksum))
+        inserted = db_session.execute(insert_ignore(db_session.get_bind(), Blob.__table__).values(
+            storage_id=storage_id,
+            checksum=checksum,
+            path=blob_path(checksum),
+            size=size,
+            ref_count=1,
+            created_at=datetime.datetime.utcnow()
+        )).rowcount
+        blob = find_blob(storage_id, checksum)
+        if not inserted:
+            # 并发请求已创建了相同内容的记录，改为引用该记录
+            acquire_blob(blob)
+        return blob, bool(inserted)
+    except BaseException:
+        storage_client.delete_file(staging_path)
+        raise
+
+def discard_blobs(storage_client, storage_id, checksums):
+    """上传事务回滚后删除本次新写入、且没有其他请求引用的内容"""
+    for checksum in checksums:
+        try:
+            if find_blob(storage_id, checksum) is None:
+                storage_client.delete_file(blob_path(checksum))
+        except Exception as e:
+            print(f"删除未引用的内容 {checksum} 失败: {str(e)}")
@@ -0,0 +1,78 @@
+import mimetypes
+
+# 文件分类，顺序即页面上的展示顺序
+CATEGORIES = ('image', 'video', 'audio', 'document', 'spreadsheet', 'presentation', 'code', 'text', 'archive', 'other')
+CATEGORY_LABELS = {
+    'image': '图片',
+    'video': '视频',
+    'audio': '音频',
+    'document': '文档',
+    'spreadsheet': '表格',
+    'presentation': '演示文稿',
+    'code': '代码',
+    'text': '文本',
+    'archive': '压缩包',
+    'other': '其他'
+}
+
+# MIME 类型前缀到分类，按顺序匹配，更具体的前缀放在前面
+_MIME_PREFIXES = (
+    ('image/', 'image'),
+    ('video/', 'video'),
+    ('audio/', 'audio'),
+    ('application/vnd.openxmlformats-officedocument.wordprocessingml', 'document'),
+    ('application/msword', 'document'),
+    ('application/pdf', 'document'),
+    ('application/rtf', 'document'),
+    ('application/vnd.oasis.opendocument.text', 'document'),
+    ('application/vnd.openxmlformats-officedocument.spreadsheetml', 'spreadsheet'),
+    ('application/vnd.ms-excel', 'spreadsheet'),
+    ('application/vnd.oasis.opendocument.spreadsheet', 'spreadsheet'),
+    ('text/csv', 'spreadsheet'),
+    ('application/vnd.openxmlformats-officedocument.presentationml', 'presentation'),
+    ('application/vnd.ms-powerpoint', 'presentation'),
+    ('application/vnd.oasis.opendocument.presentation', 'presentation'),
+    ('text/', 'text'),
+    ('application/json', 'text'),
+    ('application/xml', 'text'),
+    ('application/zip', 'archive'),
+    ('application/x-tar', 'archive'),
+    ('application/gzip', 'archive'),
+    ('application/x-7z-compressed', 'archive'),
+    ('application/x-rar', 'archive'),
+    ('application/x-bzip2', 'archive'),
+    ('application/x-xz', 'archive'),
+)
+# 源代码按扩展名判断，mimetypes 会把其中大部分识别为 text/*
+CODE_EXTENSIONS = frozenset((
+    'py', 'js', 'mjs', 'ts', 'tsx', 'jsx', 'java', 'kt', 'scala', 'c', 'h', 'cc', 'cpp', 'hpp', 'cs',
+    'go', 'rs', 'rb', 'php', 'swift', 'm', 'sh', 'bash', 'ps1', 'bat', 'sql', 'r', 'lua', 'pl',
+    'html', 'htm', 'css', 'scss', 'vue', 'ipynb'
+))
+# mimetypes 识别不了的常见扩展名
+_EXTENSIONS = {
+    'md': 'text',
+    'log': 'text',
+    'yaml': 'text',
+    'yml': 'text',
+    'rar': 'archive',
+    '7z': 'archive',
+}
+
+def file_category(mime_type=None, extension=None):
+    """根据扩展名和 MIME 类型判断文件分类，无法识别时为 other
+
+    源代码只看扩展名；其余优先按 MIME 类型，浏览器上报 octet-stream 或未上报时再按扩展名推断。
+    """
+    mime_type = (mime_type or '').lower()
+    extension = (extension or '').lower().lstrip('.')
+    if extension in CODE_EXTENSIONS:
+        return 'code'
+    if not mime_type or mime_type == 'application/octet-stream':
+        if extension in _EXTENSIONS:
+            return _EXTENSIONS[extension]
+        mime_type = (mimetypes.guess_type(f'file.{extension}')[0] or '').lower() if extension else ''
+    for prefix, category in _MIME_PREFIXES:
+        if mime_type.startswith(prefix):
+            return category
+    return 'other'
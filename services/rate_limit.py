@@ -0,0 +1,58 @@
+import time
+import threading
+
+class TokenBucket:
+    """令牌桶限流：每秒补充 rate 个令牌，最多积攒 capacity 个，调用方取到令牌才能发出请求
+
+    在进程内的所有线程间共享；多个进程各自限流，总速率为各进程之和。
+    rate 不大于 0 时不限流，只保留 pause 的整体退避。
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _fill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self, amount=1):
+        """取走 amount 个令牌，不足时等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self.rate <= 0:
+                    return
+                else:
+                    self._fill(now)
+                    if self._tokens >= amount:
+                        self._tokens -= amount
+                        return
+                    wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """暂停发放令牌，用于接口返回 429 后整体退避"""
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            # 暂停结束后从零开始补充令牌
+            self._tokens = 0.0
+            self._updated_at = self._paused_until
+
+    def available(self):
+        """当前可用的令牌数"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return 0.0
+            if self.rate <= 0:
+                return self.capacity
+            self._fill(now)
+            return self._tokens
@@ -0,0 +1,58 @@
+import os
+import json
+import hashlib
+import threading
+import boto3
+from botocore.config import Config
+
+# 每个 S3 客户端的默认连接池大小
+DEFAULT_MAX_POOL_CONNECTIONS = int(os.getenv('S3_MAX_POOL_CONNECTIONS', 50))
+
+# 影响客户端构造的配置项，bucket 等其它字段不参与缓存键
+CLIENT_CONFIG_KEYS = ('access_key', 'secret_key', 'region', 'max_pool_connections')
+
+# 进程级客户端缓存：(存储池ID, 配置哈希) -> boto3 客户端
+_clients = {}
+_lock = threading.Lock()
+
+def _config_hash(config):
+    """计算存储池配置的哈希值"""
+    relevant = {key: config.get(key) for key in CLIENT_CONFIG_KEYS}
+    payload = json.dumps(relevant, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()
+
+def _create_client(config):
+    """创建新的 S3 客户端"""
+    pool_size = int(config.get('max_pool_connections') or DEFAULT_MAX_POOL_CONNECTIONS)
+    # boto3 的默认 Session 不是线程安全的，这里为每个客户端单独创建 Session
+    session = boto3.session.Session()
+    return session.client(
+        's3',
+        region_name=config.get('region'),
+        aws_access_key_id=config.get('access_key'),
+        aws_secret_access_key=config.get('secret_key'),
+        config=Config(max_pool_connections=pool_size)
+    )
+
+def get_s3_client(storage_id, config):
+    """获取存储池对应的 S3 客户端，相同配置在进程内复用"""
+    key = (storage_id, _config_hash(config))
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            # 配置变化后旧客户端不再使用，直接丢弃
+            for stale_key in [k for k in _clients if k[0] == storage_id]:
+                del _clients[stale_key]
+            client = _create_client(config)
+            _clients[key] = client
+    return client
+
+def invalidate_s3_client(storage_id):
+    """移除存储池对应的 S3 客户端缓存"""
+    with _lock:
+        for key in [k for k in _clients if k[0] == storage_id]:
+            del _clients[key]
@@ -0,0 +1,214 @@
+import re
+import json
+from markupsafe import Markup, escape
+from sqlalchemy import event, inspect, text, Integer, Float
+from models.file import File, FileContent
+from models.ai import FileAnalysis
+from database import db_session, read_session, engine, is_sqlite
+from services.tokenizer import query_phrases, iter_runs
+
+# 文件名、内容和 AI 分析结果的全文索引，rowid 与 files.id 一致
+INDEXED_COLUMNS = ('name', 'original_name', 'content', 'summary', 'tags')
+NAME_COLUMNS = ('name', 'original_name')
+# bm25 各列权重：文件名命中比正文命中更相关
+RANK_FUNCTION = 'bm25(10.0, 10.0, 1.0, 3.0, 5.0)'
+# 索引中存放 search_tokens() 预先切好的词元（CJK 二元组、拉丁词），
+# 以空格分隔，所以 FTS5 只需按空白切分的 ascii 分词器
+TOKENIZE = "tokenize='ascii'"
+# 匹配摘要的长度（字符）
+SNIPPET_CHARS = 80
+
+_available = False
+
+_REINDEX_SQL = (
+    "INSERT INTO files_fts(rowid, name, original_name, content, summary, tags) "
+    "SELECT f.id, search_tokens(f.name), search_tokens(f.original_name), search_tokens(c.content), "
+    "search_tokens(a.content_summary), search_tokens(a.suggested_tags) "
+    "FROM files f LEFT JOIN file_contents c ON c.file_id = f.id LEFT JOIN file_analysis a "
+    "ON a.id = (SELECT max(id) FROM file_analysis WHERE file_id = f.id)"
+)
+# 生成摘要用的原文
+_SOURCES_SQL = (
+    "SELECT f.id, f.original_name, c.content, a.content_summary, a.suggested_tags "
+    "FROM files f LEFT JOIN file_contents c ON c.file_id = f.id LEFT JOIN file_analysis a "
+    "ON a.id = (SELECT max(id) FROM file_analysis WHERE file_id = f.id)"
+)
+
+def create_index():
+    """创建 FTS5 索引表；非 SQLite 数据库或 SQLite 未编译 FTS5 时退回 LIKE 搜索"""
+    global _available
+    if not is_sqlite(engine):
+        _available = False
+        return False
+    try:
+        with engine.begin() as conn:
+            definition = conn.execute(text(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'files_fts'"
+            )).scalar()
+            if definition is not None and TOKENIZE not in definition:
+                # 旧版索引直接存放原文，无法切分中文，重建
+                conn.execute(text("DROP TABLE files_fts"))
+                definition = None
+            if definition is None:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE files_fts USING fts5({', '.join(INDEXED_COLUMNS)}, {TOKENIZE})"
+                ))
+                # 设为默认排序函数，ORDER BY rank 可由 FTS5 直接按相关度输出
+                conn.execute(text(
+                    "INSERT INTO files_fts(files_fts, rank) VALUES ('rank', :rank)"
+                ), {'rank': RANK_FUNCTION})
+                conn.execute(text(_REINDEX_SQL))
+        _available = True
+    except Exception as e:
+        print(f"创建全文索引失败，搜索将退回 LIKE 查询: {e}")
+        _available = False
+    return _available
+
+def is_available():
+    """全文索引是否可用"""
+    return _available
+
+def rebuild_index():
+    """清空并重新回填全文索引，返回已索引的文件数"""
+    if not _available:
+        raise RuntimeError('全文索引不可用')
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM files_fts"))
+        conn.execute(text(_REINDEX_SQL))
+        return conn.execute(text("SELECT count(*) FROM files_fts")).scalar()
+
+def _reindex(connection, file_id):
+    connection.execute(text("DELETE FROM files_fts WHERE rowid = :file_id"), {'file_id': file_id})
+    connection.execute(text(_REINDEX_SQL + " WHERE f.id = :file_id"), {'file_id': file_id})
+
+def build_match_query(query, columns=None):
+    """把用户输入转换为 FTS5 查询，分词方式与建索引时一致，各部分之间为 AND"""
+    parts = []
+    for tokens, prefix in query_phrases(query):
+        phrase = '"' + ' '.join(token.replace('"', '""') for token in tokens) + '"'
+        parts.append(phrase + '*' if prefix else phrase)
+    if not parts:
+        return None
+    expression = ' '.join(parts)
+    if columns:
+        expression = f"{{{' '.join(columns)}}} : ({expression})"
+    return expression
+
+def match_subquery(query, columns=None):
+    """返回 (file_id, rank) 子查询，可与 File 查询连接后按相关度排序"""
+    match = build_match_query(query, columns)
+    if match is None:
+        return None
+    return text(
+        "SELECT rowid AS file_id, rank FROM files_fts WHERE files_fts MATCH :match"
+    ).bindparams(match=match).columns(file_id=Integer, rank=Float).subquery('fts')
+
+def _term_pattern(query):
+    terms = sorted({run for _, run in iter_runs(query)}, key=len, reverse=True)
+    if not terms:
+        return None
+    return re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+
+def make_snippet(value, pattern, width=SNIPPET_CHARS):
+    """在原文中截取第一个命中词附近的片段，转义后用 <mark> 高亮命中词"""
+    match = pattern.search(value) if value else None
+    if match is None:
+        return None
+    start = max(0, match.start() - width // 3)
+    end = min(len(value), start + width)
+    fragment = value[start:end]
+
+    parts = ['…' if start > 0 else '']
+    position = 0
+    for hit in pattern.finditer(fragment):
+        parts.append(str(escape(fragment[position:hit.start()])))
+        parts.append(f'<mark>{escape(hit.group())}</mark>')
+        position = hit.end()
+    parts.append(str(escape(fragment[position:])))
+    parts.append('…' if end < len(value) else '')
+    return Markup(''.join(parts))
+
+def _tags_text(tags):
+    try:
+        return ', '.join(str(tag) for tag in json.loads(tags))
+    except (TypeError, ValueError):
+        return tags
+
+def snippets(query, file_ids, columns=None):
+    """为给定文件生成带高亮的匹配摘要，返回 {file_id: Markup}"""
+    pattern = _term_pattern(query)
+    if pattern is None or not file_ids:
+        return {}
+    rows = read_session.execute(text(
+        _SOURCES_SQL + f" WHERE f.id IN ({', '.join(str(int(file_id)) for file_id in file_ids)})"
+    ))
+    result = {}
+    for file_id, original_name, content, summary, tags in rows:
+        sources = [original_name] if columns else [original_name, content, summary, _tags_text(tags)]
+        for value in sources:
+            snippet = make_snippet(value, pattern)
+            if snippet is not None:
+                result[file_id] = snippet
+                break
+    return result
+
+def search(query, storage_id=None, limit=20, columns=None):
+    """按 bm25 相关度搜索文件，返回附带 snippet 属性的 File 列表"""
+    match = build_match_query(query, columns)
+    if match is None:
+        return []
+
+    sql = "SELECT files_fts.rowid FROM files_fts "
+    params = {'match': match, 'limit': limit}
+    if storage_id is not None:
+        sql += "JOIN files ON files.id = files_fts.rowid WHERE files_fts MATCH :match AND files.storage_id = :storage_id "
+        params['storage_id'] = storage_id
+    else:
+        sql += "WHERE files_fts MATCH :match "
+    sql += "ORDER BY rank LIMIT :limit"
+
+    file_ids = read_session.execute(text(sql), params).scalars().all()
+    files = {file.id: file for file in read_session.query(File).filter(File.id.in_(file_ids))}
+    highlights = snippets(query, file_ids, columns)
+    results = []
+    for file_id in file_ids:
+        file = files.get(file_id)
+        if file is None:
+            continue
+        file.snippet = highlights.get(file_id)
+        results.append(file)
+    return results
+
+# 通过 ORM 映射事件在同一事务内维护索引
+
+@event.listens_for(File, 'after_insert')
+def _file_inserted(mapper, connection, target):
+    if _available:
+        _reindex(connection, target.id)
+
+@event.listens_for(File, 'after_update')
+def _file_updated(mapper, connection, target):
+    if not _available:
+        return
+    state = inspect(target)
+    if any(state.attrs[column].history.has_changes() for column in ('name', 'original_name')):
+        _reindex(connection, target.id)
+
+@event.listens_for(File, 'after_delete')
+def _file_deleted(mapper, connection, target):
+    if _available:
+        connection.execute(text("DELETE FROM files_fts WHERE rowid = :file_id"), {'file_id': target.id})
+
+@event.listens_for(FileContent, 'after_insert')
+@event.listens_for(FileContent, 'after_update')
+@event.listens_for(FileContent, 'after_delete')
+def _content_changed(mapper, connection, target):
+    if _available:
+        _reindex(connection, target.file_id)
+
+@event.listens_for(FileAnalysis, 'after_insert')
+@event.listens_for(FileAnalysis, 'after_update')
+@event.listens_for(FileAnalysis, 'after_delete')
+def _analysis_changed(mapper, connection, target):
+    if _available and target.file_id is not None:
+        _reindex(connection, target.file_id)
@@ -0,0 +1,39 @@
+import json
+import datetime
+from flask import Response
+from models.file import File
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时退回标准库，输出格式相同
+    orjson = None
+
+# 列表接口返回的字段，与 File.to_dict() 一致
+FILE_FIELDS = ('id', 'name', 'original_name', 'path', 'size', 'type', 'category', 'mime_type',
+               'checksum', 'storage_id', 'created_at', 'updated_at')
+# 只查询这些列，结果为元组，不构造 ORM 对象
+FILE_COLUMNS = tuple(getattr(File, field) for field in FILE_FIELDS)
+
+def _default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f'无法序列化的类型: {type(value).__name__}')
+
+def dumps(value):
+    """编码为 JSON 字节串，日期时间输出为 ISO 8601 格式"""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def rows_to_dicts(rows, fields=FILE_FIELDS):
+    """把按 fields 顺序查询出的元组行转换为字典"""
+    return [dict(zip(fields, row)) for row in rows]
+
+def json_response(value, status=200):
+    """直接返回编码好的 JSON，绕过 jsonify 的逐项转换"""
+    return Response(dumps(value), status=status, mimetype='application/json')
+
+def ndjson_lines(rows, fields=FILE_FIELDS):
+    """逐行编码为 NDJSON，每行一个 JSON 对象"""
+    for row in rows:
+        yield dumps(dict(zip(fields, row))) + b'\n'
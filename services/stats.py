@@ -0,0 +1,121 @@
+import datetime
+from sqlalchemy import event, inspect, update, insert, delete, select, func, case, or_
+from models.file import File
+from models.storage import Storage
+from models.stats import StorageStats, StorageCategoryStats
+from database import engine, insert_ignore
+
+_stats = StorageStats.__table__
+_category_stats = StorageCategoryStats.__table__
+
+def _upsert(connection, table, key, changes, row):
+    """按 changes 更新一行统计，行不存在时按 row 插入"""
+    where = [table.c[name] == value for name, value in key.items()]
+    if connection.execute(update(table).where(*where).values(**changes)).rowcount:
+        return
+    if not connection.execute(insert_ignore(connection, table).values(**key, **row)).rowcount:
+        # 其他事务刚插入了这一行，重新累加
+        connection.execute(update(table).where(*where).values(**changes))
+
+def apply_delta(connection, storage_id, category, count, size, uploaded_at=None):
+    """在当前事务内更新存储池统计和分类统计，count 和 size 为增量"""
+    now = datetime.datetime.utcnow()
+    changes = {
+        'file_count': _stats.c.file_count + count,
+        'total_bytes': _stats.c.total_bytes + size,
+        'updated_at': now
+    }
+    if uploaded_at is not None:
+        changes['last_upload_at'] = case(
+            (or_(_stats.c.last_upload_at.is_(None), _stats.c.last_upload_at < uploaded_at), uploaded_at),
+            else_=_stats.c.last_upload_at
+        )
+    _upsert(connection, _stats, {'storage_id': storage_id}, changes, {
+        'file_count': max(count, 0),
+        'total_bytes': max(size, 0),
+        'last_upload_at': uploaded_at,
+        'updated_at': now
+    })
+    _upsert(connection, _category_stats, {'storage_id': storage_id, 'category': category}, {
+        'file_count': _category_stats.c.file_count + count,
+        'total_bytes': _category_stats.c.total_bytes + size
+    }, {
+        'file_count': max(count, 0),
+        'total_bytes': max(size, 0)
+    })
+
+def rebuild_stats():
+    """按文件表重新计算所有存储池的统计，返回统计到的文件数
+
+    增量维护只覆盖通过 ORM 增删的文件，手工改库或批量导入后用它校正。
+    """
+    now = datetime.datetime.utcnow()
+    totals = {}
+    categories = []
+    with engine.begin() as conn:
+        rows = conn.execute(
+            select(File.storage_id, File.category,
+                   func.count(), func.coalesce(func.sum(File.size), 0), func.max(File.created_at))
+            .group_by(File.storage_id, File.category)
+        )
+        for storage_id, category, count, size, last_upload_at in rows:
+            total = totals.setdefault(storage_id, {
+                'storage_id': storage_id, 'file_count': 0, 'total_bytes': 0,
+                'last_upload_at': None, 'updated_at': now
+            })
+            total['file_count'] += count
+            total['total_bytes'] += size
+            if last_upload_at and (total['last_upload_at'] is None or last_upload_at > total['last_upload_at']):
+                total['last_upload_at'] = last_upload_at
+            categories.append({'storage_id': storage_id, 'category': category,
+                               'file_count': count, 'total_bytes': size})
+
+        conn.execute(delete(_category_stats))
+        conn.execute(delete(_stats))
+        if totals:
+            conn.execute(insert(_stats), list(totals.values()))
+        if categories:
+            conn.execute(insert(_category_stats), categories)
+    return sum(total['file_count'] for total in totals.values())
+
+# 通过 ORM 映射事件在上传和删除文件的同一事务内维护统计
+
+@event.listens_for(File, 'after_insert')
+def _file_inserted(mapper, connection, target):
+    apply_delta(connection, target.storage_id, target.category,
+                1, target.size or 0, target.created_at or datetime.datetime.utcnow())
+
+@event.listens_for(File, 'after_delete')
+def _file_deleted(mapper, connection, target):
+    apply_delta(connection, target.storage_id, target.category,
+                -1, -(target.size or 0))
+
+# 影响统计的列；修改文件记录时按这些列的旧值扣除
+_TRACKED_COLUMNS = ('storage_id', 'size', 'category')
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    """空的 set 监听器，只为开启 active_history"""
+
+# 提交后对象已过期，默认直接赋值不会加载旧值，after_update 中拿不到修改前的值
+for _column in _TRACKED_COLUMNS:
+    event.listen(getattr(File, _column), 'set', _keep_old_value, active_history=True)
+
+@event.listens_for(File, 'after_update')
+def _file_updated(mapper, connection, target):
+    state = inspect(target)
+    if not any(state.attrs[column].history.has_changes() for column in _TRACKED_COLUMNS):
+        return
+    # 先按旧值扣除，再按新值累加
+    old = {}
+    for column in _TRACKED_COLUMNS:
+        history = state.attrs[column].history
+        old[column] = history.deleted[0] if history.deleted else getattr(target, column)
+    apply_delta(connection, old['storage_id'], old['category'],
+                -1, -(old['size'] or 0))
+    apply_delta(connection, target.storage_id, target.category,
+                1, target.size or 0)
+
+@event.listens_for(Storage, 'after_delete')
+def _storage_deleted(mapper, connection, target):
+    connection.execute(delete(_category_stats).where(_category_stats.c.storage_id == target.id))
+    connection.execute(delete(_stats).where(_stats.c.storage_id == target.id))
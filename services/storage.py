@@ -1,6 +1,38 @@
 import os
-import boto3
+import json
+import hashlib
+import tempfile
 from botocore.exceptions import ClientError
+from services.s3_clients import get_s3_client
+
+# 流式上传默认分块大小（字节）
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# S3 分片上传要求除最后一片外每片不小于 5MB
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+
+def iter_chunks(stream, chunk_size=DEFAULT_CHUNK_SIZE):
+    """按固定大小从流中读取数据块"""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+def create_storage_client(storage):
+    """根据存储池配置创建存储客户端"""
+    config = json.loads(storage.config)
+    if storage.type == 'local':
+        return LocalStorage(config['path'])
+    elif storage.type == 's3':
+        return S3Storage(
+            access_key=config['access_key'],
+            secret_key=config['secret_key'],
+            bucket=config['bucket'],
+            region=config['region'],
+            storage_id=storage.id,
+            max_pool_connections=config.get('max_pool_connections')
+        )
+    raise ValueError(f'不支持的存储类型: {storage.type}')
 
 class LocalStorage:
     def __init__(self, base_path):
@@ -25,6 +57,62 @@ class LocalStorage:
         with open(full_path, 'wb') as f:
             f.write(content)
     
+    def save_stream(self, file_path, stream, chunk_size=DEFAULT_CHUNK_SIZE):
+        """分块将流写入磁盘，返回 (文件大小, sha256)"""
+        full_path = os.path.join(self.base_path, file_path)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        
+        digest = hashlib.sha256()
+        size = 0
+        # 先写入同目录下的临时文件，完成后原子替换，避免留下半截文件
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter_chunks(stream, chunk_size):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        
+        return size, digest.hexdigest()
+    
+    def stat(self, file_path):
+        """获取文件大小和修改时间"""
+        full_path = os.path.join(self.base_path, file_path)
+        if not os.path.isfile(full_path):
+            raise FileNotFoundError(f'文件不存在: {file_path}')
+        
+        st = os.stat(full_path)
+        return {'size': st.st_size, 'mtime': st.st_mtime, 'etag': None}
+    
+    def read_range(self, file_path, start, stop, chunk_size=DEFAULT_CHUNK_SIZE):
+        """分块读取文件的 [start, stop) 区间"""
+        full_path = os.path.join(self.base_path, file_path)
+        with open(full_path, 'rb') as f:
+            f.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    
+    def exists(self, file_path):
+        """文件是否存在"""
+        return os.path.isfile(os.path.join(self.base_path, file_path))
+    
+    def move_file(self, src_path, dst_path):
+        """在存储内移动文件，目标已存在时覆盖"""
+        dst_full_path = os.path.join(self.base_path, dst_path)
+        os.makedirs(os.path.dirname(dst_full_path), exist_ok=True)
+        os.replace(os.path.join(self.base_path, src_path), dst_full_path)
+    
     def delete_file(self, file_path):
         """删除文件"""
         full_path = os.path.join(self.base_path, file_path)
@@ -32,13 +120,15 @@ class LocalStorage:
             os.remove(full_path)
 
 class S3Storage:
-    def __init__(self, access_key, secret_key, bucket, region):
-        self.s3 = boto3.client(
-            's3',
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name=region
-        )
+    def __init__(self, access_key, secret_key, bucket, region, storage_id=None,
+                 max_pool_connections=None):
+        self.s3 = get_s3_client(storage_id, {
+            'access_key': access_key,
+            'secret_key': secret_key,
+            'bucket': bucket,
+            'region': region,
+            'max_pool_connections': max_pool_connections
+        })
         self.bucket = bucket
     
     def get_file_content(self, file_path):
@@ -62,6 +152,126 @@ class S3Storage:
             Body=content
         )
     
+    def save_stream(self, file_path, stream, chunk_size=DEFAULT_CHUNK_SIZE):
+        """分片上传流数据，返回 (文件大小, sha256)"""
+        part_size = max(chunk_size, S3_MIN_PART_SIZE)
+        digest = hashlib.sha256()
+        size = 0
+        buffer = bytearray()
+        upload_id = None
+        parts = []
+        
+        try:
+            for chunk in iter_chunks(stream, chunk_size):
+                digest.update(chunk)
+                size += len(chunk)
+                buffer += chunk
+                if len(buffer) < part_size:
+                    continue
+                
+                if upload_id is None:
+                    upload_id = self.s3.create_multipart_upload(
+                        Bucket=self.bucket,
+                        Key=file_path
+                    )['UploadId']
+                parts.append(self._upload_part(file_path, upload_id, len(parts) + 1, buffer))
+                buffer = bytearray()
+            
+            if upload_id is None:
+                # 小文件直接一次性上传
+                self.save_file(file_path, bytes(buffer))
+                return size, digest.hexdigest()
+            
+            if buffer:
+                parts.append(self._upload_part(file_path, upload_id, len(parts) + 1, buffer))
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=file_path,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+        except BaseException:
+            if upload_id is not None:
+                self.s3.abort_multipart_upload(
+                    Bucket=self.bucket,
+                    Key=file_path,
+                    UploadId=upload_id
+                )
+            raise
+        
+        return size, digest.hexdigest()
+    
+    def stat(self, file_path):
+        """获取对象大小、修改时间和 ETag"""
+        try:
+            response = self.s3.head_object(
+                Bucket=self.bucket,
+                Key=file_path
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                raise FileNotFoundError(f'文件不存在: {file_path}')
+            raise
+        
+        return {
+            'size': response['ContentLength'],
+            'mtime': response['LastModified'].timestamp(),
+            'etag': response['ETag'].strip('"')
+        }
+    
+    def read_range(self, file_path, start, stop, chunk_size=DEFAULT_CHUNK_SIZE):
+        """通过 Range 请求分块读取对象的 [start, stop) 区间"""
+        response = self.s3.get_object(
+            Bucket=self.bucket,
+            Key=file_path,
+            Range=f'bytes={start}-{stop - 1}'
+        )
+        body = response['Body']
+        try:
+            yield from iter_chunks(body, chunk_size)
+        finally:
+            body.close()
+    
+    def get_download_url(self, file_path, expires_in=3600):
+        """生成预签名下载URL"""
+        return self.s3.generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': self.bucket,
+                'Key': file_path
+            },
+            ExpiresIn=expires_in
+        )
+    
+    def _upload_part(self, file_path, upload_id, part_number, data):
+        """上传单个分片"""
+        response = self.s3.upload_part(
+            Bucket=self.bucket,
+            Key=file_path,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=bytes(data)
+        )
+        return {'ETag': response['ETag'], 'PartNumber': part_number}
+    
+    def exists(self, file_path):
+        """对象是否存在"""
+        try:
+            self.stat(file_path)
+            return True
+        except FileNotFoundError:
+            return False
+    
+    def move_file(self, src_path, dst_path):
+        """在桶内移动对象（服务端复制后删除源对象）"""
+        # 托管复制，大对象自动使用分片复制
+        self.s3.copy(
+            {'Bucket': self.bucket, 'Key': src_path},
+            self.bucket,
+            dst_path
+        )
+        self.delete_file(src_path)
+    
     def delete_file(self, file_path):
         """删除文件"""
         try:
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import threading
+from sqlalchemy import select, update, insert
+from models.storage import Storage, StorageVersion
+from database import engine
+from services.storage import create_storage_client
+from services.dedup import is_dedup_enabled
+from services.s3_clients import invalidate_s3_client
+
+# 本进程缓存最多沿用多少秒后再检查一次数据库中的版本号，
+# 其他进程修改存储池后最迟在这个时间后生效；本进程的修改立即生效
+STORAGE_REGISTRY_TTL = float(os.getenv('STORAGE_REGISTRY_TTL', 5))
+
+_version_table = StorageVersion.__table__
+
+class StoragePool:
+    """存储池的只读快照，配置已解析，存储客户端在首次使用时创建并在进程内复用
+
+    与 Storage 模型有相同的 id、name、type、config、is_active 属性，可直接传给模板。
+    """
+
+    def __init__(self, storage):
+        self.id = storage.id
+        self.name = storage.name
+        self.type = storage.type
+        self.config = storage.config
+        self.is_active = bool(storage.is_active)
+        try:
+            self.options = json.loads(storage.config)
+        except (TypeError, ValueError):
+            self.options = {}
+        self.dedup = is_dedup_enabled(storage)
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """存储客户端"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = create_storage_client(self)
+        return self._client
+
+    def __repr__(self):
+        return f'<StoragePool {self.name}>'
+
+class StorageRegistry:
+    """进程内的存储池缓存
+
+    所有存储池一次性加载。请求只读内存中的快照，每隔 ttl 秒读一次数据库中的版本号，
+    版本变化时重新加载，未变更的存储池沿用已创建的客户端。
+    """
+
+    def __init__(self, ttl=STORAGE_REGISTRY_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._pools = {}
+        self._version = None
+        self._checked_at = 0.0
+
+    def _read_version(self, connection):
+        return connection.execute(
+            select(_version_table.c.version).where(_version_table.c.id == 1)
+        ).scalar() or 0
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self.ttl:
+            return
+        with self._lock:
+            if self._version is not None and now - self._checked_at < self.ttl:
+                return
+            with engine.connect() as conn:
+                version = self._read_version(conn)
+                if version != self._version:
+                    # 先读版本再读存储池：加载期间若有修改，下次检查时版本号不同会再次加载
+                    storages = conn.execute(select(Storage.__table__)).all()
+                    self._pools = self._rebuild(storages)
+                    self._version = version
+            self._checked_at = time.monotonic()
+
+    def _rebuild(self, storages):
+        pools = {}
+        for storage in storages:
+            pool = pools[storage.id] = StoragePool(storage)
+            old = self._pools.get(storage.id)
+            if old is not None and old.type == pool.type and old.config == pool.config:
+                # 配置未变，沿用旧快照上已创建的客户端
+                pool._client = old._client
+            else:
+                invalidate_s3_client(storage.id)
+        for storage_id in set(self._pools) - set(pools):
+            invalidate_s3_client(storage_id)
+        return pools
+
+    def get_active(self):
+        """当前激活的存储池，没有时返回 None"""
+        self._refresh()
+        return next((pool for pool in self._pools.values() if pool.is_active), None)
+
+    def get(self, storage_id):
+        """按 ID 获取存储池，不存在时返回 None"""
+        self._refresh()
+        return self._pools.get(storage_id)
+
+    def all(self):
+        """所有存储池，按 ID 排序"""
+        self._refresh()
+        return [self._pools[storage_id] for storage_id in sorted(self._pools)]
+
+    def invalidate(self):
+        """丢弃本进程的缓存，下次访问时重新加载"""
+        with self._lock:
+            self._version = None
+
+registry = StorageRegistry()
+
+def bump_version(session):
+    """在当前事务中把存储池版本号加一，应在修改存储池的同一事务中、提交前调用"""
+    updated = session.execute(
+        update(_version_table).where(_version_table.c.id == 1).values(version=_version_table.c.version + 1)
+    ).rowcount
+    if not updated:
+        session.execute(insert(_version_table).values(id=1, version=1))
+
+def get_active_pool():
+    """当前激活的存储池快照"""
+    return registry.get_active()
+
+def get_pool(storage_id):
+    """按 ID 获取存储池快照"""
+    return registry.get(storage_id)
+
+def get_all_pools():
+    """所有存储池快照"""
+    return registry.all()
+
+def invalidate():
+    """存储池变更提交后调用，使本进程立即看到修改"""
+    registry.invalidate()
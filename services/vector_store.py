@@ -0,0 +1,352 @@
+import os
+import json
+import threading
+import contextlib
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models.file import File
+from services.ann_index import IVFIndex, ANN_NPROBE, ANN_MIN_VECTORS, default_nlist
+
+try:
+    import fcntl
+except ImportError:  # Windows 上没有 fcntl，只在进程内加锁
+    fcntl = None
+
+# 向量文件所在目录
+VECTOR_STORE_PATH = os.getenv('VECTOR_STORE_PATH', 'vector_store')
+# 首次创建时预留的行数，之后每次写满时容量翻倍
+INITIAL_CAPACITY = 1024
+# 表示文件整体的向量的块序号，其余行为各文本块的向量（从 0 开始）
+FILE_CHUNK = -1
+
+def normalize(vectors):
+    """按行归一化为单位向量，之后点积即余弦相似度；零向量保持不变"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+class VectorStore:
+    """本地向量存储，每个文件一个整体向量和若干文本块向量
+
+    目录中的 vectors.npy 是 (容量, 维度) 的 float32 单位向量矩阵，keys.npy 是对应行的
+    (文件ID, 块序号)，文件ID为 -1 的行是空位；两者都以内存映射方式打开，启动时无需重新生成向量。
+    meta.json 记录维度和已使用的行数，每次写入后更新，其他进程发现它变化时重新加载。
+    建立近似索引（build_index）后，ivf_centroids.npy 保存聚类中心，ivf_labels.npy 保存每行所属的聚类。
+    """
+
+    def __init__(self, path=VECTOR_STORE_PATH, initial_capacity=INITIAL_CAPACITY):
+        self.path = path
+        self.initial_capacity = initial_capacity
+        self.dim = None
+        self.count = 0  # 已使用的行数，之后的行从未写入
+        self._vectors = None
+        self._keys = None
+        self._file_ids = np.empty(0, dtype=np.int64)  # keys[:, 0] 的内存副本，检索时不读映射文件
+        self._rows = {}  # 文件ID -> 行号数组
+        self._free = []  # count 以内已删除的空位
+        self._ivf = None
+        self._ivf_trained = 0  # 训练近似索引时的向量数
+        self._meta_stamp = None
+        self._lock = threading.RLock()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self._file('meta.json'))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self):
+        """meta.json 变化（其他进程写入过）时重新加载"""
+        stamp = self._stamp()
+        if stamp != self._meta_stamp:
+            self._load()
+            self._meta_stamp = stamp
+
+    def _load(self):
+        try:
+            with open(self._file('meta.json')) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            meta = {'dim': None, 'count': 0}
+        self.dim = meta['dim']
+        self.count = meta['count']
+        self._ivf = None
+        self._ivf_trained = 0
+        if self.dim is None:
+            self._vectors = self._keys = None
+            self._file_ids = np.empty(0, dtype=np.int64)
+        else:
+            self._vectors = np.load(self._file('vectors.npy'), mmap_mode='r+')
+            self._keys = np.load(self._file('keys.npy'), mmap_mode='r+')
+            self._file_ids = np.array(self._keys[:, 0])
+            if meta.get('ivf'):
+                self._ivf = IVFIndex(np.load(self._file('ivf_centroids.npy')),
+                                     np.load(self._file('ivf_labels.npy'), mmap_mode='r+'), self.count)
+                self._ivf_trained = meta['ivf']['trained']
+        self._rebuild_maps()
+
+    def _rebuild_maps(self):
+        """按文件ID分组行号，排序后一次切分，不逐行遍历"""
+        file_ids = self._file_ids[:self.count]
+        self._free = np.flatnonzero(file_ids < 0).tolist()
+        self._rows = _group_rows(file_ids, np.arange(self.count))
+
+    @contextlib.contextmanager
+    def _writing(self):
+        """写入期间持有进程内锁和文件锁，先加载其他进程的修改，结束后保存元数据"""
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(self._file('lock'), 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._refresh()
+                yield
+                if self._vectors is not None:
+                    self._vectors.flush()
+                    self._keys.flush()
+                if self._ivf is not None:
+                    self._ivf.labels.flush()
+                self._save_meta()
+
+    def _save_meta(self):
+        temp = self._file('meta.json.tmp')
+        with open(temp, 'w') as f:
+            meta = {'dim': self.dim, 'count': self.count}
+            if self._ivf is not None:
+                meta['ivf'] = {'nlist': self._ivf.nlist, 'trained': self._ivf_trained}
+            json.dump(meta, f)
+        # 先落盘向量再替换元数据，中途退出时多写的行不会被读到
+        os.replace(temp, self._file('meta.json'))
+        self._meta_stamp = self._stamp()
+
+    def _create(self, dim, capacity):
+        """新建或扩容矩阵文件，复制已有的行后替换原文件"""
+        vectors = np.lib.format.open_memmap(self._file('vectors.npy.tmp'), mode='w+',
+                                            dtype=np.float32, shape=(capacity, dim))
+        keys = np.lib.format.open_memmap(self._file('keys.npy.tmp'), mode='w+',
+                                         dtype=np.int64, shape=(capacity, 2))
+        keys[:] = -1
+        if self._vectors is not None:
+            vectors[:self.count] = self._vectors[:self.count]
+            keys[:self.count] = self._keys[:self.count]
+        vectors.flush()
+        keys.flush()
+        del vectors, keys
+        os.replace(self._file('vectors.npy.tmp'), self._file('vectors.npy'))
+        os.replace(self._file('keys.npy.tmp'), self._file('keys.npy'))
+        self.dim = dim
+        self._vectors = np.load(self._file('vectors.npy'), mmap_mode='r+')
+        self._keys = np.load(self._file('keys.npy'), mmap_mode='r+')
+        file_ids = np.full(capacity, -1, dtype=np.int64)
+        file_ids[:self.count] = self._file_ids[:self.count]
+        self._file_ids = file_ids
+        if self._ivf is not None:
+            self._ivf.labels = self._create_labels(capacity, self._ivf.labels[:self.count])
+
+    def _create_labels(self, capacity, existing=()):
+        """新建每行所属聚类的映射文件，未分配的行为 -1"""
+        labels = np.lib.format.open_memmap(self._file('ivf_labels.npy.tmp'), mode='w+',
+                                           dtype=np.int32, shape=(capacity,))
+        labels[:] = -1
+        labels[:len(existing)] = existing
+        labels.flush()
+        del labels
+        os.replace(self._file('ivf_labels.npy.tmp'), self._file('ivf_labels.npy'))
+        return np.load(self._file('ivf_labels.npy'), mmap_mode='r+')
+
+    def _allocate(self, size, dim):
+        """分配 size 个行号，优先使用空位，不够时在末尾追加并按需扩容"""
+        if self.dim is None:
+            self._create(dim, max(self.initial_capacity, size))
+        reused = self._free[:size]
+        del self._free[:size]
+        extra = size - len(reused)
+        if self.count + extra > len(self._vectors):
+            self._create(self.dim, max(len(self._vectors) * 2, self.count + extra))
+        rows = np.array(reused + list(range(self.count, self.count + extra)), dtype=np.int64)
+        self.count += extra
+        return rows
+
+    def _remove(self, file_id):
+        rows = self._rows.pop(file_id, None)
+        if rows is None:
+            return 0
+        self._keys[rows] = -1
+        self._file_ids[rows] = -1
+        self._free.extend(rows.tolist())
+        if self._ivf is not None:
+            self._ivf.remove(rows)
+        return len(rows)
+
+    def add(self, file_id, vectors, chunks):
+        """写入文件的向量，替换该文件原有的向量；chunks 为每行对应的块序号"""
+        vectors = np.atleast_2d(vectors)
+        self.add_many(np.full(len(vectors), file_id), vectors, chunks)
+
+    def add_many(self, file_ids, vectors, chunks):
+        """批量写入多个文件的向量，file_ids 和 chunks 为每行对应的文件ID和块序号"""
+        file_ids = np.asarray(file_ids, dtype=np.int64)
+        vectors = normalize(np.atleast_2d(vectors))
+        if not len(vectors) == len(file_ids) == len(chunks):
+            raise ValueError('向量数与文件ID数、块序号数不一致')
+        with self._writing():
+            if self.dim is not None and vectors.shape[1] != self.dim:
+                raise ValueError(f'向量维度 {vectors.shape[1]} 与已有向量的维度 {self.dim} 不一致')
+            for file_id in np.unique(file_ids).tolist():
+                self._remove(file_id)
+            rows = self._allocate(len(vectors), vectors.shape[1])
+            self._vectors[rows] = vectors
+            self._keys[rows, 0] = file_ids
+            self._keys[rows, 1] = chunks
+            self._file_ids[rows] = file_ids
+            self._rows.update(_group_rows(file_ids, rows))
+            if self._ivf is not None:
+                self._ivf.add(rows, vectors)
+
+    def delete(self, file_ids):
+        """删除文件的所有向量，返回删除的行数"""
+        with self._lock:
+            self._refresh()
+            if not any(file_id in self._rows for file_id in file_ids):
+                return 0
+        with self._writing():
+            return sum(self._remove(file_id) for file_id in file_ids)
+
+    def copy(self, source_id, target_id):
+        """把一个文件的向量复制给另一个文件（内容相同时复用），源文件没有向量时返回 False"""
+        with self._lock:
+            self._refresh()
+            rows = self._rows.get(source_id)
+            if rows is None:
+                return False
+            vectors = np.array(self._vectors[rows])
+            chunks = np.array(self._keys[rows, 1])
+        self.add(target_id, vectors, chunks)
+        return True
+
+    def contains(self, file_id):
+        with self._lock:
+            self._refresh()
+            return file_id in self._rows
+
+    def build_index(self, nlist=None, seed=0):
+        """训练近似最近邻索引（IVF），之后新增的向量直接分配到最近的聚类；返回聚类数
+
+        向量数增长较多后聚类会变得不均匀，应重新执行以重新训练。
+        """
+        with self._writing():
+            valid = self.count - len(self._free)
+            if not valid:
+                raise ValueError('向量存储为空，无法建立索引')
+            nlist = min(nlist or default_nlist(valid), valid)
+            labels = self._create_labels(len(self._vectors))
+            used = self._file_ids[:self.count] >= 0
+            self._ivf = IVFIndex.train(self._vectors[:self.count], labels, nlist, used, seed)
+            with open(self._file('ivf_centroids.npy.tmp'), 'wb') as f:
+                np.save(f, self._ivf.centroids)
+            os.replace(self._file('ivf_centroids.npy.tmp'), self._file('ivf_centroids.npy'))
+            self._ivf_trained = valid
+            return nlist
+
+    def search(self, query, k=10, nprobe=None, exact=False):
+        """按余弦相似度返回最相近的 k 个文件 [(文件ID, 相似度, 块序号)]，每个文件取得分最高的一行
+
+        已建立近似索引且向量数达到 ANN_MIN_VECTORS 时只计算最近的 nprobe 个聚类中的向量，
+        exact 为 True 时总是计算所有向量。
+        """
+        with self._lock:
+            self._refresh()
+            if not self._rows or k <= 0:
+                return []
+            # 扩容会替换映射对象，取出当前的引用后在锁外计算
+            vectors, keys, count, ivf = self._vectors, self._keys, self.count, self._ivf
+            file_ids = self._file_ids[:count]
+            valid = count - len(self._free)
+        query = normalize(query)
+        if query.shape != (vectors.shape[1],):
+            raise ValueError(f'查询向量维度 {query.shape[-1]} 与已有向量的维度 {vectors.shape[1]} 不一致')
+
+        if ivf is not None and not exact and valid >= ANN_MIN_VECTORS:
+            rows = ivf.candidates(query, nprobe or ANN_NPROBE)
+            rows = np.sort(rows[file_ids[rows] >= 0])
+            # 按行号顺序读取候选向量，映射文件中的访问尽量连续
+            scores = vectors[rows] @ query
+        else:
+            rows = None
+            scores = vectors[:count] @ query
+            scores[file_ids < 0] = -np.inf
+        return _top_files(scores, rows, file_ids, keys, k)
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            return {
+                'files': len(self._rows),
+                'vectors': self.count - len(self._free),
+                'dim': self.dim,
+                'capacity': len(self._vectors) if self._vectors is not None else 0,
+                'ann': {'nlist': self._ivf.nlist, 'trained_vectors': self._ivf_trained} if self._ivf else None
+            }
+
+def _group_rows(file_ids, rows):
+    """按文件ID分组行号，排序后一次切分，不逐行遍历；文件ID为 -1 的行被跳过"""
+    used = np.flatnonzero(file_ids >= 0)
+    order = used[np.argsort(file_ids[used], kind='stable')]
+    sorted_ids = file_ids[order]
+    starts = np.flatnonzero(np.diff(sorted_ids)) + 1
+    return {int(group_ids[0]): rows[positions] for group_ids, positions in
+            zip(np.split(sorted_ids, starts), np.split(order, starts)) if len(positions)}
+
+def _top_files(scores, rows, file_ids, keys, k):
+    """从候选行的得分中取最高的 k 个文件，rows 为 None 时 scores 的下标即行号"""
+    total = len(scores)
+    if not total:
+        return []
+    # 同一文件可能占据多行，先取出多于 k 行的候选，去重后不足 k 个文件再扩大范围
+    size = min(total, k * 4)
+    while True:
+        top = np.argpartition(-scores, size - 1)[:size] if size < total else np.arange(total)
+        top = top[np.argsort(-scores[top], kind='stable')]
+        results = []
+        seen = set()
+        for position in top:
+            row = rows[position] if rows is not None else position
+            file_id = int(file_ids[row])
+            if file_id < 0 or file_id in seen or scores[position] == -np.inf:
+                continue
+            seen.add(file_id)
+            results.append((file_id, float(scores[position]), int(keys[row, 1])))
+            if len(results) == k:
+                return results
+        if size >= total:
+            return results
+        size = min(total, size * 4)
+
+# 进程内共享的向量存储，首次使用时加载
+vector_store = VectorStore()
+
+# 删除文件后移除其向量：向量不在数据库事务中，等事务提交后再删除，回滚时保留
+
+@event.listens_for(Session, 'after_flush')
+def _collect_deleted_files(session, flush_context):
+    file_ids = [target.id for target in session.deleted if isinstance(target, File)]
+    if file_ids:
+        session.info.setdefault('deleted_file_ids', set()).update(file_ids)
+
+@event.listens_for(Session, 'after_commit')
+def _delete_vectors(session):
+    file_ids = session.info.pop('deleted_file_ids', None)
+    if file_ids:
+        try:
+            vector_store.delete(file_ids)
+        except Exception as e:
+            print(f"删除文件向量失败: {str(e)}")
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_deleted_files(session):
+    session.info.pop('deleted_file_ids', None)
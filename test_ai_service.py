@@ -0,0 +1,56 @@
+"""结构化分析结果的解析和校验，以及结果无效时退回分别请求的测试"""
+import pytest
+from services.ai_service import AIService, AnalysisFormatError, parse_structured_analysis
+
+def test_parse_structured_analysis():
+    content = '{"summary": " 年度报告 ", "tags": ["财务", " 报表 ", ""], "sentiment": 0.5}'
+    assert parse_structured_analysis(content) == ('年度报告', ['财务', '报表'], 0.5)
+    # Markdown 代码块包裹、逗号分隔的标签字符串、字符串形式的数字
+    content = '```json\n{"summary": "摘要", "tags": "a, b", "sentiment": "-1"}\n```'
+    assert parse_structured_analysis(content) == ('摘要', ['a', 'b'], -1.0)
+
+@pytest.mark.parametrize('content', [
+    None,
+    '不是 JSON',
+    '["summary"]',
+    '{"tags": ["a"], "sentiment": 0}',
+    '{"summary": "s", "tags": [], "sentiment": 0}',
+    '{"summary": "s", "tags": [1, 2], "sentiment": 0}',
+    '{"summary": "s", "tags": ["a"], "sentiment": true}',
+    '{"summary": "s", "tags": ["a"], "sentiment": "正面"}',
+    '{"summary": "s", "tags": ["a"], "sentiment": 2}',
+])
+def test_parse_structured_analysis_invalid(content):
+    with pytest.raises(AnalysisFormatError):
+        parse_structured_analysis(content)
+
+@pytest.fixture
+def service(monkeypatch):
+    service = AIService()
+    service.config = {'apiKey': 'test', 'temperature': 0.7}
+    replies = []
+    calls = []
+    def chat(messages, temperature, max_tokens, error, response_format=None):
+        calls.append(response_format)
+        return replies.pop(0)
+    monkeypatch.setattr(service, '_chat', chat)
+    return service, replies, calls
+
+def test_structured_mode(service):
+    service, replies, calls = service
+    replies.append('{"summary": "摘要", "tags": ["a"], "sentiment": 0.2}')
+    assert service.analyze_text('内容') == ('摘要', ['a'], 0.2)
+    assert calls == [{'type': 'json_object'}]
+
+def test_fallback_to_separate_requests(service):
+    service, replies, calls = service
+    # 结构化结果无效时改为分别请求摘要、标签和情感得分
+    replies.extend(['{"summary": "摘要"}', '摘要', 'a, b', ' 0.3 '])
+    assert service.analyze_text('内容') == ('摘要', ['a', 'b'], 0.3)
+    assert calls == [{'type': 'json_object'}, None, None, None]
+
+def test_prompt_version_per_mode(service):
+    service, _, _ = service
+    structured = service.cache_key('hash')['prompt_version']
+    service.config['analysis_mode'] = 'separate'
+    assert service.cache_key('hash')['prompt_version'] != structured
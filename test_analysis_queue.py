@@ -0,0 +1,88 @@
+"""后台分析队列测试：入队去重、强制重新分析和重试等待时间"""
+import json
+import pytest
+import requests
+from alembic import command
+from alembic.config import Config
+from database import ALEMBIC_CONFIG, create_db_engine, db_session, engine
+from models.ai import AnalysisJob
+from models.file import File
+from models.storage import Storage
+from services import analysis_queue
+from services.ai_service import APIError
+from services.analysis_queue import enqueue_files, retry_delay
+
+@pytest.fixture
+def session(tmp_path):
+    test_engine = create_db_engine(f'sqlite:///{tmp_path / "queue.db"}')
+    with test_engine.begin() as conn:
+        config = Config(ALEMBIC_CONFIG)
+        config.attributes['connection'] = conn
+        command.upgrade(config, 'head')
+    db_session.remove()
+    db_session.configure(bind=test_engine)
+    yield db_session
+
+    db_session.remove()
+    db_session.configure(bind=engine)
+    test_engine.dispose()
+
+def add_files(session, *files):
+    storage = Storage(name='pool', type='local', config=json.dumps({'path': '/tmp/pool'}))
+    session.add(storage)
+    session.flush()
+    records = [File(name=name, original_name=name, path=name, size=1, type=name.rsplit('.', 1)[-1],
+                    mime_type=mime_type, storage_id=storage.id) for name, mime_type in files]
+    session.add_all(records)
+    session.commit()
+    return [record.id for record in records]
+
+def jobs(session):
+    session.expire_all()
+    return [(job.file_id, job.status, job.force) for job in session.query(AnalysisJob).order_by(AnalysisJob.id)]
+
+def test_enqueue_dedup_and_force(session):
+    text_id, image_id = add_files(session, ('a.txt', 'text/plain'), ('b.png', 'image/png'))
+
+    # 不能分析的文件被跳过，已在队列中的文件不重复入队
+    assert enqueue_files(session, [text_id, image_id]) == 1
+    assert enqueue_files(session, [text_id]) == 0
+    session.commit()
+    assert jobs(session) == [(text_id, 'pending', False)]
+
+    # 强制分析把等待中的普通任务改为强制，计入返回值
+    assert enqueue_files(session, [text_id], force=True) == 1
+    assert enqueue_files(session, [text_id], force=True) == 0
+    session.commit()
+    assert jobs(session) == [(text_id, 'pending', True)]
+
+    # 执行中的任务不修改；完成后可以再次入队
+    job = session.query(AnalysisJob).one()
+    job.status = 'running'
+    session.commit()
+    assert enqueue_files(session, [text_id], force=True) == 0
+    job.status = 'done'
+    session.commit()
+    assert enqueue_files(session, [text_id]) == 1
+    session.commit()
+    assert jobs(session) == [(text_id, 'done', True), (text_id, 'pending', False)]
+
+def test_retry_delay(monkeypatch):
+    monkeypatch.setattr(analysis_queue, 'ANALYSIS_MAX_ATTEMPTS', 5)
+    monkeypatch.setattr(analysis_queue.random, 'uniform', lambda low, high: high)
+
+    # 限流、服务端错误和网络错误按指数退避重试
+    assert retry_delay(APIError('限流', 429), 1) == 2
+    assert retry_delay(APIError('服务端错误', 503), 3) == 8
+    assert retry_delay(requests.ConnectionError(), 2) == 4
+    # Retry-After 更长时以它为准
+    assert retry_delay(APIError('限流', 429, retry_after=30), 1) == 30
+    # 等待时间有上限
+    monkeypatch.setattr(analysis_queue, 'ANALYSIS_MAX_ATTEMPTS', 100)
+    assert retry_delay(APIError('限流', 429), 20) == analysis_queue.RETRY_MAX_DELAY
+
+def test_no_retry(monkeypatch):
+    monkeypatch.setattr(analysis_queue, 'ANALYSIS_MAX_ATTEMPTS', 5)
+    assert retry_delay(APIError('请求无效', 400), 1) is None
+    assert retry_delay(ValueError('无法解码文件内容'), 1) is None
+    assert retry_delay(APIError('限流', 429), 5) is None
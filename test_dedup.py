@@ -0,0 +1,83 @@
+"""去重上传的事务测试：批量上传中任何一个文件失败时，引用计数和新写入的内容都要回滚"""
+import io
+import os
+import json
+import hashlib
+import pytest
+from alembic import command
+from alembic.config import Config
+from flask import Flask
+from database import ALEMBIC_CONFIG, create_db_engine, db_session, engine, shutdown_session
+from models.blob import Blob
+from models.file import File
+from models.storage import Storage
+from routes import files as files_routes
+from services.dedup import blob_path
+from services.storage_registry import StoragePool
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    test_engine = create_db_engine(f'sqlite:///{tmp_path / "dedup.db"}')
+    with test_engine.begin() as conn:
+        config = Config(ALEMBIC_CONFIG)
+        config.attributes['connection'] = conn
+        command.upgrade(config, 'head')
+    db_session.remove()
+    db_session.configure(bind=test_engine)
+
+    storage = Storage(id=1, name='dedup', type='local', is_active=True,
+                      config=json.dumps({'path': str(tmp_path / 'pool'), 'dedup': True}))
+    pool = StoragePool(storage)
+    monkeypatch.setattr(files_routes, 'get_active_pool', lambda: pool)
+
+    app = Flask(__name__)
+    app.register_blueprint(files_routes.files_bp, url_prefix='/files')
+    app.teardown_appcontext(shutdown_session)
+    yield app.test_client(), tmp_path / 'pool'
+
+    db_session.remove()
+    db_session.configure(bind=engine)
+    test_engine.dispose()
+
+def upload(client, *files):
+    data = {'files[]': [(io.BytesIO(content), name) for name, content in files]}
+    return client.post('/files/upload', data=data, content_type='multipart/form-data').get_json()
+
+def stored_blobs(root):
+    """存储中已有的内容文件（不含临时文件）"""
+    blob_root = root / 'blobs'
+    return {name for _, _, names in os.walk(blob_root) for name in names} - set(os.listdir(blob_root / 'staging'))
+
+def test_failed_batch_rolls_back(client, monkeypatch):
+    client, root = client
+    assert upload(client, ('a.txt', b'alpha'))['success']
+
+    def failing_file(**columns):
+        if columns['name'].endswith('.bad'):
+            raise RuntimeError('创建文件记录失败')
+        return File(**columns)
+    monkeypatch.setattr(files_routes, 'File', failing_file)
+
+    # 第一、三个文件写入新内容，第二个文件引用已有内容，第三个文件失败
+    result = upload(client, ('b.txt', b'beta'), ('a2.txt', b'alpha'), ('c.bad', b'gamma'))
+    assert not result['success']
+
+    alpha = hashlib.sha256(b'alpha').hexdigest()
+    blobs = db_session.query(Blob).all()
+    assert [(blob.checksum, blob.ref_count) for blob in blobs] == [(alpha, 1)]
+    assert db_session.query(File).count() == 1
+    # 新写入的内容被删除，已有的内容保留
+    assert stored_blobs(root) == {alpha}
+    assert (root / blob_path(alpha)).read_bytes() == b'alpha'
+
+def test_upload_by_hash_size(client):
+    client, _ = client
+    assert upload(client, ('a.txt', b'alpha'))['success']
+    checksum = hashlib.sha256(b'alpha').hexdigest()
+
+    response = client.post('/files/upload/hash', json={'checksum': checksum, 'name': 'x.txt', 'size': 'abc'})
+    assert response.status_code == 400
+    # 大小以字符串传入时按整数比较
+    result = client.post('/files/upload/hash', json={'checksum': checksum, 'name': 'x.txt', 'size': '5'}).get_json()
+    assert result['found']
+    assert db_session.query(Blob).one().ref_count == 2
@@ -0,0 +1,76 @@
+"""下载响应的字节区间和条件请求测试"""
+from datetime import datetime, timedelta, timezone
+import pytest
+from flask import Flask, request
+from werkzeug.http import http_date
+from services.http_range import build_download_response
+
+DATA = bytes(range(256)) * 4
+LAST_MODIFIED = datetime(2024, 1, 1, 12, 0, 0, 500000, tzinfo=timezone.utc)
+ETAG = 'abc123'
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route('/download')
+    def download():
+        def read_range(start, stop):
+            yield DATA[start:stop]
+        return build_download_response(request, read_range, len(DATA), ETAG, LAST_MODIFIED,
+                                       mimetype='application/octet-stream', download_name='数据.bin')
+
+    return app.test_client()
+
+def get(client, **headers):
+    response = client.get('/download', headers=headers)
+    # 读完响应体，流式生成器才会结束
+    response.body = response.get_data()
+    return response
+
+def test_full_and_single_range(client):
+    response = get(client)
+    assert response.status_code == 200
+    assert response.body == DATA
+    assert response.headers['Accept-Ranges'] == 'bytes'
+
+    response = get(client, Range='bytes=10-19')
+    assert response.status_code == 206
+    assert response.body == DATA[10:20]
+    assert response.headers['Content-Range'] == f'bytes 10-19/{len(DATA)}'
+    assert response.headers['Content-Length'] == '10'
+
+    # 后缀区间
+    response = get(client, Range='bytes=-5')
+    assert response.body == DATA[-5:]
+
+def test_multiple_ranges(client):
+    response = get(client, Range='bytes=0-3,4-6,100-103')
+    assert response.status_code == 206
+    assert response.mimetype == 'multipart/byteranges'
+    assert int(response.headers['Content-Length']) == len(response.body)
+    # 相邻的区间合并为一段
+    assert b'Content-Range: bytes 0-6/1024' in response.body
+    assert b'Content-Range: bytes 100-103/1024' in response.body
+    assert response.body.count(b'Content-Range') == 2
+    assert DATA[100:104] in response.body
+
+def test_unsatisfiable_range(client):
+    response = get(client, Range=f'bytes={len(DATA)}-')
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(DATA)}'
+
+def test_if_range(client):
+    # ETag 或日期与当前版本完全一致时才返回区间
+    assert get(client, Range='bytes=0-1', **{'If-Range': f'"{ETAG}"'}).status_code == 206
+    assert get(client, Range='bytes=0-1', **{'If-Range': '"other"'}).status_code == 200
+    assert get(client, Range='bytes=0-1', **{'If-Range': http_date(LAST_MODIFIED)}).status_code == 206
+    for delta in (timedelta(days=1), -timedelta(days=1)):
+        response = get(client, Range='bytes=0-1', **{'If-Range': http_date(LAST_MODIFIED + delta)})
+        assert response.status_code == 200
+        assert response.body == DATA
+
+def test_conditional_get(client):
+    assert get(client, **{'If-None-Match': f'"{ETAG}"'}).status_code == 304
+    assert get(client, **{'If-Modified-Since': http_date(LAST_MODIFIED)}).status_code == 304
+    assert get(client, **{'If-None-Match': '"other"'}).status_code == 200
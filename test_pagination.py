@@ -0,0 +1,87 @@
+"""文件列表键集分页和游标解析测试"""
+import json
+import base64
+from datetime import datetime, timedelta
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from database import Base, db_session, read_session, engine, read_engine, shutdown_session
+from models.file import File
+from models.storage import Storage
+from routes import files as files_routes
+from routes.files import encode_cursor, decode_cursor
+from services.storage_registry import StoragePool
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    test_engine = create_engine(f'sqlite:///{tmp_path / "pagination.db"}')
+    Base.metadata.create_all(test_engine)
+    for session in (db_session, read_session):
+        session.remove()
+        session.configure(bind=test_engine)
+    storage = Storage(name='local', type='local', is_active=True, config=json.dumps({'path': str(tmp_path)}))
+    db_session.add(storage)
+    db_session.flush()
+    # 前两个文件的创建时间相同，检查按 id 区分先后
+    start = datetime(2024, 1, 1)
+    for i, offset in enumerate([0, 0, 1, 2, 3]):
+        db_session.add(File(name=f'{i}.txt', original_name=f'{i}.txt', path=f'{i}.txt', size=i, type='txt',
+                            storage_id=storage.id, created_at=start + timedelta(minutes=offset)))
+    db_session.commit()
+    pool = StoragePool(storage)
+    monkeypatch.setattr(files_routes, 'get_active_pool', lambda: pool)
+
+    app = Flask(__name__)
+    app.register_blueprint(files_routes.files_bp, url_prefix='/files')
+    app.teardown_appcontext(shutdown_session)
+    yield app.test_client()
+
+    db_session.remove()
+    db_session.configure(bind=engine)
+    read_session.remove()
+    read_session.configure(bind=read_engine)
+    test_engine.dispose()
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 1, 1, 8, 30)
+    assert decode_cursor(encode_cursor(created_at, 7)) == (created_at.isoformat(), 7)
+    assert decode_cursor(encode_cursor(-1.5, 3)) == (-1.5, 3)
+
+@pytest.mark.parametrize('cursor', [
+    '!!!',                          # 不是 base64
+    'bm90IGpzb24',                  # 不是 JSON
+    '5Lit5paH',                     # 不是 ASCII
+    raw_cursor(5),                  # 不是数组
+    raw_cursor(['2024-01-01', 1, 2]),
+    raw_cursor(['2024-01-01', 'abc']),
+    raw_cursor(['2024-01-01', [1]]),
+    raw_cursor([{'a': 1}, 1]),
+    raw_cursor([None, 1]),
+])
+def test_decode_bad_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def test_list_files_pages(client):
+    seen = []
+    cursor = None
+    while True:
+        params = {'per_page': 2}
+        if cursor:
+            params['cursor'] = cursor
+        result = client.get('/files/api/files', query_string=params).get_json()
+        seen.extend(file['name'] for file in result['files'])
+        cursor = result['next_cursor']
+        if not cursor:
+            break
+    # 按创建时间倒序，创建时间相同时按 id 倒序，不重复也不遗漏
+    assert seen == ['4.txt', '3.txt', '2.txt', '1.txt', '0.txt']
+
+@pytest.mark.parametrize('cursor', ['!!!', raw_cursor(['not a date', 1]), raw_cursor([[1], 1])])
+def test_list_files_tampered_cursor(client, cursor):
+    response = client.get('/files/api/files', query_string={'cursor': cursor})
+    assert response.status_code == 400
+    assert response.get_json()['error']
@@ -0,0 +1,95 @@
+"""热点查询的执行计划回归测试
+
+在临时数据库上执行 Alembic 迁移，用路由中实际使用的查询构造函数生成 SQL，
+检查 EXPLAIN QUERY PLAN 仍然走预期的索引，而不是全表扫描。
+"""
+import os
+import tempfile
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.dialects import sqlite
+from werkzeug.datastructures import MultiDict
+from database import ALEMBIC_CONFIG, db_session, read_session
+from models.ai import FileAnalysis
+from models.file import File
+from routes.files import filter_files_query, build_page_query, capped_count_query, encode_cursor, size_bucket_column
+from services import search_index
+from services.analysis_queue import next_job_query
+from services.serialization import FILE_COLUMNS
+from services.search_index import INDEXED_COLUMNS, TOKENIZE
+from services.tokenizer import index_text
+import datetime
+
+@pytest.fixture(scope='module')
+def connection():
+    # 让过滤函数走全文索引分支
+    available, search_index._available = search_index._available, True
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f'sqlite:///{os.path.join(directory, "plans.db")}')
+        event.listen(engine, 'connect', lambda conn, record: conn.create_function('search_tokens', 1, index_text))
+        with engine.begin() as conn:
+            config = Config(ALEMBIC_CONFIG)
+            config.attributes['connection'] = conn
+            command.upgrade(config, 'head')
+            conn.exec_driver_sql(f"CREATE VIRTUAL TABLE files_fts USING fts5({', '.join(INDEXED_COLUMNS)}, {TOKENIZE})")
+        with engine.connect() as conn:
+            yield conn
+        engine.dispose()
+    search_index._available = available
+
+def query_plan(connection, query):
+    """返回查询计划中每一步的描述"""
+    statement = getattr(query, 'statement', query)
+    sql = str(statement.compile(dialect=sqlite.dialect(), compile_kwargs={'literal_binds': True}))
+    return [row[3] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql)]
+
+def listing(args, cursor=None):
+    query, fts = filter_files_query(1, MultiDict(args))
+    return build_page_query(query, fts, cursor, 50)
+
+def count(args):
+    query, _ = filter_files_query(1, MultiDict(args))
+    return capped_count_query(query)
+
+def facets(args):
+    query, _ = filter_files_query(1, MultiDict(args), facets=True)
+    bucket = size_bucket_column()
+    return query.with_entities(File.category, bucket, func.count()).group_by(File.category, bucket)
+
+# (说明, 查询构造函数, 期望使用的索引)
+HOT_QUERIES = [
+    ('列表第一页', lambda: listing({}), 'ix_files_storage_created'),
+    ('列表接口（只查询列）', lambda: build_page_query(filter_files_query(1, MultiDict())[0].with_entities(*FILE_COLUMNS), None, None, 50),
+        'ix_files_storage_created'),
+    ('列表翻页', lambda: listing({}, encode_cursor(datetime.datetime(2024, 1, 1), 100)), 'ix_files_storage_created'),
+    ('按日期过滤', lambda: listing({'date_from': '2024-01-01', 'date_to': '2024-02-01'}), 'ix_files_storage_created'),
+    ('按分类过滤', lambda: listing({'file_type': 'image'}), 'ix_files_storage_category'),
+    ('分面统计', lambda: facets({}), 'COVERING INDEX ix_files_storage_category_size'),
+    ('总数估计', lambda: count({}), 'ix_files_storage_'),
+    ('首页最近文件', lambda: read_session.query(File).filter_by(storage_id=1)
+        .order_by(File.created_at.desc(), File.id.desc()).limit(5), 'ix_files_storage_created'),
+    ('文件分析结果', lambda: db_session.query(FileAnalysis).filter_by(file_id=1), 'ix_file_analysis_file_id'),
+    ('领取分析任务', lambda: next_job_query(datetime.datetime(2024, 1, 1)), 'ix_analysis_jobs_status_run_after'),
+    ('全文搜索', lambda: listing({'search': '报告'}), 'INTEGER PRIMARY KEY'),
+    ('全文搜索翻页', lambda: listing({'search': '报告'}, encode_cursor(-1.5, 100)), 'INTEGER PRIMARY KEY'),
+]
+
+@pytest.mark.parametrize('description, build, index', HOT_QUERIES, ids=[item[0] for item in HOT_QUERIES])
+def test_hot_query_uses_index(connection, description, build, index):
+    plan = query_plan(connection, build())
+    assert any(index in step for step in plan), f'{description} 未使用 {index}: {plan}'
+    assert not any(step.split()[:2] in (['SCAN', 'files'], ['SCAN', 'file_analysis']) for step in plan), \
+        f'{description} 出现全表扫描: {plan}'
+
+def test_claim_needs_no_sort(connection):
+    """领取任务按 (run_after, id) 顺序直接读索引，队列很长时也不需要排序"""
+    plan = query_plan(connection, next_job_query(datetime.datetime(2024, 1, 1)))
+    assert not any('TEMP B-TREE' in step for step in plan), plan
+
+@pytest.mark.parametrize('args', [{}, {'file_type': 'image'}], ids=['全部', '按分类过滤'])
+def test_listing_needs_no_sort(connection, args):
+    """按 (created_at, id) 倒序分页直接按索引顺序输出，不需要临时排序"""
+    plan = query_plan(connection, listing(args))
+    assert not any('TEMP B-TREE' in step for step in plan), plan
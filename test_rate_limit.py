@@ -0,0 +1,29 @@
+"""令牌桶限流测试"""
+import time
+from services.rate_limit import TokenBucket
+
+def test_acquire_waits_for_tokens():
+    bucket = TokenBucket(rate=100, capacity=2)
+    start = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    # 前两个令牌立即可用，之后按每秒 100 个补充
+    assert time.monotonic() - start >= 0.015
+    assert bucket.available() < 1
+
+def test_zero_rate_is_unlimited():
+    bucket = TokenBucket(rate=0, capacity=5)
+    start = time.monotonic()
+    for _ in range(100):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.5
+    assert bucket.available() == 5
+
+def test_pause():
+    for rate in (0, 100):
+        bucket = TokenBucket(rate=rate, capacity=5)
+        bucket.pause(0.05)
+        assert bucket.available() == 0
+        start = time.monotonic()
+        bucket.acquire()
+        assert time.monotonic() - start >= 0.04
@@ -0,0 +1,85 @@
+"""存储池统计测试：上传、修改、删除文件时的增量统计与全量重建结果一致"""
+import json
+import pytest
+from alembic import command
+from alembic.config import Config
+from database import ALEMBIC_CONFIG, create_db_engine, db_session, engine
+from models.file import File
+from models.storage import Storage
+from models.stats import StorageStats, StorageCategoryStats
+from services import stats
+from services.file_types import file_category
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    test_engine = create_db_engine(f'sqlite:///{tmp_path / "stats.db"}')
+    with test_engine.begin() as conn:
+        config = Config(ALEMBIC_CONFIG)
+        config.attributes['connection'] = conn
+        command.upgrade(config, 'head')
+    db_session.remove()
+    db_session.configure(bind=test_engine)
+    monkeypatch.setattr(stats, 'engine', test_engine)
+    yield db_session
+
+    db_session.remove()
+    db_session.configure(bind=engine)
+    test_engine.dispose()
+
+def add_file(session, storage, name, mime_type, size):
+    extension = name.rsplit('.', 1)[-1]
+    file = File(name=name, original_name=name, path=name, size=size, type=extension, mime_type=mime_type,
+                category=file_category(mime_type, extension), storage_id=storage.id)
+    session.add(file)
+    return file
+
+def snapshot(session):
+    """各存储池及其分类的 (文件数, 字节数)，忽略已减到 0 的行"""
+    session.expire_all()
+    totals = {row.storage_id: (row.file_count, row.total_bytes)
+              for row in session.query(StorageStats) if row.file_count}
+    categories = {(row.storage_id, row.category): (row.file_count, row.total_bytes)
+                  for row in session.query(StorageCategoryStats) if row.file_count}
+    return totals, categories
+
+def test_incremental_matches_rebuild(session):
+    first = Storage(name='first', type='local', config=json.dumps({'path': '/tmp/first'}))
+    second = Storage(name='second', type='local', config=json.dumps({'path': '/tmp/second'}))
+    session.add_all([first, second])
+    session.flush()
+
+    photo = add_file(session, first, 'a.jpg', 'image/jpeg', 100)
+    add_file(session, first, 'b.pdf', 'application/pdf', 200)
+    clip = add_file(session, first, 'c.mp4', 'video/mp4', 300)
+    note = add_file(session, second, 'd.txt', 'text/plain', 40)
+    add_file(session, second, 'e.zip', 'application/zip', 50)
+    session.commit()
+
+    # 修改大小和分类、移动到其他存储池、删除
+    photo.size = 150
+    note.name = note.original_name = note.path = 'd.png'
+    note.type, note.mime_type, note.category = 'png', 'image/png', 'image'
+    clip.storage_id = second.id
+    session.commit()
+    session.delete(session.query(File).filter_by(name='e.zip').one())
+    session.commit()
+
+    incremental = snapshot(session)
+    assert incremental[0] == {first.id: (2, 350), second.id: (2, 340)}
+    assert incremental[1][(second.id, 'image')] == (1, 40)
+
+    assert stats.rebuild_stats() == 4
+    assert snapshot(session) == incremental
+
+def test_storage_delete_clears_stats(session):
+    storage = Storage(name='gone', type='local', config=json.dumps({'path': '/tmp/gone'}))
+    session.add(storage)
+    session.flush()
+    add_file(session, storage, 'a.jpg', 'image/jpeg', 10)
+    session.commit()
+    assert session.get(StorageStats, storage.id).file_count == 1
+
+    session.query(File).delete()
+    session.delete(storage)
+    session.commit()
+    assert snapshot(session) == ({}, {})
@@ -0,0 +1,83 @@
+"""存储池缓存测试：版本号变化时重新加载，配置未变的存储池沿用已创建的客户端"""
+import json
+import pytest
+from alembic import command
+from alembic.config import Config
+from database import ALEMBIC_CONFIG, create_db_engine, db_session, engine
+from models.storage import Storage
+from services import storage_registry
+from services.storage_registry import StorageRegistry, bump_version
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    test_engine = create_db_engine(f'sqlite:///{tmp_path / "registry.db"}')
+    with test_engine.begin() as conn:
+        config = Config(ALEMBIC_CONFIG)
+        config.attributes['connection'] = conn
+        command.upgrade(config, 'head')
+    db_session.remove()
+    db_session.configure(bind=test_engine)
+    monkeypatch.setattr(storage_registry, 'engine', test_engine)
+    yield db_session
+
+    db_session.remove()
+    db_session.configure(bind=engine)
+    test_engine.dispose()
+
+def add_storage(session, name, path, is_active=False):
+    storage = Storage(name=name, type='local', config=json.dumps({'path': path}), is_active=is_active)
+    session.add(storage)
+    bump_version(session)
+    session.commit()
+    return storage
+
+def test_reload_on_version_change(session, tmp_path):
+    first = add_storage(session, 'first', str(tmp_path / 'first'), is_active=True)
+    second = add_storage(session, 'second', str(tmp_path / 'second'))
+    registry = StorageRegistry(ttl=0)
+
+    assert registry.get_active().id == first.id
+    first_client = registry.get(first.id).client
+    second_client = registry.get(second.id).client
+    # 版本号未变时返回同一快照和客户端
+    assert registry.get(first.id).client is first_client
+
+    second.config = json.dumps({'path': str(tmp_path / 'moved')})
+    first.is_active, second.is_active = False, True
+    bump_version(session)
+    session.commit()
+
+    assert registry.get_active().id == second.id
+    # 配置未变的存储池沿用客户端，配置改变的重新创建
+    assert registry.get(first.id).client is first_client
+    assert registry.get(second.id).client is not second_client
+    assert registry.get(second.id).client.base_path == str(tmp_path / 'moved')
+
+    session.delete(first)
+    bump_version(session)
+    session.commit()
+    assert registry.get(first.id) is None
+    assert [pool.id for pool in registry.all()] == [second.id]
+
+def test_ttl_and_invalidate(session, tmp_path):
+    storage = add_storage(session, 'pool', str(tmp_path / 'pool'))
+    registry = StorageRegistry(ttl=3600)
+    assert registry.get(storage.id).name == 'pool'
+
+    storage.name = 'renamed'
+    bump_version(session)
+    session.commit()
+    # TTL 内不检查版本号，invalidate 后立即重新加载
+    assert registry.get(storage.id).name == 'pool'
+    registry.invalidate()
+    assert registry.get(storage.id).name == 'renamed'
+
+def test_unchanged_version_keeps_snapshot(session, tmp_path):
+    storage = add_storage(session, 'pool', str(tmp_path / 'pool'))
+    registry = StorageRegistry(ttl=0)
+    assert registry.get(storage.id).name == 'pool'
+
+    # 修改存储池却没有增加版本号时，缓存不会更新
+    storage.name = 'renamed'
+    session.commit()
+    assert registry.get(storage.id).name == 'pool'
@@ -0,0 +1,38 @@
+"""中日韩与拉丁文混排文本的分词测试"""
+import pytest
+from database import create_db_engine
+from services.tokenizer import tokenize, query_phrases
+
+@pytest.fixture
+def connection():
+    test_engine = create_db_engine('sqlite://')
+    with test_engine.connect() as connection:
+        yield connection
+    test_engine.dispose()
+
+def search_tokens(connection, value):
+    return connection.exec_driver_sql('SELECT search_tokens(?)', (value,)).scalar()
+
+def test_search_tokens_mixed(connection):
+    # 拉丁词转小写，CJK 片段切为二元组并补末尾单字，下划线和标点都是分隔符
+    assert search_tokens(connection, '年度Report报告_v2.PDF') == '年度 度 report 报告 告 v2 pdf'
+    assert search_tokens(connection, '東京タワー 서울') == '東京 京タ タワ ワー ー 서울 울'
+    assert search_tokens(connection, '单') == '单'
+    assert search_tokens(connection, None) is None
+
+def test_query_phrases_mixed():
+    assert query_phrases('财务报表 Q3') == [(['财务', '务报', '报表'], False), (['q3'], True)]
+    # 单个汉字和拉丁词按前缀匹配
+    assert query_phrases('报 rep') == [(['报'], True), (['rep'], True)]
+    assert query_phrases('数据abc') == [(['数据'], False), (['abc'], True)]
+    assert query_phrases('  !? ') == []
+
+def test_query_phrases_match_index():
+    # 查询分出的每个词元都是索引词元的前缀（单字、拉丁词）或与之完全相同（二元组）
+    tokens = tokenize('2024年财务报表Final版')
+    for phrase, prefix in query_phrases('财务报 fin 版'):
+        for token in phrase:
+            if prefix:
+                assert any(t.startswith(token) for t in tokens)
+            else:
+                assert token in tokens
@@ -0,0 +1,73 @@
+"""本地向量存储的检索、增删和持久化测试"""
+import numpy as np
+import pytest
+from services import vector_store as store_module
+from services.vector_store import VectorStore, normalize
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    return {file_id: rng.normal(size=(file_id % 3 + 1, 16)).astype(np.float32) for file_id in range(1, 101)}
+
+def exact_top_k(vectors, query, k):
+    """逐个文件计算最高的余弦相似度"""
+    best = {file_id: float((normalize(rows) @ normalize(query)).max()) for file_id, rows in vectors.items()}
+    return sorted(best, key=lambda file_id: -best[file_id])[:k]
+
+def test_search_matches_exact(tmp_path, vectors):
+    store = VectorStore(str(tmp_path), initial_capacity=8)
+    for file_id, rows in vectors.items():
+        store.add(file_id, rows, list(range(len(rows))))
+    for file_id in range(1, 101, 4):
+        store.delete([file_id])
+        del vectors[file_id]
+    # 删除后空出的行被新文件复用
+    store.add(1000, vectors[2], [0, 1, 2])
+    vectors[1000] = vectors[2]
+
+    query = np.random.default_rng(1).normal(size=16)
+    hits = store.search(query, 10)
+    assert [file_id for file_id, _, _ in hits] == exact_top_k(vectors, query, 10)
+    assert store.stats()['files'] == len(vectors)
+
+def test_reload_from_disk(tmp_path, vectors):
+    store = VectorStore(str(tmp_path))
+    for file_id, rows in vectors.items():
+        store.add(file_id, rows, list(range(len(rows))))
+    store.delete([5])
+
+    reopened = VectorStore(str(tmp_path))
+    query = vectors[7][0]
+    assert reopened.search(query, 5) == store.search(query, 5)
+    assert not reopened.contains(5)
+    # 其他实例（进程）写入后，已打开的实例自动加载
+    reopened.add(5, vectors[5], list(range(len(vectors[5]))))
+    assert store.contains(5)
+
+def test_dimension_mismatch(tmp_path):
+    store = VectorStore(str(tmp_path))
+    store.add(1, np.ones((1, 4)), [0])
+    with pytest.raises(ValueError):
+        store.add(2, np.ones((1, 8)), [0])
+    assert store.contains(1)
+
+def test_ivf_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(store_module, 'ANN_MIN_VECTORS', 0)
+    rng = np.random.default_rng(2)
+    data = normalize(rng.normal(size=(2000, 16)))
+    store = VectorStore(str(tmp_path))
+    store.add_many(np.arange(2000), data, np.zeros(2000, dtype=np.int64))
+    store.build_index(nlist=20)
+
+    query = data[123]
+    exact = [file_id for file_id, _, _ in store.search(query, 10, exact=True)]
+    # 检索所有聚类时与精确检索一致
+    assert [file_id for file_id, _, _ in store.search(query, 10, nprobe=20)] == exact
+    assert store.search(query, 1, nprobe=2)[0][0] == 123
+
+    # 新增的向量分配到已有聚类，删除的向量不再返回
+    store.add(5000, query, [0])
+    store.delete([123])
+    reopened = VectorStore(str(tmp_path))
+    assert reopened.stats()['ann']['nlist'] == 20
+    assert reopened.search(query, 1, nprobe=2)[0][0] == 5000